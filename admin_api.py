@@ -0,0 +1,377 @@
+"""Administrative REST endpoints (API key protected)."""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Header, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from models import Room, AnnouncementRequest
+from room_manager import room_manager
+from websocket_manager import connection_manager
+from storage import IMPORT_POLICIES
+from api import verify_api_key
+from live_stats import live_stats
+from drain import drain_controller
+from call_tracing import call_tracer
+from quality_stats import quality_stats
+from webhooks import webhook_dispatcher
+from traffic import traffic, FIELDS as TRAFFIC_FIELDS
+
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+# Lines are buffered into chunks of about this size when streaming
+EXPORT_CHUNK_BYTES = 64 * 1024
+# A single NDJSON line (one room) may not exceed this
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+# How often an idle stream checks whether the dashboard went away
+STREAM_POLL_SECONDS = 5
+
+
+@router.post("/announce")
+async def announce(
+    request: AnnouncementRequest,
+    x_api_key: Optional[str] = Header(None)
+):
+    """
+    Push a message to every connected user, or to selected rooms (requires API key).
+    
+    **Example:**
+    ```
+    POST /api/admin/announce
+    X-API-Key: your-api-key
+    
+    {
+        "message": "Server restarting in 5 minutes",
+        "level": "warning"
+    }
+    ```
+    
+    Clients receive `{"type": "announcement", "payload": {"message", "level", "sent_at"}}`.
+    
+    **Returns:** Delivery counts and fan-out duration.
+    """
+    verify_api_key(x_api_key)
+    
+    if request.level not in ("info", "warning", "critical"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="level must be one of: info, warning, critical"
+        )
+    
+    message = {
+        "type": "announcement",
+        "payload": {
+            "message": request.message,
+            "level": request.level,
+            "sent_at": datetime.utcnow().isoformat()
+        }
+    }
+    
+    room_codes = set(request.room_codes) if request.room_codes is not None else None
+    return await connection_manager.announce(message, room_codes)
+
+
+@router.get("/export")
+async def export_rooms(
+    x_api_key: Optional[str] = Header(None),
+    include_expired: bool = False
+):
+    """
+    Export all rooms as NDJSON, one room per line (requires API key).
+    
+    The response is streamed, so memory stays bounded regardless of room count.
+    
+    **Example:**
+    ```
+    curl -H "X-API-Key: your-api-key" https://old-host/api/admin/export > rooms.ndjson
+    ```
+    """
+    verify_api_key(x_api_key)
+    
+    async def generate():
+        now = datetime.utcnow()
+        chunk: List[str] = []
+        chunk_bytes = 0
+        
+        for room_data in room_manager.storage.iter_room_records():
+            if not include_expired and datetime.fromisoformat(room_data["expires_at"]) <= now:
+                continue
+            
+            line = json.dumps(room_data, separators=(",", ":")) + "\n"
+            chunk.append(line)
+            chunk_bytes += len(line)
+            
+            if chunk_bytes >= EXPORT_CHUNK_BYTES:
+                yield "".join(chunk)
+                chunk, chunk_bytes = [], 0
+                # Let signaling traffic run between chunks
+                await asyncio.sleep(0)
+        
+        if chunk:
+            yield "".join(chunk)
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=rooms.ndjson"}
+    )
+
+
+@router.post("/import")
+async def import_rooms(
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    policy: str = Query("skip"),
+    batch_size: int = Query(500, ge=1, le=10000)
+):
+    """
+    Import rooms from an NDJSON body, as produced by `/api/admin/export` (requires API key).
+    
+    The body is read in chunks and applied to storage in batches of `batch_size`.
+    
+    **Conflict policies** (for room codes that already exist):
+    - `skip`: keep the existing room (default)
+    - `overwrite`: replace it with the imported room
+    - `merge`: keep the existing room and add the imported participants
+    
+    **Example:**
+    ```
+    curl -X POST -H "X-API-Key: your-api-key" -H "Content-Type: application/x-ndjson" \\
+         --data-binary @rooms.ndjson "https://new-host/api/admin/import?policy=merge"
+    ```
+    
+    **Returns:** Counts per outcome and throughput.
+    """
+    verify_api_key(x_api_key)
+    
+    if policy not in IMPORT_POLICIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"policy must be one of: {', '.join(IMPORT_POLICIES)}"
+        )
+    
+    started = time.perf_counter()
+    counts = {"created": 0, "overwritten": 0, "merged": 0, "skipped": 0}
+    lines_read = 0
+    errors: List[dict] = []
+    error_count = 0
+    batch: List[Room] = []
+    
+    async def apply_batch():
+        result = await asyncio.to_thread(room_manager.storage.save_rooms_bulk, batch[:], policy)
+        for key, value in result.items():
+            counts[key] += value
+        batch.clear()
+    
+    def parse_line(line: bytes):
+        nonlocal lines_read, error_count
+        line = line.strip()
+        if not line:
+            return
+        
+        lines_read += 1
+        try:
+            batch.append(Room.model_validate(json.loads(line)))
+        except (json.JSONDecodeError, UnicodeDecodeError, ValidationError) as e:
+            error_count += 1
+            if len(errors) < 10:
+                errors.append({"line": lines_read, "error": str(e)[:200]})
+    
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Line {lines_read + len(complete) + 1} exceeds {MAX_IMPORT_LINE_BYTES} bytes"
+            )
+        
+        for line in complete:
+            parse_line(line)
+            if len(batch) >= batch_size:
+                await apply_batch()
+    
+    parse_line(buffer)
+    if batch:
+        await apply_batch()
+    
+    elapsed = time.perf_counter() - started
+    
+    return {
+        "policy": policy,
+        "lines": lines_read,
+        **counts,
+        "errors": error_count,
+        "error_samples": errors,
+        "seconds": round(elapsed, 3),
+        "rooms_per_second": round(lines_read / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+@router.get("/stream")
+async def stream_stats(
+    request: Request,
+    x_api_key: Optional[str] = Header(None),
+    api_key: Optional[str] = Query(None)
+):
+    """
+    Live statistics and room lifecycle deltas as Server-Sent Events (requires API key).
+    
+    Browsers' `EventSource` cannot set headers, so the key may also be passed
+    as the `api_key` query parameter.
+    
+    Frames are coalesced to at most `LIVE_STATS_MAX_RATE_HZ` and shared by all
+    dashboards, so adding viewers does not add storage scans.
+    
+    **Example:**
+    ```
+    const source = new EventSource('/api/admin/stream?api_key=your-api-key');
+    source.addEventListener('stats', (e) => render(JSON.parse(e.data)));
+    ```
+    """
+    verify_api_key(x_api_key or api_key)
+    
+    async def generate():
+        queue = live_stats.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+        finally:
+            live_stats.unsubscribe(queue)
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/drain")
+async def start_drain(x_api_key: Optional[str] = Header(None)):
+    """
+    Drain this instance ahead of a deploy (requires API key). Same as sending SIGTERM.
+    
+    New connections and joins are refused and `/readiness` reports not ready.
+    Storage is flushed, then each client is sent
+    `{"type": "reconnect", "payload": {"reason", "delay_ms"}}` with a delay spread
+    over `DRAIN_RECONNECT_WINDOW_SECONDS`. The process exits once every socket
+    has gone or `DRAIN_TIMEOUT_SECONDS` has passed.
+    
+    **Returns:** Drain status (202 once started; 409 if already draining).
+    """
+    verify_api_key(x_api_key)
+    
+    if not drain_controller.start("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Already draining"
+        )
+    
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=drain_controller.get_status())
+
+
+@router.get("/drain")
+async def drain_status(x_api_key: Optional[str] = Header(None)):
+    """Get drain progress (requires API key)."""
+    verify_api_key(x_api_key)
+    return drain_controller.get_status()
+
+
+@router.get("/call-setups/slow")
+async def slow_call_setups(
+    x_api_key: Optional[str] = Header(None),
+    limit: int = Query(50, ge=1, le=1000),
+    min_ms: Optional[float] = Query(None, ge=0)
+):
+    """
+    Recent call setups slower than `CALL_TRACE_SLOW_MS`, newest first (requires API key).
+    
+    Each entry has the stage offsets from the later join of the pair
+    (`offer_ms`, `answer_ms`, `first_candidate_ms`, `connected_ms`) and
+    `server_relay_ms`, the time the server spent relaying the pair's signals.
+    A large `offer_ms` points at the offering client (media, SDP), a large gap
+    from `first_candidate_ms` to `connected_ms` at ICE/TURN.
+    
+    **Returns:** The slow setups plus the time-to-connect histograms.
+    """
+    verify_api_key(x_api_key)
+    return {
+        "setups": call_tracer.get_slow_setups(limit, min_ms),
+        "stats": call_tracer.get_stats()
+    }
+
+
+@router.get("/quality")
+async def connection_quality(
+    x_api_key: Optional[str] = Header(None),
+    room_code: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=500)
+):
+    """
+    Connection quality from client `stats_report` messages (requires API key).
+    
+    Quantiles (p50/p90/p99) of RTT, packet loss and bitrate plus the share of
+    reports over a TURN relay, over the last one to two
+    `QUALITY_WINDOW_SECONDS`. With `room_code`, returns that room only;
+    otherwise the global and per-room-size summaries and the rooms with the
+    worst packet loss.
+    """
+    verify_api_key(x_api_key)
+    
+    if room_code is not None:
+        stats = quality_stats.get_room_stats(room_code)
+        if stats is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No quality reports for room {room_code}"
+            )
+        return {"room_code": room_code, **stats}
+    
+    return {**quality_stats.get_stats(), "worst_rooms": quality_stats.get_worst_rooms(limit)}
+
+
+@router.get("/traffic")
+async def top_talkers(
+    x_api_key: Optional[str] = Header(None),
+    limit: int = Query(10, ge=1, le=500),
+    sort: str = "frames_in"
+):
+    """
+    Busiest sockets and rooms by signaling rate (requires API key).
+    
+    Rates are per second over the last one to two `TRAFFIC_WINDOW_SECONDS`,
+    for frames and bytes in and out, room broadcasts triggered and errors
+    returned. Sort by `frames_in` to find runaway clients, by `broadcasts`
+    for renegotiation loops, by `errors` for misbehaving integrations.
+    Counters are kept per worker process.
+    """
+    verify_api_key(x_api_key)
+    
+    if sort not in TRAFFIC_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of: {', '.join(TRAFFIC_FIELDS)}"
+        )
+    
+    return {**traffic.top(limit, sort), "totals": traffic.get_stats()["totals"]}
+
+
+@router.get("/webhooks")
+async def webhook_status(x_api_key: Optional[str] = Header(None)):
+    """
+    Webhook delivery status with full destination URLs and last errors (requires API key).
+    
+    `/health` only shows each destination's host, since URLs often carry secrets.
+    """
+    verify_api_key(x_api_key)
+    return webhook_dispatcher.get_stats(detailed=True)
@@ -0,0 +1,127 @@
+"""Admission control and load shedding driven by event-loop lag."""
+import asyncio
+import random
+import time
+from typing import Optional
+from config import settings
+from snapshot_loader import snapshot_loader
+
+
+class AdmissionController:
+    """Decides whether new connections and joins may be admitted.
+    
+    Sockets that are already connected keep getting their signaling
+    traffic processed; only new arrivals (connections and joins) are shed
+    when the server is overloaded.
+    """
+    
+    def __init__(self):
+        # Smoothed event-loop lag (fast attack, slow decay)
+        self.loop_lag_ms: float = 0.0
+        self.max_loop_lag_ms: float = 0.0
+        self.concurrent_joins: int = 0
+        # Set by the drain controller; refuses all new arrivals
+        self.draining: bool = False
+        # Token bucket for joins per second
+        self._join_tokens: float = float(settings.MAX_JOINS_PER_SECOND)
+        self._join_tokens_at: float = time.monotonic()
+        # Counters
+        self.rejected_connections: int = 0
+        self.rejected_joins: int = 0
+    
+    async def monitor_loop_lag(self):
+        """Sample event-loop lag by measuring how late a short sleep wakes up."""
+        loop = asyncio.get_running_loop()
+        interval = settings.LOOP_LAG_SAMPLE_INTERVAL_MS / 1000
+        
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (loop.time() - started - interval) * 1000)
+            
+            if lag_ms > self.loop_lag_ms:
+                self.loop_lag_ms = lag_ms
+            else:
+                self.loop_lag_ms = self.loop_lag_ms * 0.8 + lag_ms * 0.2
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, lag_ms)
+    
+    def is_overloaded(self) -> bool:
+        """Check if the event loop is lagging beyond the shedding threshold."""
+        return self.loop_lag_ms >= settings.LOOP_LAG_THRESHOLD_MS
+    
+    def _retry_after(self) -> int:
+        """Retry-after hint in seconds, jittered so refused clients spread out."""
+        base = settings.ADMISSION_RETRY_AFTER_SECONDS
+        return base + random.randint(0, base)
+    
+    def check_connection(self, active_connections: int) -> Optional[int]:
+        """Check if a new WebSocket connection may be accepted.
+        
+        Returns None when admitted, otherwise a retry-after hint in seconds.
+        """
+        if self.not_ready_reason(active_connections):
+            self.rejected_connections += 1
+            return self._retry_after()
+        return None
+    
+    def _refill_join_tokens(self):
+        """Refill the join token bucket based on elapsed time."""
+        now = time.monotonic()
+        rate = settings.MAX_JOINS_PER_SECOND
+        self._join_tokens = min(float(rate), self._join_tokens + (now - self._join_tokens_at) * rate)
+        self._join_tokens_at = now
+    
+    def begin_join(self) -> Optional[int]:
+        """Reserve a join slot.
+        
+        Returns None when admitted (the caller must call end_join), otherwise
+        a retry-after hint in seconds.
+        """
+        self._refill_join_tokens()
+        
+        if (
+            self.draining
+            or self.concurrent_joins >= settings.MAX_CONCURRENT_JOINS
+            or self._join_tokens < 1
+            or self.is_overloaded()
+        ):
+            self.rejected_joins += 1
+            return self._retry_after()
+        
+        self._join_tokens -= 1
+        self.concurrent_joins += 1
+        return None
+    
+    def end_join(self):
+        """Release a join slot reserved by begin_join."""
+        self.concurrent_joins = max(0, self.concurrent_joins - 1)
+    
+    def not_ready_reason(self, active_connections: int) -> Optional[str]:
+        """Why new traffic should not be routed here, or None if it may be."""
+        if self.draining:
+            return "draining"
+        if not snapshot_loader.ready:
+            return "loading"
+        if active_connections >= settings.MAX_CONNECTIONS or self.is_overloaded():
+            return "overloaded"
+        return None
+    
+    def is_ready(self, active_connections: int) -> bool:
+        """Check if the load balancer should keep routing new traffic here."""
+        return self.not_ready_reason(active_connections) is None
+    
+    def get_stats(self) -> dict:
+        """Get admission control statistics."""
+        return {
+            "loop_lag_ms": round(self.loop_lag_ms, 2),
+            "max_loop_lag_ms": round(self.max_loop_lag_ms, 2),
+            "overloaded": self.is_overloaded(),
+            "draining": self.draining,
+            "concurrent_joins": self.concurrent_joins,
+            "rejected_connections": self.rejected_connections,
+            "rejected_joins": self.rejected_joins
+        }
+
+
+# Global admission controller
+admission = AdmissionController()
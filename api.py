@@ -1,8 +1,14 @@
 """REST API endpoints for room management."""
-from fastapi import APIRouter, HTTPException, Header, status
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Header, Query, Response, status
 from typing import Optional
 from models import RoomCreateRequest, RoomCreateResponse, RoomInfoResponse
-from room_manager import room_manager
+from room_manager import room_manager, RoomLimitReached
+from topology import TOPOLOGIES, PRESENTER
+from presence import PRESENCE_MODES
+from chat_history import chat_history
+from chat_log import chat_log
+from join_tokens import join_tokens
 from config import settings
 
 
@@ -26,6 +32,25 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)) -> bool:
     return True
 
 
+def room_etag(room_code: str, version: int, expires_at: datetime) -> str:
+    """Strong ETag for a room; also changes once the room passes its expiry."""
+    expired = "-expired" if datetime.utcnow() >= expires_at else ""
+    return f'"{room_code}-{version}{expired}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the current ETag."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
 @router.post("/rooms", response_model=RoomCreateResponse, status_code=status.HTTP_201_CREATED)
 async def create_room(
     request: RoomCreateRequest,
@@ -46,10 +71,32 @@ async def create_room(
     {
         "owner_id": "teacher_123",
         "ttl_hours": 2,
-        "max_participants": 30
+        "max_participants": 30,
+        "topology": "presenter",
+        "presenter_ids": ["teacher_123"]
     }
     ```
     
+    **Topologies:**
+    - `mesh`: everyone connects to everyone (default, best for small rooms)
+    - `presenter`: only the owner and `presenter_ids` are offered to everyone
+    - `grid-limited`: everyone connects to the `grid_size` most recent speakers
+    
+    **Presence modes:**
+    - `immediate`: one `peer_joined`/`peer_left` frame per change (default)
+    - `coalesced`: changes batched into versioned `roster_delta` frames
+    
+    **Join tokens:** with `"issue_join_tokens": true` the response also carries
+    signed `host` (bound to `owner_id`) and `participant` tokens (requires
+    JOIN_TOKEN_KEYS), plus `presenter_tokens` bound to each presenter id.
+    Clients pass one as `join_token` in `join_room`; the server checks it
+    without a storage read.
+    
+    In `presenter` rooms only the host token holder and users whose
+    `user_id` comes from a token (owner or `presenter_ids`) may publish; a
+    bare `user_id` in `join_room` is not trusted, so `presenter` rooms can
+    only be created here when JOIN_TOKEN_KEYS is set.
+    
     **Returns:** Room code and metadata for participants to join.
     """
     verify_api_key(x_api_key)
@@ -67,32 +114,129 @@ async def create_room(
             detail="ttl_hours must be between 1 and 168 (7 days)"
         )
     
-    room = room_manager.create_room(
-        owner_id=request.owner_id,
-        ttl_hours=request.ttl_hours,
-        max_participants=request.max_participants
-    )
+    if request.topology and request.topology not in TOPOLOGIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"topology must be one of: {', '.join(TOPOLOGIES)}"
+        )
+    
+    if request.grid_size is not None and (request.grid_size < 1 or request.grid_size > 25):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="grid_size must be between 1 and 25"
+        )
+    
+    if request.presence_mode and request.presence_mode not in PRESENCE_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"presence_mode must be one of: {', '.join(PRESENCE_MODES)}"
+        )
+    
+    if request.issue_join_tokens and not join_tokens.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Join tokens are not configured (set JOIN_TOKEN_KEYS)"
+        )
+    
+    # Without tokens nobody joining a REST-created presenter room could publish
+    if request.topology == PRESENTER and not join_tokens.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="presenter topology requires join tokens (set JOIN_TOKEN_KEYS)"
+        )
+    
+    try:
+        room = room_manager.create_room(
+            owner_id=request.owner_id,
+            ttl_hours=request.ttl_hours,
+            max_participants=request.max_participants,
+            topology=request.topology,
+            presenter_ids=request.presenter_ids,
+            grid_size=request.grid_size,
+            presence_mode=request.presence_mode
+        )
+    except RoomLimitReached:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Room limit reached, try again later"
+        )
     
     return RoomCreateResponse(
         room_code=room.room_code,
         created_at=room.created_at.isoformat(),
         expires_at=room.expires_at.isoformat(),
-        owner_id=request.owner_id
+        owner_id=request.owner_id,
+        topology=room.topology,
+        join_tokens={
+            "host": join_tokens.issue(room.room_code, room.expires_at, "host", room.max_participants, request.owner_id),
+            "participant": join_tokens.issue(room.room_code, room.expires_at, "participant", room.max_participants)
+        } if request.issue_join_tokens else None,
+        presenter_tokens={
+            user_id: join_tokens.issue(room.room_code, room.expires_at, "participant", room.max_participants, user_id)
+            for user_id in room.presenter_ids
+        } if request.issue_join_tokens and room.presenter_ids else None
     )
 
 
+@router.post("/rooms/{room_code}/join-tokens")
+async def issue_room_join_tokens(
+    room_code: str,
+    x_api_key: Optional[str] = Header(None),
+    user_id: Optional[str] = None
+):
+    """
+    Issue fresh signed join tokens for an existing room (requires API key).
+    
+    Use after rotating JOIN_TOKEN_KEYS, or for rooms created without tokens.
+    With `user_id` the tokens are bound to that user, which is how a
+    presenter in `presenter_ids` gets to publish. Tokens expire with the room.
+    """
+    verify_api_key(x_api_key)
+    
+    if not join_tokens.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Join tokens are not configured (set JOIN_TOKEN_KEYS)"
+        )
+    
+    room = room_manager.get_room(room_code)
+    
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Room not found"
+        )
+    
+    return {
+        "room_code": room.room_code,
+        "expires_at": room.expires_at.isoformat(),
+        "join_tokens": join_tokens.issue_all(room.room_code, room.expires_at, room.max_participants, user_id)
+    }
+
+
 @router.get("/rooms/{room_code}", response_model=RoomInfoResponse)
 async def get_room_info(
     room_code: str,
-    x_api_key: Optional[str] = Header(None)
+    response: Response,
+    x_api_key: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get information about a room (requires API key).
     
     Returns room metadata including participant count and state.
+    
+    The response carries an `ETag`; send it back as `If-None-Match` to get an
+    empty `304 Not Modified` while the room is unchanged.
     """
     verify_api_key(x_api_key)
     
+    if if_none_match:
+        # Compare versions before decoding the room or its participants
+        current = room_manager.storage.get_room_version(room_code)
+        if current and etag_matches(if_none_match, room_etag(room_code, *current)):
+            return not_modified(room_etag(room_code, *current))
+    
     room = room_manager.get_room(room_code)
     
     if not room:
@@ -101,6 +245,7 @@ async def get_room_info(
             detail="Room not found"
         )
     
+    response.headers["ETag"] = room_etag(room.room_code, room.version, room.expires_at)
     return RoomInfoResponse(
         room_code=room.room_code,
         created_at=room.created_at.isoformat(),
@@ -108,7 +253,8 @@ async def get_room_info(
         state=room.state,
         participant_count=len(room.participants),
         max_participants=room.max_participants,
-        participants=room.get_participant_list()
+        participants=room.get_participant_list(),
+        topology=room.topology
     )
 
 
@@ -134,10 +280,40 @@ async def delete_room(
     
     room.close()
     room_manager.delete_room(room_code)
+    chat_history.drop_room(room_code)
     
     return {"message": f"Room {room_code} deleted successfully"}
 
 
+@router.get("/rooms/{room_code}/chat")
+async def get_chat_transcript(
+    room_code: str,
+    x_api_key: Optional[str] = Header(None),
+    from_seq: int = Query(1, alias="from", ge=1),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Get a range of a room's chat transcript (requires API key).
+    
+    Transcripts outlive the room itself, subject to the retention policy.
+    
+    **Parameters:**
+    - from: Sequence number of the first message to return (default: 1)
+    - limit: Maximum number of messages (1-1000, default: 100)
+    
+    **Returns:** Messages in order and `next`, the sequence number to continue from.
+    """
+    verify_api_key(x_api_key)
+    
+    if not chat_log:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat transcripts are disabled"
+        )
+    
+    return chat_log.read_range(room_code, from_seq=from_seq, limit=limit)
+
+
 @router.post("/rooms/_cleanup")
 async def cleanup_expired_rooms(x_api_key: Optional[str] = Header(None)):
     """
@@ -154,7 +330,9 @@ async def cleanup_expired_rooms(x_api_key: Optional[str] = Header(None)):
 
 @router.get("/rooms")
 async def list_rooms(
+    response: Response,
     x_api_key: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
     state: Optional[str] = None
 ):
     """
@@ -165,11 +343,16 @@ async def list_rooms(
     **Parameters:**
     - state: Filter by room state (open, closed, expired)
     
-    **Returns:** List of rooms with basic information.
+    **Returns:** List of rooms with basic information. Supports `If-None-Match`.
     """
     verify_api_key(x_api_key)
     
-    rooms = room_manager.storage.get_all_rooms()
+    etag = f'W/"rooms-{room_manager.listing_version()}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    rooms = [room_manager.mark_expired(r) for r in room_manager.storage.get_all_rooms()]
     
     if state:
         rooms = [r for r in rooms if r.state == state]
@@ -191,17 +374,26 @@ async def list_rooms(
 
 
 @router.get("/statistics")
-async def get_statistics(x_api_key: Optional[str] = Header(None)):
+async def get_statistics(
+    response: Response,
+    x_api_key: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Get platform-wide statistics.
     
     **Authentication:** Requires X-API-Key header
     
-    **Returns:** Aggregated statistics about rooms and participants.
+    **Returns:** Aggregated statistics about rooms and participants. Supports `If-None-Match`.
     """
     verify_api_key(x_api_key)
     
-    rooms = room_manager.storage.get_all_rooms()
+    etag = f'W/"stats-{room_manager.listing_version()}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    
+    rooms = [room_manager.mark_expired(r) for r in room_manager.storage.get_all_rooms()]
     
     total_participants = sum(len(r.participants) for r in rooms)
     open_rooms = [r for r in rooms if r.state == "open"]
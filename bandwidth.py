@@ -0,0 +1,71 @@
+"""Recommended video encoding profiles scaled to room size and topology."""
+from typing import Dict, Optional
+from config import settings
+from models import Room
+from topology import topology_manager, MESH
+
+
+# (minimum kbps per stream, max height, max framerate), best first
+LADDER = (
+    (1200, 720, 30),
+    (700, 540, 30),
+    (400, 360, 30),
+    (250, 270, 24),
+    (150, 180, 15),
+    (0, 180, 10)
+)
+
+
+class BandwidthAdvisor:
+    """Splits a client's uplink budget across the video streams it sends.
+    
+    Peers are connected directly, so a participant encodes one stream per
+    peer connection: in a mesh that is everyone else, in presenter and
+    grid-limited rooms publishers send to everyone and viewers only to the
+    publishers. The per-stream share of UPLINK_BUDGET_KBPS (after audio)
+    picks a rung of LADDER. Profiles only depend on the stream count and
+    are cached.
+    """
+    
+    def __init__(self):
+        self._profiles: Dict[int, dict] = {}
+    
+    def profile(self, streams: int) -> dict:
+        """Encoding limits for one client sending `streams` video streams."""
+        streams = max(1, streams)
+        cached = self._profiles.get(streams)
+        if cached is not None:
+            return cached
+        
+        video_budget = max(0, settings.UPLINK_BUDGET_KBPS - streams * settings.AUDIO_BITRATE_KBPS)
+        per_stream = min(settings.MAX_VIDEO_BITRATE_KBPS, video_budget // streams)
+        per_stream = max(settings.MIN_VIDEO_BITRATE_KBPS, per_stream)
+        
+        for min_kbps, max_height, max_framerate in LADDER:
+            if per_stream >= min_kbps:
+                break
+        
+        profile = self._profiles[streams] = {
+            "max_bitrate_kbps": per_stream,
+            "max_height": max_height,
+            "max_framerate": max_framerate,
+            "streams": streams
+        }
+        return profile
+    
+    def room_profiles(self, room: Room) -> Optional[dict]:
+        """Profiles for a room's publishers and viewers (identical in a mesh)."""
+        if not settings.BANDWIDTH_PROFILES:
+            return None
+        
+        others = len(room.participants) - 1
+        publisher = self.profile(others)
+        if room.topology == MESH:
+            return {"publisher": publisher, "viewer": publisher}
+        
+        publishers = len(topology_manager.get_publishers(room))
+        return {"publisher": publisher, "viewer": self.profile(min(publishers, others))}
+
+
+# Global bandwidth advisor
+bandwidth_advisor = BandwidthAdvisor()
@@ -0,0 +1,661 @@
+"""Binary room storage: an append-only record file plus a memory-mapped hash index."""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from models import Room
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single worker only
+    fcntl = None
+
+
+RECORDS_MAGIC = b"RMREC001"
+INDEX_MAGIC = b"RMIDX001"
+
+# Record file header: magic, generation (shared with the matching index)
+RECORDS_HEADER = struct.Struct("<8sQ")
+# Record: payload bytes, flags, code bytes, participants, version, expires_at (us since epoch)
+RECORD_HEADER = struct.Struct("<IBBHQq")
+# Index header: magic, generation, capacity, rooms, deleted slots, retired, live record bytes
+INDEX_HEADER = struct.Struct("<8sQIIIIQ")
+# Index slot: tag (room code hash), record offset
+SLOT = struct.Struct("<QQ")
+OFFSET = struct.Struct("<Q")
+
+LIVE = 0
+TOMBSTONE = 1
+
+# Slot tags 0 and 1 are reserved; real tags always have bit 1 set
+EMPTY_SLOT = 0
+DELETED_SLOT = 1
+
+MIN_CAPACITY = 1024
+MAX_LOAD = 0.7
+# Rewrite the record file once it is mostly superseded records
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def room_tag(room_code: str) -> int:
+    """64-bit hash of a room code, never equal to a reserved slot tag."""
+    digest = hashlib.blake2b(room_code.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | 2
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def encode_record(room_code: str, room_data: Optional[dict]) -> bytes:
+    """Encode a room in its stored (JSON-ready) form; None encodes a deletion."""
+    code = room_code.encode()
+    if room_data is None:
+        return RECORD_HEADER.pack(0, TOMBSTONE, len(code), 0, 0, 0) + code
+    
+    payload = json.dumps(room_data, separators=(",", ":"), default=str).encode()
+    return RECORD_HEADER.pack(
+        len(payload), LIVE, len(code),
+        min(len(room_data.get("participants", {})), 0xFFFF),
+        room_data.get("version", 0),
+        to_micros(datetime.fromisoformat(room_data["expires_at"]))
+    ) + code + payload
+
+
+def capacity_for(rooms: int) -> int:
+    """Power-of-two slot count that keeps a fresh index at most half full."""
+    capacity = MIN_CAPACITY
+    while capacity < rooms * 2:
+        capacity *= 2
+    return capacity
+
+
+def build_index(slots: List[Tuple[int, int]], capacity: int, generation: int, live_bytes: int) -> bytearray:
+    """Lay out an index for (tag, offset) pairs with linear probing."""
+    index = bytearray(INDEX_HEADER.size + capacity * SLOT.size)
+    INDEX_HEADER.pack_into(index, 0, INDEX_MAGIC, generation, capacity, len(slots), 0, 0, live_bytes)
+    mask = capacity - 1
+    for tag, offset in slots:
+        position = (tag >> 2) & mask
+        while SLOT.unpack_from(index, INDEX_HEADER.size + position * SLOT.size)[0] != EMPTY_SLOT:
+            position = (position + 1) & mask
+        SLOT.pack_into(index, INDEX_HEADER.size + position * SLOT.size, tag, offset)
+    return index
+
+
+def _write_file(path: Path, data) -> Path:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def write_files(records_path: Path, index_path: Path, records: Iterable[Tuple[str, bytes]]) -> int:
+    """Write a fresh record file and index from (room_code, encoded record) pairs.
+    
+    Records are streamed to disk; only their tags and offsets are kept in
+    memory to build the index. Both files are replaced atomically, the
+    record file first. Returns the number of rooms written.
+    """
+    generation = int.from_bytes(os.urandom(8), "little")
+    records_tmp = records_path.with_name(records_path.name + ".tmp")
+    slots = []
+    live_bytes = 0
+    
+    with open(records_tmp, "wb", buffering=1024 * 1024) as f:
+        f.write(RECORDS_HEADER.pack(RECORDS_MAGIC, generation))
+        offset = RECORDS_HEADER.size
+        for room_code, record in records:
+            f.write(record)
+            slots.append((room_tag(room_code), offset))
+            offset += len(record)
+            live_bytes += len(record)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    index_tmp = _write_file(index_path, build_index(slots, capacity_for(len(slots)), generation, live_bytes))
+    os.replace(records_tmp, records_path)
+    os.replace(index_tmp, index_path)
+    return len(slots)
+
+
+class RecordView:
+    """Reads one generation of the record file through a private descriptor.
+    
+    Iterators pin the index they started from together with one of these,
+    so compaction or an index rebuild while they are suspended cannot point
+    old offsets at a new record file. The retired files stay readable
+    until the view is closed.
+    """
+    
+    def __init__(self, fd: int, records: mmap.mmap):
+        self.fd = fd
+        self.records = records
+    
+    def covering(self, end: int) -> mmap.mmap:
+        """The mapping, extended if records were appended past it."""
+        if end > len(self.records):
+            self.records = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+        return self.records
+    
+    def header(self, offset: int) -> tuple:
+        return RECORD_HEADER.unpack_from(self.covering(offset + RECORD_HEADER.size), offset)
+    
+    def code(self, offset: int, code_length: int) -> str:
+        start = offset + RECORD_HEADER.size
+        return self.covering(start + code_length)[start:start + code_length].decode()
+    
+    def payload(self, offset: int) -> bytes:
+        length, _, code_length = self.header(offset)[:3]
+        start = offset + RECORD_HEADER.size + code_length
+        return self.covering(start + length)[start:start + length]
+    
+    def close(self):
+        os.close(self.fd)
+
+
+class BinaryStorage:
+    """Room storage in a binary record file with a memory-mapped hash index.
+    
+    `<name>.rec` is an append-only log of length-prefixed records, one per
+    saved room version, each holding the room's JSON plus a fixed header
+    (version, expiry, participant count). `<name>.idx` is an open-addressing
+    hash table from room code to the offset of the room's latest record.
+    
+    Both files are mmapped, so a point lookup probes a few index slots and
+    decodes a single record, cold start maps the index without reading any
+    rooms, and workers on one host share the files through the page cache.
+    Writes append a record and update the index in place under the same
+    locks as JSONStorage. Growing the index or compacting the record file
+    writes new files and marks the old index retired, which tells other
+    workers to map the new ones.
+    """
+    
+    def __init__(self, file_path: str):
+        self.file_path = Path(file_path)
+        self.records_path = self.file_path.with_suffix(".rec")
+        self.index_path = self.file_path.with_suffix(".idx")
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._records_fd: Optional[int] = None
+        self._records: Optional[mmap.mmap] = None
+        self._index: Optional[mmap.mmap] = None
+        self.compactions: int = 0
+        self.index_rebuilds: int = 0
+        
+        self.records_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._exclusive():
+            if not self._files_match():
+                self._recover()
+            self._map()
+    
+    @contextmanager
+    def _exclusive(self):
+        """Hold the storage lock, across processes when possible."""
+        with self.lock:
+            if fcntl is None or not settings.STORAGE_FILE_LOCK:
+                yield
+                return
+            
+            if self._lock_file is None:
+                self._lock_file = open(self.records_path.with_name(self.records_path.name + ".lock"), "a")
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _files_match(self) -> bool:
+        """Whether both files exist and belong to the same generation."""
+        try:
+            with open(self.records_path, "rb") as f:
+                records_magic, records_generation = RECORDS_HEADER.unpack(f.read(RECORDS_HEADER.size))
+            with open(self.index_path, "rb") as f:
+                header = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return False
+        return records_magic == RECORDS_MAGIC and header[0] == INDEX_MAGIC and header[1] == records_generation
+    
+    def _recover(self):
+        """Rebuild both files from whatever records survive (or start empty)."""
+        latest: Dict[str, bytes] = {}
+        for room_code, flags, record in self._scan_records():
+            if flags == TOMBSTONE:
+                latest.pop(room_code, None)
+            else:
+                latest[room_code] = record
+        
+        if self.records_path.exists():
+            print(f"Rebuilding room index from {self.records_path} ({len(latest)} rooms)")
+        write_files(self.records_path, self.index_path, latest.items())
+    
+    def _scan_records(self) -> Iterator[Tuple[str, int, bytes]]:
+        """Yield (room_code, flags, record) for every intact record in file order."""
+        try:
+            with open(self.records_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if data[:len(RECORDS_MAGIC)] != RECORDS_MAGIC:
+            return
+        
+        offset = RECORDS_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            length, flags, code_length = RECORD_HEADER.unpack_from(data, offset)[:3]
+            end = offset + RECORD_HEADER.size + code_length + length
+            if end > len(data):
+                break  # Torn final append
+            start = offset + RECORD_HEADER.size
+            yield data[start:start + code_length].decode(), flags, data[offset:end]
+            offset = end
+    
+    def _map(self):
+        """Map the current files (caller holds the exclusive lock)."""
+        if self._records_fd is not None:
+            os.close(self._records_fd)
+        self._records_fd = os.open(self.records_path, os.O_RDWR)
+        self._records = mmap.mmap(self._records_fd, 0, access=mmap.ACCESS_READ)
+        
+        fd = os.open(self.index_path, os.O_RDWR)
+        try:
+            # Old mappings are left to the garbage collector: readers may still hold them
+            self._index = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+    
+    def _current(self) -> mmap.mmap:
+        """The index mapping, remapped first if another worker replaced the files."""
+        index = self._index
+        if INDEX_HEADER.unpack_from(index, 0)[5]:
+            with self._exclusive():
+                if INDEX_HEADER.unpack_from(self._index, 0)[5]:
+                    self._map()
+                index = self._index
+        return index
+    
+    @contextmanager
+    def _pinned(self) -> Iterator[Tuple[mmap.mmap, RecordView]]:
+        """The current index and a RecordView of the record file it indexes."""
+        with self.lock:
+            index = self._current()
+            view = RecordView(os.dup(self._records_fd), self._records)
+        try:
+            yield index, view
+        finally:
+            view.close()
+    
+    def _replace_files(self, records: Optional[Iterable[Tuple[str, bytes]]] = None):
+        """Install a rebuilt index (and record file, when given) and retire the old one."""
+        if records is None:
+            header = INDEX_HEADER.unpack_from(self._index, 0)
+            slots = [(tag, offset) for tag, offset in self._iter_slots(self._index)]
+            index_tmp = _write_file(
+                self.index_path, build_index(slots, capacity_for(len(slots)), header[1], header[6])
+            )
+            os.replace(index_tmp, self.index_path)
+            self.index_rebuilds += 1
+        else:
+            write_files(self.records_path, self.index_path, records)
+            self.compactions += 1
+        
+        old_index = self._index
+        header = list(INDEX_HEADER.unpack_from(old_index, 0))
+        header[5] = 1
+        INDEX_HEADER.pack_into(old_index, 0, *header)
+        self._map()
+    
+    def _records_covering(self, end: int) -> mmap.mmap:
+        """The record mapping, extended if another worker appended past it."""
+        records = self._records
+        if end > len(records):
+            with self.lock:
+                if end > len(self._records):
+                    self._records = mmap.mmap(self._records_fd, 0, access=mmap.ACCESS_READ)
+                records = self._records
+        return records
+    
+    def _record_header(self, offset: int) -> tuple:
+        """(payload length, flags, code length, participants, version, expires_at)."""
+        return RECORD_HEADER.unpack_from(self._records_covering(offset + RECORD_HEADER.size), offset)
+    
+    def _record_code(self, offset: int, code_length: int) -> str:
+        start = offset + RECORD_HEADER.size
+        return self._records_covering(start + code_length)[start:start + code_length].decode()
+    
+    def _record_payload(self, offset: int) -> bytes:
+        length, _, code_length = self._record_header(offset)[:3]
+        start = offset + RECORD_HEADER.size + code_length
+        return self._records_covering(start + length)[start:start + length]
+    
+    def _record_size(self, offset: int) -> int:
+        length, _, code_length = self._record_header(offset)[:3]
+        return RECORD_HEADER.size + code_length + length
+    
+    @staticmethod
+    def _iter_slots(index: mmap.mmap) -> Iterator[Tuple[int, int]]:
+        """Yield (tag, offset) of every occupied slot."""
+        capacity = INDEX_HEADER.unpack_from(index, 0)[2]
+        for tag, offset in SLOT.iter_unpack(memoryview(index)[INDEX_HEADER.size:INDEX_HEADER.size + capacity * SLOT.size]):
+            if tag > DELETED_SLOT:
+                yield tag, offset
+    
+    def _probe(self, index: mmap.mmap, room_code: str) -> Tuple[int, int]:
+        """Find a room's slot: (position, record offset).
+        
+        The offset is -1 when the room is absent; the position is then
+        where it would be inserted.
+        """
+        capacity = INDEX_HEADER.unpack_from(index, 0)[2]
+        tag = room_tag(room_code)
+        mask = capacity - 1
+        position = (tag >> 2) & mask
+        free = -1
+        
+        while True:
+            slot_tag, offset = SLOT.unpack_from(index, INDEX_HEADER.size + position * SLOT.size)
+            if slot_tag == EMPTY_SLOT:
+                return (free if free >= 0 else position), -1
+            if slot_tag == DELETED_SLOT:
+                if free < 0:
+                    free = position
+            elif slot_tag == tag and self._record_code(offset, self._record_header(offset)[2]) == room_code:
+                return position, offset
+            position = (position + 1) & mask
+    
+    def _lookup(self, room_code: str) -> int:
+        """Offset of a room's latest record, or -1."""
+        return self._probe(self._current(), room_code)[1]
+    
+    def _stored(self, offset: int) -> dict:
+        return json.loads(self._record_payload(offset))
+    
+    def _apply(self, changes: List[Tuple[str, Optional[dict]]]):
+        """Append records for changed rooms (None deletes them) and index them.
+        
+        Caller holds the exclusive lock and has called _current().
+        """
+        if not changes:
+            return
+        blobs = [encode_record(room_code, room_data) for room_code, room_data in changes]
+        data = b"".join(blobs)
+        offset = os.lseek(self._records_fd, 0, os.SEEK_END)
+        written = 0
+        while written < len(data):
+            written += os.write(self._records_fd, data[written:])
+        
+        for (room_code, room_data), blob in zip(changes, blobs):
+            index = self._index
+            header = list(INDEX_HEADER.unpack_from(index, 0))
+            _, _, capacity, rooms, deleted, _, live_bytes = header
+            if room_data is not None and (rooms + deleted + 1) > capacity * MAX_LOAD:
+                self._replace_files()
+                index = self._index
+                header = list(INDEX_HEADER.unpack_from(index, 0))
+                _, _, capacity, rooms, deleted, _, live_bytes = header
+            
+            position, old_offset = self._probe(index, room_code)
+            slot = INDEX_HEADER.size + position * SLOT.size
+            if old_offset >= 0:
+                live_bytes -= self._record_size(old_offset)
+            
+            if room_data is None:
+                if old_offset >= 0:
+                    SLOT.pack_into(index, slot, DELETED_SLOT, 0)
+                    rooms -= 1
+                    deleted += 1
+            elif old_offset >= 0:
+                OFFSET.pack_into(index, slot + 8, offset)
+                live_bytes += len(blob)
+            else:
+                if SLOT.unpack_from(index, slot)[0] == DELETED_SLOT:
+                    deleted -= 1
+                # Offset before tag: lock-free readers never see a tag without its record
+                OFFSET.pack_into(index, slot + 8, offset)
+                OFFSET.pack_into(index, slot, room_tag(room_code))
+                rooms += 1
+                live_bytes += len(blob)
+            
+            header[3:5] = [rooms, deleted]
+            header[6] = live_bytes
+            INDEX_HEADER.pack_into(index, 0, *header)
+            offset += len(blob)
+        
+        self._maybe_compact()
+    
+    def _maybe_compact(self):
+        """Rewrite the record file once superseded records dominate it."""
+        size = os.fstat(self._records_fd).st_size
+        live_bytes = INDEX_HEADER.unpack_from(self._index, 0)[6]
+        if size < COMPACT_MIN_BYTES or size < 2 * live_bytes:
+            return
+        
+        started = time.perf_counter()
+        index = self._index
+        records = self._records_covering(size)
+        
+        def live_records():
+            for _, offset in self._iter_slots(index):
+                length, _, code_length = RECORD_HEADER.unpack_from(records, offset)[:3]
+                start = offset + RECORD_HEADER.size
+                end = start + code_length + length
+                yield records[start:start + code_length].decode(), records[offset:end]
+        
+        self._replace_files(live_records())
+        print(f"Compacted {self.records_path}: {size} -> {live_bytes + RECORDS_HEADER.size} bytes "
+              f"in {time.perf_counter() - started:.2f}s")
+    
+    def map_snapshot(self) -> dict:
+        """Cold start: the files are already mapped, so just report them."""
+        header = INDEX_HEADER.unpack_from(self._current(), 0)
+        return {
+            "backend": "binary",
+            "rooms_indexed": header[3],
+            "index_bytes": len(self._index),
+            "record_bytes": len(self._records)
+        }
+    
+    def save_room(self, room: Room) -> bool:
+        """Save or update a room, bumping its version."""
+        with self._exclusive():
+            offset = self._probe(self._current(), room.room_code)[1]
+            stored_version = self._record_header(offset)[4] if offset >= 0 else 0
+            # Never reuse a version, even when saving a stale copy
+            room.version = max(room.version, stored_version) + 1
+            self._apply([(room.room_code, room.model_dump(mode='json'))])
+        return True
+    
+    def mutate_room(self, room_code: str, mutate: Callable[[Room], bool]) -> Tuple[Optional[Room], bool]:
+        """Atomically apply `mutate` to the stored room and save it if it returns True.
+        
+        Returns (room, changed); room is None if it doesn't exist.
+        """
+        with self._exclusive():
+            offset = self._probe(self._current(), room_code)[1]
+            if offset < 0:
+                return None, False
+            
+            room = Room.model_validate_json(self._record_payload(offset))
+            if not mutate(room):
+                return room, False
+            
+            room.version = self._record_header(offset)[4] + 1
+            self._apply([(room_code, room.model_dump(mode='json'))])
+            return room, True
+    
+    def get_room(self, room_code: str) -> Optional[Room]:
+        """Get a room by code, decoding only its record."""
+        offset = self._lookup(room_code)
+        if offset < 0:
+            return None
+        return Room.model_validate_json(self._record_payload(offset))
+    
+    def get_room_version(self, room_code: str) -> Optional[Tuple[int, datetime]]:
+        """Get (version, expires_at) of a room from its record header."""
+        offset = self._lookup(room_code)
+        if offset < 0:
+            return None
+        header = self._record_header(offset)
+        return header[4], from_micros(header[5])
+    
+    def data_version(self) -> str:
+        """Opaque version of the whole data set; changes on every write."""
+        st = os.stat(self.records_path)
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}-{st.st_ino:x}"
+    
+    def delete_room(self, room_code: str) -> bool:
+        """Delete a room."""
+        return bool(self.delete_rooms([room_code]))
+    
+    def delete_rooms(self, room_codes: List[str], only_empty: bool = False) -> List[str]:
+        """Delete several rooms with a single append. Returns the codes deleted.
+        
+        With only_empty, rooms that have participants again are kept.
+        """
+        with self._exclusive():
+            index = self._current()
+            deleted = []
+            for code in dict.fromkeys(room_codes):
+                offset = self._probe(index, code)[1]
+                if offset < 0 or (only_empty and self._record_header(offset)[3]):
+                    continue
+                deleted.append(code)
+            self._apply([(code, None) for code in deleted])
+        return deleted
+    
+    def count_rooms(self) -> int:
+        """Number of stored rooms."""
+        return INDEX_HEADER.unpack_from(self._current(), 0)[3]
+    
+    def room_codes(self) -> Set[str]:
+        """Codes of all stored rooms, read from record headers."""
+        with self._pinned() as (index, view):
+            return {view.code(offset, view.header(offset)[2]) for _, offset in self._iter_slots(index)}
+    
+    def get_all_rooms(self) -> List[Room]:
+        """Get all rooms."""
+        rooms = []
+        with self._pinned() as (index, view):
+            for _, offset in self._iter_slots(index):
+                try:
+                    rooms.append(Room.model_validate_json(view.payload(offset)))
+                except Exception as e:
+                    print(f"Error loading room: {e}")
+                    continue
+        return rooms
+    
+    def cleanup_expired_rooms(self) -> List[str]:
+        """Remove expired rooms, judged from record headers. Returns their codes."""
+        with self._exclusive():
+            index = self._current()
+            now = to_micros(datetime.utcnow())
+            expired = []
+            for _, offset in self._iter_slots(index):
+                header = self._record_header(offset)
+                if header[5] <= now:
+                    expired.append(self._record_code(offset, header[2]))
+            self._apply([(code, None) for code in expired])
+        return expired
+    
+    def iter_room_records(self) -> Iterator[dict]:
+        """Yield rooms in their stored (JSON-ready) form, one at a time.
+        
+        The index and record file are pinned for the whole iteration, so a
+        compaction between two rooms cannot redirect the remaining offsets.
+        """
+        with self._pinned() as (index, view):
+            for _, offset in self._iter_slots(index):
+                yield json.loads(view.payload(offset))
+    
+    def iter_room_sizes(self) -> Iterator[Tuple[str, int, int]]:
+        """Yield (room_code, stored bytes, participants) from record headers, without decoding."""
+        with self.lock:
+            index = self._current()
+            sizes = []
+            for _, offset in self._iter_slots(index):
+                header = self._record_header(offset)
+                sizes.append((self._record_code(offset, header[2]), header[0], header[3]))
+        return iter(sizes)
+    
+    def save_rooms_bulk(self, rooms: List[Room], policy: str = "overwrite") -> Dict[str, int]:
+        """Apply a batch of rooms with a single append (same policies as JSONStorage)."""
+        counts = {"created": 0, "overwritten": 0, "merged": 0, "skipped": 0}
+        with self._exclusive():
+            index = self._current()
+            changes: Dict[str, dict] = {}
+            
+            for room in rooms:
+                incoming = room.model_dump(mode='json')
+                existing = changes.get(room.room_code)
+                if existing is None:
+                    offset = self._probe(index, room.room_code)[1]
+                    existing = self._stored(offset) if offset >= 0 else None
+                
+                if existing is None:
+                    changes[room.room_code] = incoming
+                    counts["created"] += 1
+                elif policy == "skip":
+                    counts["skipped"] += 1
+                elif policy == "overwrite":
+                    incoming["version"] = existing.get("version", 0) + 1
+                    changes[room.room_code] = incoming
+                    counts["overwritten"] += 1
+                else:
+                    merged = dict(existing)
+                    participants = dict(existing.get("participants", {}))
+                    added = [sid for sid in incoming["participants"] if sid not in participants]
+                    participants.update(incoming["participants"])
+                    merged["participants"] = participants
+                    merged["roster_version"] = existing.get("roster_version", 0) + len(added)
+                    merged["version"] = existing.get("version", 0) + 1
+                    changes[room.room_code] = merged
+                    counts["merged"] += 1
+            
+            self._apply(list(changes.items()))
+        
+        return counts
+    
+    def find_participant_room(self, socket_id: str) -> Optional[str]:
+        """Find the code of the room a socket is in (scans rooms with participants)."""
+        with self._pinned() as (index, view):
+            for _, offset in self._iter_slots(index):
+                header = view.header(offset)
+                if header[3] and socket_id in json.loads(view.payload(offset)).get("participants", {}):
+                    return view.code(offset, header[2])
+        return None
+    
+    def flush(self):
+        """Force both files to disk."""
+        with self.lock:
+            os.fsync(self._records_fd)
+            self._index.flush()
+    
+    def get_stats(self) -> dict:
+        """Get file and index statistics."""
+        header = INDEX_HEADER.unpack_from(self._current(), 0)
+        size = os.fstat(self._records_fd).st_size
+        return {
+            "backend": "binary",
+            "rooms": header[3],
+            "index_capacity": header[2],
+            "index_load": round((header[3] + header[4]) / header[2], 3),
+            "record_file_bytes": size,
+            "live_record_bytes": header[6],
+            "compactions": self.compactions,
+            "index_rebuilds": self.index_rebuilds
+        }
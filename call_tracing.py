@@ -0,0 +1,242 @@
+"""Per-peer-pair call setup timelines and time-to-connect histograms."""
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from config import settings
+
+
+# Time-to-connect histogram bucket upper bounds (ms); the last bucket is open
+SETUP_BUCKETS_MS = (250, 500, 1000, 2000, 3000, 5000, 10000, 30000)
+# Room size classes the histograms are split by
+ROOM_SIZE_CLASSES = ((2, "2"), (4, "3-4"), (8, "5-8"), (16, "9-16"), (None, "17+"))
+# Signal types that mark the first ICE candidate
+CANDIDATE_TYPES = ("candidate", "ice-candidate")
+
+
+def room_size_class(size: int) -> str:
+    """Histogram label for a room size."""
+    for upper, label in ROOM_SIZE_CLASSES:
+        if upper is None or size <= upper:
+            return label
+    return ROOM_SIZE_CLASSES[-1][1]
+
+
+class CallSetup:
+    """Timeline of one peer pair, from the later join to `connected`.
+    
+    Stage times are monotonic seconds; `relay_ms` is the time the server
+    itself spent relaying this pair's signals, so slow setups can be told
+    apart from slow clients.
+    """
+    
+    def __init__(self, room_code: str, pair: Tuple[str, str], room_size: int, joined: float):
+        self.room_code = room_code
+        self.pair = pair
+        self.room_size = room_size
+        self.joined = joined
+        self.offer: Optional[float] = None
+        self.answer: Optional[float] = None
+        self.candidate: Optional[float] = None
+        self.connected: Optional[float] = None
+        self.offerer: Optional[str] = None
+        self.signals: int = 0
+        self.relay_ms: float = 0.0
+    
+    def _since_join(self, stamp: Optional[float]) -> Optional[float]:
+        return round((stamp - self.joined) * 1000, 1) if stamp is not None else None
+    
+    def total_ms(self) -> Optional[float]:
+        return self._since_join(self.connected)
+    
+    def to_dict(self) -> dict:
+        """Stage offsets in ms from the join that started the setup."""
+        return {
+            "room_code": self.room_code,
+            "peers": list(self.pair),
+            "offerer": self.offerer,
+            "room_size": self.room_size,
+            "offer_ms": self._since_join(self.offer),
+            "answer_ms": self._since_join(self.answer),
+            "first_candidate_ms": self._since_join(self.candidate),
+            "connected_ms": self._since_join(self.connected),
+            "signals": self.signals,
+            "server_relay_ms": round(self.relay_ms, 2)
+        }
+
+
+class SetupHistogram:
+    """Fixed-bucket time-to-connect histogram."""
+    
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(SETUP_BUCKETS_MS) + 1)
+        self.total_ms: float = 0.0
+        self.relay_ms: float = 0.0
+    
+    def record(self, setup_ms: float, relay_ms: float):
+        index = len(SETUP_BUCKETS_MS)
+        for i, bound in enumerate(SETUP_BUCKETS_MS):
+            if setup_ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total_ms += setup_ms
+        self.relay_ms += relay_ms
+    
+    def to_dict(self) -> dict:
+        count = sum(self.counts)
+        labels = [f"le_{bound}" for bound in SETUP_BUCKETS_MS] + [f"gt_{SETUP_BUCKETS_MS[-1]}"]
+        return {
+            "count": count,
+            "avg_ms": round(self.total_ms / count, 1) if count else None,
+            "avg_server_relay_ms": round(self.relay_ms / count, 2) if count else None,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class CallTracer:
+    """Traces call setup for every peer pair with bounded memory.
+    
+    A setup starts when the second peer of a pair joins and ends when
+    either peer reports `peer_connected`. Open setups are kept in an LRU
+    capped at CALL_TRACE_MAX_PENDING; completed ones only update the
+    histograms, and those slower than CALL_TRACE_SLOW_MS are kept in a ring
+    of the last CALL_TRACE_SLOW_KEEP for inspection. Everything else about a
+    socket is dropped when it leaves.
+    """
+    
+    def __init__(self):
+        self.enabled = settings.CALL_TRACE_ENABLED
+        # socket_id -> monotonic join time
+        self.join_times: Dict[str, float] = {}
+        # (socket_a, socket_b) sorted -> setup in progress
+        self.pending: "OrderedDict[Tuple[str, str], CallSetup]" = OrderedDict()
+        # Pairs already connected; their renegotiation offers aren't setups
+        self.connected_pairs: Set[Tuple[str, str]] = set()
+        # socket_id -> pending or connected pairs it is part of, to drop them on leave
+        self.pairs_by_socket: Dict[str, Set[Tuple[str, str]]] = {}
+        self.histograms: Dict[str, SetupHistogram] = {
+            label: SetupHistogram() for _, label in ROOM_SIZE_CLASSES
+        }
+        self.slow: Deque[dict] = deque(maxlen=settings.CALL_TRACE_SLOW_KEEP)
+        self.completed: int = 0
+        self.abandoned: int = 0
+        self.dropped: int = 0
+    
+    def record_join(self, socket_id: str):
+        """Note when a socket joined its room."""
+        if self.enabled:
+            self.join_times[socket_id] = time.monotonic()
+    
+    def forget(self, socket_id: str):
+        """Drop a socket that left; its unfinished setups count as abandoned."""
+        self.join_times.pop(socket_id, None)
+        for pair in list(self.pairs_by_socket.get(socket_id, ())):
+            self.connected_pairs.discard(pair)
+            if self.pending.pop(pair, None) is not None:
+                self.abandoned += 1
+            self._unlink(pair)
+    
+    def _unlink(self, pair: Tuple[str, str]):
+        for socket_id in pair:
+            pairs = self.pairs_by_socket.get(socket_id)
+            if pairs is not None:
+                pairs.discard(pair)
+                if not pairs:
+                    del self.pairs_by_socket[socket_id]
+    
+    def _start(self, room_code: str, pair: Tuple[str, str], room_size: int, now: float) -> CallSetup:
+        # Negotiation can't start before the later of the two joins
+        joined = max(self.join_times.get(socket_id, now) for socket_id in pair)
+        setup = self.pending[pair] = CallSetup(room_code, pair, room_size, joined)
+        for socket_id in pair:
+            self.pairs_by_socket.setdefault(socket_id, set()).add(pair)
+        
+        while len(self.pending) > settings.CALL_TRACE_MAX_PENDING:
+            oldest, _ = self.pending.popitem(last=False)
+            self._unlink(oldest)
+            self.dropped += 1
+        return setup
+    
+    def record_signal(
+        self,
+        room_code: str,
+        room_size: int,
+        from_id: str,
+        to_id: str,
+        signal_type: str,
+        relay_ms: float
+    ):
+        """Record a relayed signal; the first of each stage is kept."""
+        if not self.enabled:
+            return
+        
+        now = time.monotonic()
+        pair = tuple(sorted((from_id, to_id)))
+        setup = self.pending.get(pair)
+        if setup is None:
+            # Only an offer opens a setup; stray candidates after `connected`
+            # (or renegotiation) don't start a new one
+            if signal_type != "offer" or pair in self.connected_pairs:
+                return
+            setup = self._start(room_code, pair, room_size, now)
+        
+        setup.signals += 1
+        setup.relay_ms += relay_ms
+        if signal_type == "offer" and setup.offer is None:
+            setup.offer = now
+            setup.offerer = from_id
+        elif signal_type == "answer" and setup.answer is None:
+            setup.answer = now
+        elif signal_type in CANDIDATE_TYPES and setup.candidate is None:
+            setup.candidate = now
+    
+    def record_connected(self, socket_id: str, peer_id: str) -> bool:
+        """Complete a pair's setup when a client reports the peer connected."""
+        if not self.enabled:
+            return False
+        
+        pair = tuple(sorted((socket_id, peer_id)))
+        setup = self.pending.pop(pair, None)
+        if setup is None:
+            # Already reported by the other side, or never traced
+            return False
+        self.connected_pairs.add(pair)
+        
+        setup.connected = time.monotonic()
+        total_ms = setup.total_ms()
+        self.histograms[room_size_class(setup.room_size)].record(total_ms, setup.relay_ms)
+        self.completed += 1
+        
+        if total_ms >= settings.CALL_TRACE_SLOW_MS:
+            self.slow.append({**setup.to_dict(), "completed_at": datetime.utcnow().isoformat()})
+        return True
+    
+    def get_slow_setups(self, limit: int = 50, min_ms: Optional[float] = None) -> List[dict]:
+        """Most recent slow setups, newest first."""
+        setups = [
+            s for s in reversed(self.slow)
+            if min_ms is None or s["connected_ms"] >= min_ms
+        ]
+        return setups[:limit]
+    
+    def get_stats(self) -> dict:
+        """Time-to-connect histograms per room size and tracer counters."""
+        return {
+            "enabled": self.enabled,
+            "completed": self.completed,
+            "pending": len(self.pending),
+            "abandoned": self.abandoned,
+            "dropped": self.dropped,
+            "slow_threshold_ms": settings.CALL_TRACE_SLOW_MS,
+            "slow_kept": len(self.slow),
+            "by_room_size": {
+                label: histogram.to_dict()
+                for label, histogram in self.histograms.items()
+                if sum(histogram.counts)
+            }
+        }
+
+
+# Global call setup tracer
+call_tracer = CallTracer()
@@ -0,0 +1,123 @@
+"""Bounded in-memory chat history per room."""
+import json
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from config import settings
+
+
+class RoomChatBuffer:
+    """Ring buffer of a room's most recent chat messages."""
+    
+    def __init__(self):
+        # (message, encoded size in bytes), oldest first
+        self.messages: Deque[Tuple[dict, int]] = deque()
+        self.bytes: int = 0
+        self.next_seq: int = 1
+
+
+class ChatHistory:
+    """Keeps the last messages of every room, capped by count and bytes.
+    
+    Each message gets a per-room sequence number which doubles as the
+    cursor for paging backwards through history.
+    """
+    
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.rooms: Dict[str, RoomChatBuffer] = {}
+        self.total_bytes: int = 0
+        self.total_messages: int = 0
+        self.evicted_messages: int = 0
+    
+    def append(self, room_code: str, message: dict, seq: Optional[int] = None) -> dict:
+        """Store a message and return it with its sequence number.
+        
+        `seq` is assigned by the caller when a durable log numbers messages.
+        """
+        buffer = self.rooms.get(room_code)
+        if buffer is None:
+            buffer = self.rooms[room_code] = RoomChatBuffer()
+        
+        if seq is None:
+            seq = buffer.next_seq
+        message = {"seq": seq, **message}
+        buffer.next_seq = seq + 1
+        size = len(json.dumps(message, separators=(",", ":")).encode("utf-8"))
+        
+        buffer.messages.append((message, size))
+        buffer.bytes += size
+        self.total_bytes += size
+        self.total_messages += 1
+        
+        # Evict oldest messages beyond the per-room caps
+        while buffer.messages and (
+            len(buffer.messages) > self.max_messages or buffer.bytes > self.max_bytes
+        ):
+            _, evicted_size = buffer.messages.popleft()
+            buffer.bytes -= evicted_size
+            self.total_bytes -= evicted_size
+            self.total_messages -= 1
+            self.evicted_messages += 1
+        
+        return message
+    
+    def get_page(
+        self,
+        room_code: str,
+        limit: int,
+        before: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[int]]:
+        """Get up to `limit` messages older than the `before` cursor.
+        
+        Returns (messages oldest first, cursor for the next older page or None).
+        """
+        buffer = self.rooms.get(room_code)
+        if buffer is None or limit <= 0:
+            return [], None
+        
+        page: List[dict] = []
+        for message, _ in reversed(buffer.messages):
+            if before is not None and message["seq"] >= before:
+                continue
+            if len(page) >= limit:
+                break
+            page.append(message)
+        
+        page.reverse()
+        
+        oldest_seq = buffer.messages[0][0]["seq"] if buffer.messages else None
+        has_more = bool(page) and page[0]["seq"] > oldest_seq
+        return page, (page[0]["seq"] if has_more else None)
+    
+    def drop_room(self, room_code: str):
+        """Forget a room's history."""
+        buffer = self.rooms.pop(room_code, None)
+        if buffer is not None:
+            self.total_bytes -= buffer.bytes
+            self.total_messages -= len(buffer.messages)
+    
+    def retain_rooms(self, room_codes: set) -> int:
+        """Drop history for rooms not in `room_codes`. Returns count dropped."""
+        stale = [code for code in self.rooms if code not in room_codes]
+        for room_code in stale:
+            self.drop_room(room_code)
+        return len(stale)
+    
+    def get_stats(self) -> dict:
+        """Get memory usage statistics."""
+        return {
+            "rooms": len(self.rooms),
+            "messages": self.total_messages,
+            "bytes": self.total_bytes,
+            "evicted_messages": self.evicted_messages,
+            "max_messages_per_room": self.max_messages,
+            "max_bytes_per_room": self.max_bytes
+        }
+
+
+# Global chat history
+chat_history = ChatHistory(
+    max_messages=settings.CHAT_HISTORY_MAX_MESSAGES,
+    max_bytes=settings.CHAT_HISTORY_MAX_BYTES
+)
@@ -0,0 +1,258 @@
+"""Durable per-room chat transcripts in append-only segment files."""
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from config import settings
+
+
+# Index entry: byte offset of each message within its segment
+INDEX_ENTRY = struct.Struct("<Q")
+
+# Left behind when retention removes every segment, so numbering carries on
+NEXT_SEQ_FILE = "next_seq"
+
+
+class ChatLog:
+    """Appends chat messages to per-room segment files.
+    
+    Layout per room (under CHAT_LOG_DIR/<room_code>/):
+    - <first_seq>.log: newline-delimited JSON messages
+    - <first_seq>.idx: packed uint64 offsets, one per message in the segment
+    - next_seq: where numbering resumes once retention removed every segment
+    
+    Segment names encode the sequence number of their first message, so a
+    range read only touches the segments it needs and reads offsets and
+    messages through memory maps instead of loading whole transcripts.
+    """
+    
+    def __init__(self, base_dir: str):
+        self.base_dir = Path(base_dir)
+        self.lock = threading.Lock()
+        # room_code -> (first_seq of active segment, next seq, segment bytes)
+        self._active: Dict[str, list] = {}
+        self.appended_messages: int = 0
+        self.appended_bytes: int = 0
+    
+    def _room_dir(self, room_code: str) -> Path:
+        """Directory holding a room's segments."""
+        # Room codes are base62; anything else must not become a path
+        if not room_code.isalnum():
+            raise ValueError(f"Invalid room code: {room_code!r}")
+        return self.base_dir / room_code
+    
+    def _segment_starts(self, room_code: str) -> List[int]:
+        """Sorted first sequence numbers of a room's segments."""
+        if not room_code.isalnum():
+            return []
+        room_dir = self._room_dir(room_code)
+        if not room_dir.exists():
+            return []
+        return sorted(int(p.stem) for p in room_dir.glob("*.idx"))
+    
+    def _load_active(self, room_code: str) -> list:
+        """Find (or start) the segment new messages are appended to."""
+        active = self._active.get(room_code)
+        if active is not None:
+            return active
+        
+        starts = self._segment_starts(room_code)
+        if starts:
+            first_seq = starts[-1]
+            count, size = self._repair_segment(self._room_dir(room_code) / str(first_seq))
+            active = [first_seq, first_seq + count, size]
+        else:
+            room_dir = self._room_dir(room_code)
+            room_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                next_seq = int((room_dir / NEXT_SEQ_FILE).read_text())
+            except (FileNotFoundError, ValueError):
+                next_seq = 1
+            active = [next_seq, next_seq, 0]
+        
+        self._active[room_code] = active
+        return active
+    
+    @staticmethod
+    def _repair_segment(base: Path) -> tuple:
+        """Cut a segment back to its last complete message after a torn write.
+        
+        The log line is written before its index entry, so a crash can leave
+        a partial entry, an unindexed line or a partial line. Returns the
+        (message count, log bytes) that are left.
+        """
+        idx_path = base.with_suffix(".idx")
+        log_path = base.with_suffix(".log")
+        with open(idx_path, "r+b") as idx_file, open(log_path, "a+b") as log_file:
+            index = idx_file.read()
+            log_file.seek(0)
+            log = log_file.read()
+            whole = len(index) - len(index) % INDEX_ENTRY.size
+            offsets = [offset for (offset,) in INDEX_ENTRY.iter_unpack(index[:whole])]
+            
+            size = 0
+            while offsets:
+                end = log.find(b"\n", offsets[-1])
+                if end >= 0:
+                    size = end + 1
+                    break
+                offsets.pop()
+            
+            if len(index) != len(offsets) * INDEX_ENTRY.size or len(log) != size:
+                print(f"Repaired chat segment {base}: {len(offsets)} messages kept")
+                idx_file.truncate(len(offsets) * INDEX_ENTRY.size)
+                log_file.truncate(size)
+        return len(offsets), size
+    
+    def append(self, room_code: str, message: dict) -> int:
+        """Append a message to a room's transcript. Returns its sequence number."""
+        line = (json.dumps(message, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        
+        with self.lock:
+            active = self._load_active(room_code)
+            
+            # Rotate to a fresh segment once the active one is full
+            if active[2] and active[2] + len(line) > settings.CHAT_LOG_SEGMENT_BYTES:
+                active[0] = active[1]
+                active[2] = 0
+            
+            seq = active[1]
+            base = self._room_dir(room_code) / str(active[0])
+            
+            with open(base.with_suffix(".log"), "ab") as log_file:
+                log_file.write(line)
+            with open(base.with_suffix(".idx"), "ab") as index_file:
+                index_file.write(INDEX_ENTRY.pack(active[2]))
+            
+            active[1] += 1
+            active[2] += len(line)
+            self.appended_messages += 1
+            self.appended_bytes += len(line)
+            return seq
+    
+    def read_range(self, room_code: str, from_seq: int = 1, limit: int = 100) -> dict:
+        """Read up to `limit` messages starting at sequence `from_seq`."""
+        starts = self._segment_starts(room_code)
+        messages: List[dict] = []
+        from_seq = max(from_seq, starts[0]) if starts else from_seq
+        
+        for i, first_seq in enumerate(starts):
+            next_start = starts[i + 1] if i + 1 < len(starts) else None
+            if next_start is not None and next_start <= from_seq:
+                continue
+            if len(messages) >= limit:
+                break
+            
+            seq = max(from_seq, first_seq)
+            base = self._room_dir(room_code) / str(first_seq)
+            messages.extend(self._read_segment(base, seq - first_seq, limit - len(messages), seq))
+        
+        next_seq = messages[-1]["seq"] + 1 if messages else None
+        return {
+            "room_code": room_code,
+            "messages": messages,
+            "next": next_seq
+        }
+    
+    def _read_segment(self, base: Path, start_index: int, limit: int, first_seq: int) -> List[dict]:
+        """Read messages from one segment via memory maps of its index and log."""
+        idx_path = base.with_suffix(".idx")
+        log_path = base.with_suffix(".log")
+        if not idx_path.exists() or idx_path.stat().st_size == 0 or log_path.stat().st_size == 0:
+            return []
+        
+        messages = []
+        with open(idx_path, "rb") as idx_file, open(log_path, "rb") as log_file:
+            with mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ) as idx_map, \
+                    mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+                count = len(idx_map) // INDEX_ENTRY.size
+                end_index = min(count, start_index + limit)
+                
+                for i in range(start_index, end_index):
+                    start = INDEX_ENTRY.unpack_from(idx_map, i * INDEX_ENTRY.size)[0]
+                    if i + 1 < count:
+                        end = INDEX_ENTRY.unpack_from(idx_map, (i + 1) * INDEX_ENTRY.size)[0]
+                    else:
+                        # The last line may still be mid-append (or torn)
+                        end = log_map.find(b"\n", start) + 1
+                    
+                    try:
+                        message = json.loads(log_map[start:end])
+                    except ValueError:
+                        # Torn tail: the rest of the segment is not readable yet
+                        break
+                    message["seq"] = first_seq + (i - start_index)
+                    messages.append(message)
+        
+        return messages
+    
+    def apply_retention(self) -> int:
+        """Delete segments past the retention policy. Returns count deleted."""
+        if not self.base_dir.exists():
+            return 0
+        
+        cutoff = time.time() - settings.CHAT_LOG_RETENTION_DAYS * 86400
+        deleted = 0
+        
+        with self.lock:
+            for room_dir in self.base_dir.iterdir():
+                if not room_dir.is_dir():
+                    continue
+                
+                starts = sorted(int(p.stem) for p in room_dir.glob("*.idx"))
+                active = self._active.get(room_dir.name)
+                marker = room_dir / NEXT_SEQ_FILE
+                
+                if not starts:
+                    # Numbering only needs to outlive cursors for one retention period
+                    if marker.exists() and marker.stat().st_mtime < cutoff:
+                        marker.unlink(missing_ok=True)
+                else:
+                    last = room_dir / str(starts[-1])
+                    next_seq = starts[-1] + last.with_suffix(".idx").stat().st_size // INDEX_ENTRY.size
+                
+                remaining = len(starts)
+                for i, first_seq in enumerate(starts):
+                    base = room_dir / str(first_seq)
+                    log_path = base.with_suffix(".log")
+                    too_many = len(starts) - i > settings.CHAT_LOG_MAX_SEGMENTS_PER_ROOM
+                    too_old = log_path.exists() and log_path.stat().st_mtime < cutoff
+                    
+                    if not (too_many or too_old):
+                        continue
+                    
+                    log_path.unlink(missing_ok=True)
+                    base.with_suffix(".idx").unlink(missing_ok=True)
+                    deleted += 1
+                    remaining -= 1
+                    
+                    if active is not None and active[0] == first_seq:
+                        del self._active[room_dir.name]
+                
+                # Keep numbering going so existing history cursors stay valid
+                if starts and not remaining:
+                    tmp = marker.with_suffix(".tmp")
+                    tmp.write_text(str(next_seq))
+                    os.replace(tmp, marker)
+                
+                if not any(room_dir.iterdir()):
+                    shutil.rmtree(room_dir, ignore_errors=True)
+        
+        return deleted
+    
+    def get_stats(self) -> dict:
+        """Get append statistics for this process (cheap; no directory scan)."""
+        return {
+            "appended_messages": self.appended_messages,
+            "appended_bytes": self.appended_bytes,
+            "active_rooms": len(self._active)
+        }
+
+
+# Global chat log (None when disabled)
+chat_log: Optional[ChatLog] = ChatLog(settings.CHAT_LOG_DIR) if settings.CHAT_LOG_ENABLED else None
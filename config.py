@@ -23,11 +23,114 @@ class Settings:
     
     # Storage
     DATA_FILE: str = os.getenv("DATA_FILE", "data/rooms.json")
+    # json: one JSON file; binary: DATA_FILE with .rec/.idx suffixes (record file + mmapped index)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "json").lower()
     
     # Room settings
     ROOM_TTL_HOURS: int = int(os.getenv("ROOM_TTL_HOURS", "24"))
     MAX_PARTICIPANTS_PER_ROOM: int = int(os.getenv("MAX_PARTICIPANTS_PER_ROOM", "50"))
     
+    # Signaling topology: mesh | presenter | grid-limited
+    DEFAULT_ROOM_TOPOLOGY: str = os.getenv("DEFAULT_ROOM_TOPOLOGY", "mesh")
+    GRID_TOPOLOGY_SIZE: int = int(os.getenv("GRID_TOPOLOGY_SIZE", "9"))
+    
+    # Presence: immediate (peer_joined/peer_left) | coalesced (batched roster_delta)
+    DEFAULT_PRESENCE_MODE: str = os.getenv("DEFAULT_PRESENCE_MODE", "immediate")
+    PRESENCE_COALESCE_MS: int = int(os.getenv("PRESENCE_COALESCE_MS", "500"))
+    
+    # Chat history (in-memory ring buffer per room)
+    CHAT_HISTORY_MAX_MESSAGES: int = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "200"))
+    CHAT_HISTORY_MAX_BYTES: int = int(os.getenv("CHAT_HISTORY_MAX_BYTES", "262144"))
+    CHAT_HISTORY_ON_JOIN: int = int(os.getenv("CHAT_HISTORY_ON_JOIN", "50"))
+    CHAT_MAX_MESSAGE_LENGTH: int = int(os.getenv("CHAT_MAX_MESSAGE_LENGTH", "2000"))
+    CHAT_MAX_SENDER_LENGTH: int = int(os.getenv("CHAT_MAX_SENDER_LENGTH", "64"))
+    
+    # Durable chat transcripts (segment files, kept after rooms are deleted)
+    CHAT_LOG_ENABLED: bool = os.getenv("CHAT_LOG_ENABLED", "true").lower() == "true"
+    CHAT_LOG_DIR: str = os.getenv("CHAT_LOG_DIR", "data/chat")
+    CHAT_LOG_SEGMENT_BYTES: int = int(os.getenv("CHAT_LOG_SEGMENT_BYTES", "1048576"))
+    CHAT_LOG_RETENTION_DAYS: int = int(os.getenv("CHAT_LOG_RETENTION_DAYS", "90"))
+    CHAT_LOG_MAX_SEGMENTS_PER_ROOM: int = int(os.getenv("CHAT_LOG_MAX_SEGMENTS_PER_ROOM", "64"))
+    
+    # Admission control / load shedding
+    MAX_CONNECTIONS: int = int(os.getenv("MAX_CONNECTIONS", "5000"))
+    MAX_CONCURRENT_JOINS: int = int(os.getenv("MAX_CONCURRENT_JOINS", "50"))
+    MAX_JOINS_PER_SECOND: int = int(os.getenv("MAX_JOINS_PER_SECOND", "100"))
+    LOOP_LAG_THRESHOLD_MS: int = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+    LOOP_LAG_SAMPLE_INTERVAL_MS: int = int(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_MS", "100"))
+    ADMISSION_RETRY_AFTER_SECONDS: int = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+    
+    # Server-wide announcements
+    ANNOUNCE_BATCH_SIZE: int = int(os.getenv("ANNOUNCE_BATCH_SIZE", "500"))
+    ANNOUNCE_BATCH_PAUSE_MS: int = int(os.getenv("ANNOUNCE_BATCH_PAUSE_MS", "10"))
+    
+    # Lifecycle webhooks (comma-separated destination URLs; empty disables)
+    WEBHOOK_URLS: list = [u.strip() for u in os.getenv("WEBHOOK_URLS", "").split(",") if u.strip()]
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+    WEBHOOK_FLUSH_INTERVAL_MS: int = int(os.getenv("WEBHOOK_FLUSH_INTERVAL_MS", "1000"))
+    WEBHOOK_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+    WEBHOOK_MAX_RETRIES: int = int(os.getenv("WEBHOOK_MAX_RETRIES", "8"))
+    WEBHOOK_MAX_QUEUE: int = int(os.getenv("WEBHOOK_MAX_QUEUE", "10000"))
+    WEBHOOK_QUEUE_FILE: str = os.getenv("WEBHOOK_QUEUE_FILE", "data/webhook_queue.ndjson")
+    
+    # Production server tuning (start.py --production)
+    WORKERS: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    BACKLOG: int = int(os.getenv("BACKLOG", "2048"))
+    WS_PING_INTERVAL_SECONDS: float = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+    WS_PING_TIMEOUT_SECONDS: float = float(os.getenv("WS_PING_TIMEOUT_SECONDS", "20"))
+    WS_MAX_MESSAGE_BYTES: int = int(os.getenv("WS_MAX_MESSAGE_BYTES", "262144"))
+    
+    # Graceful drain (SIGTERM or POST /api/admin/drain)
+    DRAIN_RECONNECT_WINDOW_SECONDS: int = int(os.getenv("DRAIN_RECONNECT_WINDOW_SECONDS", "20"))
+    DRAIN_TIMEOUT_SECONDS: int = int(os.getenv("DRAIN_TIMEOUT_SECONDS", "28"))
+    
+    # Decoded room cache (per worker; validated against storage versions)
+    ROOM_CACHE_SIZE: int = int(os.getenv("ROOM_CACHE_SIZE", "1024"))
+    ROOM_CACHE_TTL_SECONDS: int = int(os.getenv("ROOM_CACHE_TTL_SECONDS", "300"))
+    
+    # Live statistics stream (dashboards)
+    LIVE_STATS_MAX_RATE_HZ: float = float(os.getenv("LIVE_STATS_MAX_RATE_HZ", "1"))
+    LIVE_STATS_HEARTBEAT_SECONDS: int = int(os.getenv("LIVE_STATS_HEARTBEAT_SECONDS", "15"))
+    
+    # Room reclamation and memory budget
+    RECLAIM_EMPTY_ROOMS: bool = os.getenv("RECLAIM_EMPTY_ROOMS", "true").lower() == "true"
+    EMPTY_ROOM_GRACE_MINUTES: int = int(os.getenv("EMPTY_ROOM_GRACE_MINUTES", "30"))
+    ROOM_RECLAIM_INTERVAL_SECONDS: int = int(os.getenv("ROOM_RECLAIM_INTERVAL_SECONDS", "60"))
+    MAX_LIVE_ROOMS: int = int(os.getenv("MAX_LIVE_ROOMS", "10000"))  # 0 = unlimited
+    
+    # Call setup tracing (join -> offer -> answer -> connected per peer pair)
+    CALL_TRACE_ENABLED: bool = os.getenv("CALL_TRACE_ENABLED", "true").lower() == "true"
+    CALL_TRACE_MAX_PENDING: int = int(os.getenv("CALL_TRACE_MAX_PENDING", "10000"))
+    CALL_TRACE_SLOW_MS: int = int(os.getenv("CALL_TRACE_SLOW_MS", "3000"))
+    CALL_TRACE_SLOW_KEEP: int = int(os.getenv("CALL_TRACE_SLOW_KEEP", "200"))
+    
+    # Connection quality telemetry (client stats_report rolling quantiles)
+    QUALITY_WINDOW_SECONDS: int = int(os.getenv("QUALITY_WINDOW_SECONDS", "300"))
+    QUALITY_MAX_ROOMS: int = int(os.getenv("QUALITY_MAX_ROOMS", "1000"))
+    
+    # Signaling recording for replay (empty = off)
+    RECORD_FILE: str = os.getenv("RECORD_FILE", "")
+    RECORD_MAX_BYTES: int = int(os.getenv("RECORD_MAX_BYTES", str(100 * 1024 * 1024)))
+    
+    # Bandwidth profiles: per-client uplink budget split across the video streams it sends
+    BANDWIDTH_PROFILES: bool = os.getenv("BANDWIDTH_PROFILES", "true").lower() == "true"
+    UPLINK_BUDGET_KBPS: int = int(os.getenv("UPLINK_BUDGET_KBPS", "2500"))
+    AUDIO_BITRATE_KBPS: int = int(os.getenv("AUDIO_BITRATE_KBPS", "40"))
+    MAX_VIDEO_BITRATE_KBPS: int = int(os.getenv("MAX_VIDEO_BITRATE_KBPS", "1500"))
+    MIN_VIDEO_BITRATE_KBPS: int = int(os.getenv("MIN_VIDEO_BITRATE_KBPS", "100"))
+    
+    # Signed join tokens ("kid:secret" pairs, comma-separated; the first signs, all verify)
+    JOIN_TOKEN_KEYS: str = os.getenv("JOIN_TOKEN_KEYS", "")
+    JOIN_TOKENS_REQUIRED: bool = os.getenv("JOIN_TOKENS_REQUIRED", "false").lower() == "true"
+    
+    # Per-socket and per-room traffic accounting (GET /api/admin/traffic)
+    TRAFFIC_WINDOW_SECONDS: int = int(os.getenv("TRAFFIC_WINDOW_SECONDS", "60"))
+    TRAFFIC_MAX_ROOMS: int = int(os.getenv("TRAFFIC_MAX_ROOMS", "5000"))
+    
+    # Lock the data file across worker processes (fcntl.flock, POSIX only)
+    STORAGE_FILE_LOCK: bool = os.getenv("STORAGE_FILE_LOCK", "true").lower() == "true"
+    
     # Code generation
     ROOM_CODE_LENGTH: int = 6
     ROOM_CODE_CHARSET: str = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
@@ -0,0 +1,133 @@
+"""Table-driven WebSocket message dispatch with compiled payload schemas."""
+import time
+from typing import Annotated, Callable, Dict, Literal, Optional, Tuple, Type, Union
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, create_model
+
+
+class DispatchError(Exception):
+    """A frame that cannot be dispatched; carries the client-facing error."""
+    
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class HandlerTiming:
+    """Call count and latency of one message type's handler."""
+    
+    def __init__(self):
+        self.count: int = 0
+        self.errors: int = 0
+        self.total_ms: float = 0.0
+        self.max_ms: float = 0.0
+    
+    def record(self, elapsed_ms: float, failed: bool):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if failed:
+            self.errors += 1
+
+
+class MessageRegistry:
+    """Maps message types to handlers and their payload models.
+    
+    All envelopes are compiled into one discriminated-union validator, so a
+    frame is parsed and validated in a single pass by pydantic-core and the
+    handler is found by a dict lookup on `type`; registering more types
+    doesn't lengthen dispatch.
+    """
+    
+    def __init__(self):
+        # msg_type -> (handler, payload model or None, code for invalid payloads)
+        self.handlers: Dict[str, Tuple[Callable, Optional[Type[BaseModel]], str]] = {}
+        self.timings: Dict[str, HandlerTiming] = {}
+        self._adapter: Optional[TypeAdapter] = None
+    
+    def handler(
+        self,
+        msg_type: str,
+        payload_model: Optional[Type[BaseModel]] = None,
+        invalid_code: str = "INVALID_PAYLOAD"
+    ):
+        """Register a handler; it is called as handler(owner, socket_id[, payload])."""
+        def decorator(func: Callable) -> Callable:
+            self.handlers[msg_type] = (func, payload_model, invalid_code)
+            self.timings[msg_type] = HandlerTiming()
+            self._adapter = None
+            return func
+        return decorator
+    
+    def _compile(self) -> TypeAdapter:
+        """Build the validator for every registered envelope."""
+        envelopes = []
+        for msg_type, (_, payload_model, _) in self.handlers.items():
+            payload_type = payload_model or dict
+            envelopes.append(create_model(
+                f"{msg_type.title().replace('_', '')}Envelope",
+                type=(Literal[msg_type], ...),
+                # A missing payload is validated as {}, so errors name the real type and code
+                payload=(payload_type, Field(default={}, validate_default=True))
+            ))
+        self._adapter = TypeAdapter(Annotated[Union[tuple(envelopes)], Field(discriminator="type")])
+        return self._adapter
+    
+    def decode(self, raw: str) -> Tuple[str, object]:
+        """Parse and validate a frame. Returns (msg_type, payload)."""
+        adapter = self._adapter or self._compile()
+        try:
+            envelope = adapter.validate_json(raw)
+        except ValidationError as e:
+            raise self._to_dispatch_error(e)
+        return envelope.type, envelope.payload
+    
+    def _to_dispatch_error(self, error: ValidationError) -> DispatchError:
+        """Translate the first validation error into a client-facing error."""
+        first = error.errors(include_url=False)[0]
+        kind = first["type"]
+        
+        if kind == "json_invalid":
+            return DispatchError("INVALID_JSON", "Invalid JSON message")
+        if kind in ("union_tag_invalid", "union_tag_not_found"):
+            tag = first.get("ctx", {}).get("tag")
+            return DispatchError("UNKNOWN_MESSAGE_TYPE", f"Unknown message type: {tag}")
+        if kind in ("model_type", "model_attributes_type", "dict_type") and not first["loc"]:
+            return DispatchError("INVALID_MESSAGE", "Message must be a JSON object")
+        
+        msg_type = first["loc"][0] if first["loc"] else None
+        invalid_code = self.handlers[msg_type][2] if msg_type in self.handlers else "INVALID_PAYLOAD"
+        field = ".".join(str(part) for part in first["loc"][2:]) or "payload"
+        return DispatchError(invalid_code, f"Invalid {msg_type} message: {field}: {first['msg']}")
+    
+    async def dispatch(self, owner, socket_id: str, msg_type: str, payload):
+        """Call the handler for a decoded message, timing it."""
+        func, payload_model, _ = self.handlers[msg_type]
+        started = time.perf_counter()
+        failed = False
+        try:
+            if payload_model is None:
+                await func(owner, socket_id)
+            else:
+                await func(owner, socket_id, payload)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.timings[msg_type].record((time.perf_counter() - started) * 1000, failed)
+    
+    def get_stats(self) -> dict:
+        """Per-type call counts and handler latency."""
+        return {
+            msg_type: {
+                "count": t.count,
+                "errors": t.errors,
+                "avg_ms": round(t.total_ms / t.count, 3) if t.count else None,
+                "max_ms": round(t.max_ms, 3)
+            }
+            for msg_type, t in self.timings.items()
+        }
+
+
+# Global registry of WebSocket message handlers
+ws_messages = MessageRegistry()
@@ -0,0 +1,134 @@
+"""Graceful drain for zero-downtime deploys."""
+import asyncio
+import os
+import random
+import signal
+import time
+from datetime import datetime
+from typing import Optional
+from config import settings
+from admission import admission
+from storage import storage
+from websocket_manager import connection_manager
+from webhooks import webhook_dispatcher
+from signaling_recorder import signaling_recorder
+
+
+class DrainController:
+    """Takes the instance out of rotation and lets clients leave gradually.
+    
+    Draining refuses new connections and joins, reports not-ready, flushes
+    storage, then tells every client to reconnect after a random delay
+    within DRAIN_RECONNECT_WINDOW_SECONDS so the replacement instance sees
+    a ramp instead of a spike. The process exits once all sockets are gone
+    or DRAIN_TIMEOUT_SECONDS has passed.
+    """
+    
+    def __init__(self):
+        self.draining = False
+        self.reason: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.connections_at_start: int = 0
+        self.hints_sent: int = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def install_signal_handler(self):
+        """Drain on SIGTERM instead of dropping every socket at once."""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.handle_sigterm)
+        except (NotImplementedError, RuntimeError):
+            # Windows event loops don't support signal handlers
+            pass
+    
+    def handle_sigterm(self):
+        """First SIGTERM starts draining; a second one exits immediately."""
+        if self.draining:
+            print("Second SIGTERM received, exiting without waiting for drain")
+            self._exit()
+            return
+        self.start("SIGTERM")
+    
+    def start(self, reason: str) -> bool:
+        """Begin draining. Returns False if already draining."""
+        if self.draining:
+            return False
+        
+        self.draining = True
+        self.reason = reason
+        self.started_at = datetime.utcnow()
+        self.connections_at_start = len(connection_manager.active_connections)
+        admission.draining = True
+        print(f"Draining ({reason}): {self.connections_at_start} connections")
+        
+        self._task = asyncio.create_task(self._run())
+        return True
+    
+    async def _run(self):
+        """Flush, hint clients to reconnect, wait for sockets, then exit."""
+        deadline = time.monotonic() + settings.DRAIN_TIMEOUT_SECONDS
+        
+        try:
+            await self.flush()
+            await self.send_reconnect_hints()
+            
+            while connection_manager.active_connections and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+            
+            remaining = len(connection_manager.active_connections)
+            print(f"Drain finished, {remaining} connections left")
+        except Exception as e:
+            print(f"Error while draining: {e}")
+        
+        self._exit()
+    
+    async def flush(self):
+        """Make sure everything accepted so far is durable before clients leave."""
+        await asyncio.to_thread(storage.flush)
+        signaling_recorder.flush()
+        if webhook_dispatcher.enabled:
+            await webhook_dispatcher.checkpoint()
+    
+    async def send_reconnect_hints(self):
+        """Tell each client when to reconnect, spread over the reconnect window."""
+        window_ms = settings.DRAIN_RECONNECT_WINDOW_SECONDS * 1000
+        batch_size = settings.ANNOUNCE_BATCH_SIZE
+        pause = settings.ANNOUNCE_BATCH_PAUSE_MS / 1000
+        socket_ids = list(connection_manager.active_connections.keys())
+        
+        for start in range(0, len(socket_ids), batch_size):
+            batch = socket_ids[start:start + batch_size]
+            results = await asyncio.gather(*(
+                connection_manager.send_text(socket_id, connection_manager.encode_message({
+                    "type": "reconnect",
+                    "payload": {
+                        "reason": "server_draining",
+                        "delay_ms": random.randint(0, window_ms)
+                    }
+                }))
+                for socket_id in batch
+            ), return_exceptions=True)
+            self.hints_sent += sum(1 for r in results if r is True)
+            
+            if start + batch_size < len(socket_ids):
+                await asyncio.sleep(pause)
+    
+    def _exit(self):
+        """Hand over to the server's normal shutdown (same as Ctrl+C)."""
+        os.kill(os.getpid(), signal.SIGINT)
+    
+    def get_status(self) -> dict:
+        """Get drain progress."""
+        return {
+            "draining": self.draining,
+            "reason": self.reason,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "connections_at_start": self.connections_at_start,
+            "connections_remaining": len(connection_manager.active_connections),
+            "reconnect_hints_sent": self.hints_sent,
+            "reconnect_window_seconds": settings.DRAIN_RECONNECT_WINDOW_SECONDS,
+            "timeout_seconds": settings.DRAIN_TIMEOUT_SECONDS
+        }
+
+
+# Global drain controller
+drain_controller = DrainController()
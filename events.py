@@ -0,0 +1,39 @@
+"""In-process bus for room lifecycle events."""
+from typing import Callable, List
+
+
+# Lifecycle event types
+ROOM_CREATED = "room.created"
+ROOM_DELETED = "room.deleted"
+ROOM_EXPIRED = "room.expired"
+PARTICIPANT_JOINED = "participant.joined"
+PARTICIPANT_LEFT = "participant.left"
+
+EventHandler = Callable[[str, dict], None]
+
+
+class EventBus:
+    """Fans lifecycle events out to subscribers.
+    
+    Handlers are called synchronously on the emitting code path, so they
+    must only enqueue work and never block.
+    """
+    
+    def __init__(self):
+        self._handlers: List[EventHandler] = []
+    
+    def subscribe(self, handler: EventHandler):
+        """Register a handler called as handler(event_type, data)."""
+        self._handlers.append(handler)
+    
+    def emit(self, event_type: str, data: dict):
+        """Deliver an event to every subscriber."""
+        for handler in self._handlers:
+            try:
+                handler(event_type, data)
+            except Exception as e:
+                print(f"Error in {event_type} event handler: {e}")
+
+
+# Global event bus
+event_bus = EventBus()
@@ -0,0 +1,164 @@
+"""Stateless HMAC-signed join tokens, verified without touching storage."""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+# Roles a token can carry; "host" may publish in presenter rooms
+JOIN_TOKEN_ROLES = ("host", "participant")
+
+# Longer tokens are rejected before decoding
+MAX_TOKEN_LENGTH = 512
+
+# Signatures are truncated HMAC-SHA256
+SIGNATURE_BYTES = 16
+
+
+class JoinTokenError(Exception):
+    """A join token was missing, malformed, forged or expired."""
+    
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def parse_keys(value: str) -> List[Tuple[str, bytes]]:
+    """Parse `kid:secret,kid:secret`; the first key signs, all of them verify."""
+    keys = []
+    for entry in value.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret and "." not in kid:
+            keys.append((kid, secret.encode()))
+    return keys
+
+
+class JoinTokens:
+    """Issues and verifies `<kid>.<claims>.<signature>` join tokens.
+    
+    Claims are compact JSON: room code (`r`), expiry as a Unix time (`e`),
+    role (`ro`), capacity hint (`c`) and optionally a user id (`u`). Tokens are signed with the first
+    key in JOIN_TOKEN_KEYS and accepted under any listed key, so a key is
+    rotated by prepending a new one and dropping the old one once the
+    tokens it signed have expired.
+    """
+    
+    def __init__(self, keys: str):
+        self.keys = parse_keys(keys)
+        self._by_kid: Dict[str, bytes] = dict(self.keys)
+        self.issued: int = 0
+        self.accepted: int = 0
+        self.rejected: Dict[str, int] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+    
+    @staticmethod
+    def _sign(secret: bytes, kid: str, body: str) -> str:
+        digest = hmac.new(secret, f"{kid}.{body}".encode(), hashlib.sha256).digest()
+        return _b64encode(digest[:SIGNATURE_BYTES])
+    
+    def issue(
+        self,
+        room_code: str,
+        expires_at: datetime,
+        role: str,
+        capacity: int,
+        user_id: Optional[str] = None
+    ) -> str:
+        """Sign a token for one room, valid until the room expires.
+        
+        With `user_id` the token also vouches for that user id, which then
+        replaces whatever the client claims when joining.
+        """
+        kid, secret = self.keys[0]
+        claims = {
+            "r": room_code,
+            "e": int((expires_at - datetime(1970, 1, 1)).total_seconds()),
+            "ro": role,
+            "c": capacity
+        }
+        if user_id:
+            claims["u"] = user_id
+        body = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        self.issued += 1
+        return f"{kid}.{body}.{self._sign(secret, kid, body)}"
+    
+    def issue_all(
+        self,
+        room_code: str,
+        expires_at: datetime,
+        capacity: int,
+        user_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """One token per role, optionally bound to a user id."""
+        return {role: self.issue(room_code, expires_at, role, capacity, user_id) for role in JOIN_TOKEN_ROLES}
+    
+    def _reject(self, code: str, message: str):
+        self.rejected[code] = self.rejected.get(code, 0) + 1
+        raise JoinTokenError(code, message)
+    
+    def verify(self, token: Optional[str], room_code: str) -> dict:
+        """Check a token for `room_code` and return its claims.
+        
+        Pure CPU work: raises JoinTokenError before anything reads storage.
+        """
+        if not token:
+            self._reject("JOIN_TOKEN_REQUIRED", "This server requires a join token")
+        if not self.enabled:
+            self._reject("INVALID_JOIN_TOKEN", "Join tokens are not enabled on this server")
+        
+        parts = token.split(".")
+        secret = self._by_kid.get(parts[0]) if len(parts) == 3 else None
+        if len(token) > MAX_TOKEN_LENGTH or secret is None:
+            self._reject("INVALID_JOIN_TOKEN", "Malformed join token or unknown key")
+        
+        kid, body, signature = parts
+        if not hmac.compare_digest(signature, self._sign(secret, kid, body)):
+            self._reject("INVALID_JOIN_TOKEN", "Join token signature does not match")
+        
+        try:
+            claims = json.loads(_b64decode(body))
+        except ValueError:
+            self._reject("INVALID_JOIN_TOKEN", "Malformed join token")
+        if claims.get("r") != room_code:
+            self._reject("INVALID_JOIN_TOKEN", "Join token is for a different room")
+        if claims.get("e", 0) <= time.time():
+            self._reject("JOIN_TOKEN_EXPIRED", "Join token has expired")
+        
+        self.accepted += 1
+        return {
+            "room_code": claims["r"],
+            "role": claims.get("ro"),
+            "capacity": claims.get("c"),
+            "user_id": claims.get("u")
+        }
+    
+    def get_stats(self) -> dict:
+        """Get token statistics."""
+        return {
+            "enabled": self.enabled,
+            "required": settings.JOIN_TOKENS_REQUIRED,
+            "signing_key": self.keys[0][0] if self.keys else None,
+            "verification_keys": len(self.keys),
+            "issued": self.issued,
+            "accepted": self.accepted,
+            "rejected": self.rejected
+        }
+
+
+# Global join token issuer/verifier
+join_tokens = JoinTokens(settings.JOIN_TOKEN_KEYS)
@@ -0,0 +1,152 @@
+"""Coalesced live statistics stream for dashboards."""
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Iterable, Optional, Set
+from config import settings
+from events import event_bus
+from storage import storage
+from websocket_manager import connection_manager
+
+
+# Frames buffered per subscriber before the oldest is dropped
+SUBSCRIBER_QUEUE_SIZE = 8
+# Lifecycle deltas carried per frame; the rest are only counted
+MAX_DELTAS_PER_FRAME = 500
+
+
+def compute_statistics(room_records: Iterable[dict]) -> dict:
+    """Aggregate room counts from stored room records in one pass."""
+    stats = {
+        "total_rooms": 0,
+        "open_rooms": 0,
+        "closed_rooms": 0,
+        "expired_rooms": 0,
+        "total_participants": 0,
+        "active_participants": 0
+    }
+    
+    now = datetime.utcnow().isoformat()
+    for room_data in room_records:
+        participants = len(room_data.get("participants", {}))
+        # Expiry is only reflected in memory until cleanup removes the room
+        state = "expired" if room_data["expires_at"] <= now else room_data.get("state")
+        stats["total_rooms"] += 1
+        stats["total_participants"] += participants
+        if state == "open":
+            stats["open_rooms"] += 1
+            stats["active_participants"] += participants
+        elif state in ("closed", "expired"):
+            stats[f"{state}_rooms"] += 1
+    
+    return stats
+
+
+class LiveStatsHub:
+    """Computes statistics at most LIVE_STATS_MAX_RATE_HZ and fans them out.
+    
+    Every subscriber shares the same frame, so N dashboards cost one storage
+    scan per tick instead of N. Ticks without lifecycle events skip the scan
+    and only send a keep-alive every LIVE_STATS_HEARTBEAT_SECONDS.
+    """
+    
+    def __init__(self):
+        self.storage = storage
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.pending: Deque[dict] = deque()
+        self.pending_dropped: int = 0
+        self.dirty = True
+        self.seq: int = 0
+        self.last_frame: Optional[str] = None
+        self.computations: int = 0
+        self.last_connections: int = 0
+    
+    def record_event(self, event_type: str, data: dict):
+        """Collect a lifecycle delta for the next frame (event bus handler)."""
+        self.dirty = True
+        if not self.subscribers:
+            return
+        if len(self.pending) >= MAX_DELTAS_PER_FRAME:
+            self.pending_dropped += 1
+            return
+        self.pending.append({"type": event_type, "at": datetime.utcnow().isoformat(), **data})
+    
+    def subscribe(self) -> asyncio.Queue:
+        """Register a dashboard; it is primed with the latest frame."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if self.last_frame is not None:
+            queue.put_nowait(self.last_frame)
+        else:
+            self.dirty = True
+        self.subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Forget a disconnected dashboard."""
+        self.subscribers.discard(queue)
+    
+    def _build_frame(self) -> str:
+        """Scan storage once and encode an SSE `stats` frame."""
+        self.seq += 1
+        self.computations += 1
+        payload = {
+            "seq": self.seq,
+            "timestamp": datetime.utcnow().isoformat(),
+            "statistics": compute_statistics(self.storage.iter_room_records()),
+            "active_websocket_connections": self.last_connections,
+            "deltas": list(self.pending),
+            "deltas_dropped": self.pending_dropped
+        }
+        self.pending.clear()
+        self.pending_dropped = 0
+        return f"id: {self.seq}\nevent: stats\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+    
+    def _publish(self, frame: str):
+        """Queue a frame for every subscriber, shedding the oldest for slow ones."""
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(frame)
+    
+    async def run(self):
+        """Tick at the configured rate, computing only when something changed."""
+        interval = 1 / settings.LIVE_STATS_MAX_RATE_HZ
+        last_sent = time.monotonic()
+        
+        while True:
+            await asyncio.sleep(interval)
+            if not self.subscribers:
+                continue
+            
+            try:
+                now = time.monotonic()
+                connections = len(connection_manager.active_connections)
+                if connections != self.last_connections:
+                    self.last_connections = connections
+                    self.dirty = True
+                
+                if self.dirty:
+                    self.dirty = False
+                    self.last_frame = self._build_frame()
+                    self._publish(self.last_frame)
+                    last_sent = now
+                elif now - last_sent >= settings.LIVE_STATS_HEARTBEAT_SECONDS:
+                    self._publish(": keep-alive\n\n")
+                    last_sent = now
+            except Exception as e:
+                print(f"Error in live stats hub: {e}")
+    
+    def get_stats(self) -> dict:
+        """Get hub statistics."""
+        return {
+            "subscribers": len(self.subscribers),
+            "computations": self.computations,
+            "max_rate_hz": settings.LIVE_STATS_MAX_RATE_HZ
+        }
+
+
+# Global live stats hub
+live_stats = LiveStatsHub()
+event_bus.subscribe(live_stats.record_event)
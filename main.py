@@ -1,16 +1,31 @@
 """Main FastAPI application."""
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 import asyncio
 import uuid
 from contextlib import asynccontextmanager
 
 from config import settings
 from api import router as api_router
+from admin_api import router as admin_router
 from websocket_manager import connection_manager
 from room_manager import room_manager
+from admission import admission
+from chat_history import chat_history
+from chat_log import chat_log
+from snapshot_loader import snapshot_loader
+from webhooks import webhook_dispatcher
+from live_stats import live_stats
+from dispatch import ws_messages
+from drain import drain_controller
+from call_tracing import call_tracer
+from quality_stats import quality_stats
+from signaling_recorder import signaling_recorder
+from room_locks import room_locks
+from static_assets import static_assets, router as static_router
+from join_tokens import join_tokens
+from traffic import traffic
 
 
 # Background cleanup task
@@ -22,10 +37,50 @@ async def cleanup_task():
             count = room_manager.cleanup_expired_rooms()
             if count > 0:
                 print(f"Cleaned up {count} expired rooms")
+            
+            # Release chat history of rooms that no longer exist
+            live_codes = await asyncio.to_thread(room_manager.storage.room_codes)
+            chat_history.retain_rooms(live_codes)
+            
+            if chat_log:
+                deleted = chat_log.apply_retention()
+                if deleted > 0:
+                    print(f"Removed {deleted} chat transcript segments past retention")
         except Exception as e:
             print(f"Error in cleanup task: {e}")
 
 
+async def reclaim_task():
+    """Reclaim empty rooms after their grace period and refresh memory stats."""
+    while True:
+        try:
+            await asyncio.sleep(settings.ROOM_RECLAIM_INTERVAL_SECONDS)
+            reclaimed = room_manager.reclaim_empty_rooms()
+            for room_code in reclaimed:
+                chat_history.drop_room(room_code)
+            if reclaimed:
+                print(f"Reclaimed {len(reclaimed)} empty rooms")
+            
+            # Chat sizes are snapshotted here; the O(rooms) pass runs off the event loop
+            await asyncio.to_thread(room_manager.update_memory_stats, {
+                room_code: buffer.bytes for room_code, buffer in chat_history.rooms.items()
+            })
+        except Exception as e:
+            print(f"Error in reclaim task: {e}")
+
+
+async def load_snapshot():
+    """Stream the room snapshot into storage without blocking the event loop."""
+    stats = await asyncio.to_thread(snapshot_loader.load, room_manager.storage)
+    if "rooms_indexed" in stats:
+        print(f"Mapped room index with {stats['rooms_indexed']} rooms in {stats['load_seconds']}s")
+        return
+    print(
+        f"Loaded {stats['rooms_loaded']} rooms in {stats['load_seconds']}s "
+        f"(skipped {stats['rooms_skipped_expired']} expired, peak RSS {stats['peak_rss_mb']} MB)"
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
@@ -33,18 +88,38 @@ async def lifespan(app: FastAPI):
     print("Starting WebRTC signaling server...")
     print(f"Server will listen on {settings.HOST}:{settings.PORT}")
     
+    # Load the room snapshot in a worker thread; /readiness stays red until done
+    snapshot_task_handle = asyncio.create_task(load_snapshot())
+    
     # Start background cleanup task
     cleanup_task_handle = asyncio.create_task(cleanup_task())
+    reclaim_task_handle = asyncio.create_task(reclaim_task())
+    
+    # Start event-loop lag monitor for admission control
+    lag_monitor_handle = asyncio.create_task(admission.monitor_loop_lag())
+    
+    # Start the coalescing ticker behind /api/admin/stream
+    live_stats_handle = asyncio.create_task(live_stats.run())
+    
+    # Start webhook delivery (restores events queued before the last shutdown)
+    await webhook_dispatcher.start()
+    
+    # SIGTERM drains connections gradually instead of cutting them all at once
+    drain_controller.install_signal_handler()
     
     yield
     
     # Shutdown
     print("Shutting down...")
-    cleanup_task_handle.cancel()
-    try:
-        await cleanup_task_handle
-    except asyncio.CancelledError:
-        pass
+    for task in (snapshot_task_handle, cleanup_task_handle, reclaim_task_handle, lag_monitor_handle, live_stats_handle):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    await webhook_dispatcher.stop()
+    signaling_recorder.close()
 
 
 # Create FastAPI app
@@ -76,8 +151,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include API router
+# Include API routers
 app.include_router(api_router)
+app.include_router(admin_router)
+
+
+@app.middleware("http")
+async def snapshot_readiness_gate(request: Request, call_next):
+    """Refuse API calls until the room snapshot has been loaded."""
+    if not snapshot_loader.ready and request.url.path.startswith("/api/") \
+            and not request.url.path.startswith(("/api/docs", "/api/redoc")):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is starting up, please retry shortly"},
+            headers={"Retry-After": "2"}
+        )
+    return await call_next(request)
 
 
 @app.get("/")
@@ -107,8 +196,25 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat(),
         "metrics": {
             "active_websocket_connections": len(connection_manager.active_connections),
-            "active_rooms": len(room_manager.storage.get_all_rooms()),
-            "api_authentication": "enabled"
+            "active_rooms": room_manager.storage.count_rooms() if snapshot_loader.ready else None,
+            "api_authentication": "enabled",
+            "admission": admission.get_stats(),
+            "chat_history": chat_history.get_stats(),
+            "chat_log": chat_log.get_stats() if chat_log else None,
+            "snapshot": snapshot_loader.stats,
+            "storage": room_manager.storage.get_stats() if snapshot_loader.ready else None,
+            "static_assets": static_assets.get_stats(),
+            "join_tokens": join_tokens.get_stats(),
+            "webhooks": webhook_dispatcher.get_stats(),
+            "live_stats": live_stats.get_stats(),
+            "room_cache": room_manager.get_cache_stats(),
+            "room_lifecycle": room_manager.get_lifecycle_stats(),
+            "call_setup": call_tracer.get_stats(),
+            "connection_quality": quality_stats.get_stats(),
+            "recording": signaling_recorder.get_stats(),
+            "room_locks": room_locks.get_stats(),
+            "traffic": traffic.get_stats(),
+            "ws_dispatch": ws_messages.get_stats()
         },
         "environment": {
             "max_participants_per_room": settings.MAX_PARTICIPANTS_PER_ROOM,
@@ -119,7 +225,22 @@ async def health_check():
 
 @app.get("/readiness")
 async def readiness_check():
-    """Readiness check for Render."""
+    """Readiness check for Render - not ready while loading or shedding load."""
+    active_connections = len(connection_manager.active_connections)
+    reason = admission.not_ready_reason(active_connections)
+    
+    if reason:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "not_ready",
+                "reason": reason,
+                "active_connections": active_connections,
+                "loop_lag_ms": round(admission.loop_lag_ms, 2)
+            },
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+    
     return {"status": "ready"}
 
 
@@ -128,7 +249,9 @@ async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for signaling."""
     socket_id = str(uuid.uuid4())
     
-    await connection_manager.connect(websocket, socket_id)
+    if not await connection_manager.connect(websocket, socket_id):
+        return
+    signaling_recorder.socket_opened(socket_id)
     
     try:
         # Send connection confirmation
@@ -143,19 +266,20 @@ async def websocket_endpoint(websocket: WebSocket):
             await connection_manager.handle_message(socket_id, data)
     
     except WebSocketDisconnect:
-        connection_manager.disconnect(socket_id)
+        await connection_manager.handle_disconnect(socket_id)
     except Exception as e:
         print(f"WebSocket error for {socket_id}: {e}")
-        connection_manager.disconnect(socket_id)
+        await connection_manager.handle_disconnect(socket_id)
 
 
-# Optional: Mount static files (for test client) - only if directory exists
+# Optional: Serve static files (for test client) - only if directory exists
 # This is optional and not required for API functionality
 try:
     from pathlib import Path
     if Path("static").exists():
-        app.mount("/static", StaticFiles(directory="static"), name="static")
-        print("Info: Static test client available at /static/")
+        count = static_assets.build()
+        app.include_router(static_router)
+        print(f"Info: Static test client available at /static/ ({count} files, precompressed)")
 except Exception as e:
     print(f"Info: Static files not mounted: {e}")
 
@@ -10,6 +10,8 @@ class Participant(BaseModel):
     display_name: Optional[str] = None
     joined_at: datetime = Field(default_factory=datetime.utcnow)
     user_id: Optional[str] = None
+    user_verified: bool = False  # user_id came from a signed join token, not the client
+    role: Optional[str] = None  # from a signed join token: host | participant
     last_seen: datetime = Field(default_factory=datetime.utcnow)
     
     class Config:
@@ -27,13 +29,28 @@ class Room(BaseModel):
     state: str = "open"  # open | closed | expired
     max_participants: int = 50
     participants: Dict[str, Participant] = Field(default_factory=dict)
+    topology: str = "mesh"  # mesh | presenter | grid-limited
+    presenter_ids: List[str] = Field(default_factory=list)  # verified user_ids allowed to publish in presenter mode
+    grid_size: int = 9  # K most recent speakers in grid-limited mode
+    presence_mode: str = "immediate"  # immediate | coalesced
+    roster_version: int = 0  # bumped on every membership change
+    version: int = 0  # bumped by storage on every saved change (ETag)
+    last_active_at: datetime = Field(default_factory=datetime.utcnow)  # last join or leave
+    emptied_at: Optional[datetime] = None  # when the last participant left
     
     class Config:
         json_encoders = {
             datetime: lambda v: v.isoformat()
         }
     
-    def add_participant(self, socket_id: str, display_name: Optional[str] = None, user_id: Optional[str] = None) -> bool:
+    def add_participant(
+        self,
+        socket_id: str,
+        display_name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        user_verified: bool = False,
+        role: Optional[str] = None
+    ) -> bool:
         """Add a participant to the room."""
         if len(self.participants) >= self.max_participants:
             return False
@@ -42,8 +59,13 @@ class Room(BaseModel):
             self.participants[socket_id] = Participant(
                 socket_id=socket_id,
                 display_name=display_name,
-                user_id=user_id
+                user_id=user_id,
+                user_verified=user_verified,
+                role=role
             )
+            self.roster_version += 1
+            self.last_active_at = datetime.utcnow()
+            self.emptied_at = None
             return True
         return False
     
@@ -51,6 +73,10 @@ class Room(BaseModel):
         """Remove a participant from the room."""
         if socket_id in self.participants:
             del self.participants[socket_id]
+            self.roster_version += 1
+            self.last_active_at = datetime.utcnow()
+            if not self.participants:
+                self.emptied_at = self.last_active_at
             return True
         return False
     
@@ -79,6 +105,11 @@ class RoomCreateRequest(BaseModel):
     owner_id: Optional[str] = None
     max_participants: Optional[int] = 50
     ttl_hours: Optional[int] = 24
+    topology: Optional[str] = "mesh"
+    presenter_ids: Optional[List[str]] = None
+    grid_size: Optional[int] = None
+    presence_mode: Optional[str] = None
+    issue_join_tokens: Optional[bool] = False
 
 
 class RoomCreateResponse(BaseModel):
@@ -87,6 +118,9 @@ class RoomCreateResponse(BaseModel):
     created_at: str
     expires_at: str
     owner_id: Optional[str] = None
+    topology: str = "mesh"
+    join_tokens: Optional[Dict[str, str]] = None
+    presenter_tokens: Optional[Dict[str, str]] = None  # presenter user_id -> join token bound to it
 
 
 class RoomInfoResponse(BaseModel):
@@ -98,6 +132,14 @@ class RoomInfoResponse(BaseModel):
     participant_count: int
     max_participants: int
     participants: List[dict]
+    topology: str = "mesh"
+
+
+class AnnouncementRequest(BaseModel):
+    """Request model for a server-wide announcement."""
+    message: str
+    level: str = "info"  # info | warning | critical
+    room_codes: Optional[List[str]] = None  # None = every connected socket
 
 
 # WebSocket message models
@@ -107,14 +149,51 @@ class WSMessage(BaseModel):
     payload: dict = Field(default_factory=dict)
 
 
+class CreateRoomMessage(BaseModel):
+    """Message to create a room and join it."""
+    display_name: Optional[str] = "Anonymous"
+    max_participants: int = 50
+    ttl_hours: int = 24
+    topology: Optional[str] = None
+    presence_mode: Optional[str] = None
+
+
 class JoinRoomMessage(BaseModel):
     """Message to join a room."""
-    room_code: str
-    display_name: Optional[str] = None
+    room_code: str = Field(min_length=1)
+    display_name: Optional[str] = "Anonymous"
+    user_id: Optional[str] = None
+    join_token: Optional[str] = None
 
 
 class SignalMessage(BaseModel):
     """Signaling message (SDP/ICE)."""
-    to: str  # target socket_id
-    signal_type: str  # offer | answer | candidate
+    to: str = Field(min_length=1)  # target socket_id
+    signal_type: str = Field(min_length=1)  # offer | answer | candidate
     payload: dict  # SDP or ICE candidate data
+
+
+class PeerConnectedMessage(BaseModel):
+    """Client report that its peer connection to `peer` is up."""
+    peer: str = Field(min_length=1)  # socket_id of the connected peer
+
+
+class StatsReportMessage(BaseModel):
+    """Periodic connection quality sample for one peer connection."""
+    peer: Optional[str] = None
+    rtt_ms: Optional[float] = Field(None, ge=0)
+    packet_loss_pct: Optional[float] = Field(None, ge=0, le=100)
+    bitrate_kbps: Optional[float] = Field(None, ge=0)
+    relay: bool = False  # selected candidate pair goes through TURN
+
+
+class ChatMessage(BaseModel):
+    """Chat message sent to the sender's room."""
+    message: str = ""
+    sender: Optional[str] = None
+
+
+class ChatHistoryRequest(BaseModel):
+    """Request for an older page of chat history."""
+    before: Optional[int] = None
+    limit: Optional[int] = None
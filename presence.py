@@ -0,0 +1,85 @@
+"""Coalescing of room membership changes into versioned roster deltas."""
+from typing import Dict, Optional
+
+
+IMMEDIATE = "immediate"
+COALESCED = "coalesced"
+
+PRESENCE_MODES = (IMMEDIATE, COALESCED)
+
+
+class PendingDelta:
+    """Membership changes accumulated for one room during a coalescing window."""
+    
+    def __init__(self, from_version: int, version: int):
+        self.from_version = from_version
+        self.version = version
+        # socket_id -> participant info
+        self.added: Dict[str, dict] = {}
+        # socket_id -> None (an insertion-ordered set)
+        self.removed: Dict[str, None] = {}
+
+
+class PresenceCoalescer:
+    """Batches joins and leaves per room into a single roster_delta frame.
+    
+    Instead of one peer_joined/peer_left frame per change per participant,
+    each room emits at most one frame per window carrying the version range
+    it covers, so clients can detect gaps and ask for a snapshot.
+    """
+    
+    def __init__(self):
+        # room_code -> pending delta for the current window
+        self.pending: Dict[str, PendingDelta] = {}
+        self.frames_coalesced: int = 0
+    
+    def _pending_for(self, room_code: str, version: int) -> tuple:
+        """Get the pending delta for a room, creating it if needed.
+        
+        Returns (delta, created) where created means a flush must be scheduled.
+        """
+        delta = self.pending.get(room_code)
+        if delta is not None:
+            self.frames_coalesced += 1
+            return delta, False
+        
+        delta = PendingDelta(from_version=version - 1, version=version)
+        self.pending[room_code] = delta
+        return delta, True
+    
+    def record_join(self, room_code: str, participant: dict, version: int) -> bool:
+        """Record a join. Returns True if a flush should be scheduled."""
+        delta, created = self._pending_for(room_code, version)
+        delta.version = version
+        delta.added[participant["socket_id"]] = participant
+        return created
+    
+    def record_leave(self, room_code: str, socket_id: str, version: int) -> bool:
+        """Record a leave. Returns True if a flush should be scheduled."""
+        delta, created = self._pending_for(room_code, version)
+        delta.version = version
+        
+        # A join and leave within the same window cancel out
+        if socket_id in delta.added:
+            del delta.added[socket_id]
+        else:
+            delta.removed[socket_id] = None
+        
+        return created
+    
+    def take(self, room_code: str) -> Optional[dict]:
+        """Remove and return the pending roster_delta payload for a room."""
+        delta = self.pending.pop(room_code, None)
+        if delta is None:
+            return None
+        
+        return {
+            "from_version": delta.from_version,
+            "version": delta.version,
+            "added": list(delta.added.values()),
+            "removed": list(delta.removed.keys())
+        }
+
+
+# Global presence coalescer
+presence_coalescer = PresenceCoalescer()
@@ -0,0 +1,229 @@
+"""Connection quality telemetry aggregated into fixed-memory quantile sketches."""
+import math
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional
+from config import settings
+from events import event_bus, ROOM_DELETED, ROOM_EXPIRED
+from call_tracing import ROOM_SIZE_CLASSES, room_size_class
+
+
+# Quantiles reported for every metric
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class SketchSpec:
+    """Value range and bucket layout shared by every sketch of one metric.
+    
+    Buckets grow geometrically so any quantile is within
+    `relative_accuracy` of the true value; values below `min_value` are
+    counted as zero and values above `max_value` land in the last bucket.
+    """
+    
+    def __init__(self, min_value: float, max_value: float, relative_accuracy: float):
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.size = int(math.ceil(math.log(max_value / min_value) / self.log_gamma)) + 1
+    
+    def index(self, value: float) -> int:
+        return min(self.size - 1, int(math.ceil(math.log(value / self.min_value) / self.log_gamma)))
+    
+    def value(self, index: int) -> float:
+        # Midpoint of the bucket (min * gamma^(i-1), min * gamma^i]
+        return self.min_value * self.gamma ** index * 2 / (1 + self.gamma)
+
+
+# metric -> layout; about 100-200 buckets each at 5% accuracy
+METRICS: Dict[str, SketchSpec] = {
+    "rtt_ms": SketchSpec(1, 60000, 0.05),
+    "packet_loss_pct": SketchSpec(0.01, 100, 0.05),
+    "bitrate_kbps": SketchSpec(1, 100000, 0.05)
+}
+
+
+class RollingSketch:
+    """Log-bucket histogram over the current and the previous window.
+    
+    Quantiles cover between one and two QUALITY_WINDOW_SECONDS windows; at
+    each rotation the older window is cleared and reused, so memory never
+    grows with the number of samples.
+    """
+    
+    def __init__(self, spec: SketchSpec):
+        self.spec = spec
+        self.current = array("I", bytes(4 * spec.size))
+        self.previous = array("I", bytes(4 * spec.size))
+        self.zeros = [0, 0]  # current, previous
+    
+    def rotate(self):
+        self.previous, self.current = self.current, self.previous
+        for i in range(len(self.current)):
+            self.current[i] = 0
+        self.zeros = [0, self.zeros[0]]
+    
+    def add(self, value: float):
+        if value < self.spec.min_value:
+            self.zeros[0] += 1
+        else:
+            self.current[self.spec.index(value)] += 1
+    
+    def summary(self) -> Optional[dict]:
+        """Count and quantiles, or None when the sketch is empty."""
+        zeros = self.zeros[0] + self.zeros[1]
+        count = zeros + sum(self.current) + sum(self.previous)
+        if not count:
+            return None
+        
+        result = {"count": count}
+        targets = [(q, q * (count - 1)) for q in QUANTILES]
+        seen = zeros
+        t = 0
+        # Quantiles that fall among the below-minimum values are zero
+        while t < len(targets) and targets[t][1] < seen:
+            result[f"p{round(targets[t][0] * 100)}"] = 0
+            t += 1
+        for index in range(self.spec.size):
+            seen += self.current[index] + self.previous[index]
+            while t < len(targets) and targets[t][1] < seen:
+                result[f"p{round(targets[t][0] * 100)}"] = round(self.spec.value(index), 2)
+                t += 1
+            if t == len(targets):
+                break
+        return result
+
+
+class QualitySummary:
+    """Sketches for every metric plus relay usage for one scope."""
+    
+    def __init__(self):
+        self.sketches: Dict[str, RollingSketch] = {}
+        self.reports = [0, 0]  # current, previous window
+        self.relayed = [0, 0]
+        self.window_started = time.monotonic()
+    
+    def _maybe_rotate(self, now: float):
+        elapsed = now - self.window_started
+        if elapsed < settings.QUALITY_WINDOW_SECONDS:
+            return
+        if elapsed >= 2 * settings.QUALITY_WINDOW_SECONDS:
+            # Idle for more than a window: both windows are stale
+            self.sketches.clear()
+            self.reports = [0, 0]
+            self.relayed = [0, 0]
+        else:
+            for sketch in self.sketches.values():
+                sketch.rotate()
+            self.reports = [0, self.reports[0]]
+            self.relayed = [0, self.relayed[0]]
+        self.window_started = now
+    
+    def record(self, report: dict, now: float):
+        self._maybe_rotate(now)
+        self.reports[0] += 1
+        if report.get("relay"):
+            self.relayed[0] += 1
+        for metric, spec in METRICS.items():
+            value = report.get(metric)
+            if value is None:
+                continue
+            sketch = self.sketches.get(metric)
+            if sketch is None:
+                # Allocated on first use so metric-less scopes stay small
+                sketch = self.sketches[metric] = RollingSketch(spec)
+            sketch.add(value)
+    
+    def to_dict(self) -> dict:
+        self._maybe_rotate(time.monotonic())
+        reports = sum(self.reports)
+        relayed = sum(self.relayed)
+        result = {
+            "reports": reports,
+            "relay_ratio": round(relayed / reports, 3) if reports else None
+        }
+        for metric in METRICS:
+            sketch = self.sketches.get(metric)
+            result[metric] = sketch.summary() if sketch else None
+        return result
+
+
+class QualityAggregator:
+    """Rolling connection quality per room, per room size and globally.
+    
+    Only sketches are kept, never raw samples. Rooms are held in an LRU
+    capped at QUALITY_MAX_ROOMS, so memory is bounded by that cap times the
+    fixed size of a summary.
+    """
+    
+    def __init__(self):
+        self.global_summary = QualitySummary()
+        self.by_room_size: Dict[str, QualitySummary] = {
+            label: QualitySummary() for _, label in ROOM_SIZE_CLASSES
+        }
+        self.rooms: "OrderedDict[str, QualitySummary]" = OrderedDict()
+        self.reports_received: int = 0
+        self.rooms_dropped: int = 0
+    
+    def record(self, room_code: str, room_size: int, report: dict):
+        """Fold one client report into every scope it belongs to."""
+        now = time.monotonic()
+        self.reports_received += 1
+        
+        summary = self.rooms.get(room_code)
+        if summary is None:
+            summary = self.rooms[room_code] = QualitySummary()
+            while len(self.rooms) > settings.QUALITY_MAX_ROOMS:
+                self.rooms.popitem(last=False)
+                self.rooms_dropped += 1
+        else:
+            self.rooms.move_to_end(room_code)
+        
+        summary.record(report, now)
+        self.by_room_size[room_size_class(room_size)].record(report, now)
+        self.global_summary.record(report, now)
+    
+    def record_event(self, event_type: str, data: dict):
+        """Event bus handler: forget rooms that are gone."""
+        if event_type in (ROOM_DELETED, ROOM_EXPIRED):
+            self.rooms.pop(data["room_code"], None)
+    
+    def get_room_stats(self, room_code: str) -> Optional[dict]:
+        summary = self.rooms.get(room_code)
+        return summary.to_dict() if summary else None
+    
+    def get_worst_rooms(self, limit: int = 20) -> list:
+        """Rooms with the highest p90 packet loss, then p90 RTT.
+        
+        Summarises every tracked room, so this is for the admin endpoint
+        rather than /health.
+        """
+        ranked = []
+        for room_code, summary in self.rooms.items():
+            stats = summary.to_dict()
+            loss = (stats["packet_loss_pct"] or {}).get("p90", 0)
+            rtt = (stats["rtt_ms"] or {}).get("p90", 0)
+            if stats["reports"]:
+                ranked.append(((loss, rtt), {"room_code": room_code, **stats}))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [stats for _, stats in ranked[:limit]]
+    
+    def get_stats(self) -> dict:
+        """Global and per-room-size summaries."""
+        return {
+            "window_seconds": settings.QUALITY_WINDOW_SECONDS,
+            "reports_received": self.reports_received,
+            "rooms_tracked": len(self.rooms),
+            "rooms_dropped": self.rooms_dropped,
+            "global": self.global_summary.to_dict(),
+            "by_room_size": {
+                label: summary.to_dict()
+                for label, summary in self.by_room_size.items()
+                if sum(summary.reports)
+            }
+        }
+
+
+# Global connection quality aggregator
+quality_stats = QualityAggregator()
+event_bus.subscribe(quality_stats.record_event)
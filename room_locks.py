@@ -0,0 +1,64 @@
+"""Per-room asyncio locks for serializing membership changes."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+
+class RoomLocks:
+    """One asyncio.Lock per room, created on demand and dropped when idle.
+    
+    Holding a room's lock serializes joins and leaves of that room,
+    including the notifications they send, so every participant sees
+    membership changes in the same order as the roster versions. Rooms never
+    wait on each other.
+    """
+    
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # room_code -> tasks holding or waiting for the lock
+        self._users: Dict[str, int] = {}
+        self.acquisitions: int = 0
+        self.contended: int = 0
+        self.max_wait_ms: float = 0.0
+    
+    @asynccontextmanager
+    async def hold(self, room_code: str):
+        """Run the block with the room's lock held."""
+        lock = self._locks.get(room_code)
+        if lock is None:
+            lock = self._locks[room_code] = asyncio.Lock()
+        self._users[room_code] = self._users.get(room_code, 0) + 1
+        
+        try:
+            if lock.locked():
+                self.contended += 1
+                started = time.perf_counter()
+                await lock.acquire()
+                self.max_wait_ms = max(self.max_wait_ms, (time.perf_counter() - started) * 1000)
+            else:
+                await lock.acquire()
+            self.acquisitions += 1
+            
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._users[room_code] -= 1
+            if not self._users[room_code]:
+                del self._users[room_code]
+                del self._locks[room_code]
+    
+    def get_stats(self) -> dict:
+        """Get lock usage statistics."""
+        return {
+            "rooms_locked": len(self._locks),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "max_wait_ms": round(self.max_wait_ms, 2)
+        }
+
+
+# Global per-room locks
+room_locks = RoomLocks()
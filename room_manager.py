@@ -1,17 +1,58 @@
 """Room management and code generation utilities."""
+import bisect
+import heapq
 import secrets
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List, Tuple
 from models import Room
 from storage import storage
 from config import settings
+from events import (
+    event_bus, ROOM_CREATED, ROOM_DELETED, ROOM_EXPIRED,
+    PARTICIPANT_JOINED, PARTICIPANT_LEFT
+)
+
+
+class RoomLimitReached(Exception):
+    """MAX_LIVE_ROOMS is reached and no idle room can be evicted."""
 
 
 class RoomManager:
-    """Manages room creation, retrieval, and lifecycle."""
+    """Manages room creation, retrieval, and lifecycle.
+    
+    Decoded rooms are kept in a bounded LRU cache. Every lookup checks the
+    cached version against storage, so writes from other workers (or bulk
+    imports) are never served stale; the TTL bounds how long an idle entry
+    is kept.
+    """
     
     def __init__(self):
         self.storage = storage
+        # room_code -> (room, cached_at)
+        self._cache: "OrderedDict[str, Tuple[Room, float]]" = OrderedDict()
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.cache_evictions: int = 0
+        # Reclamation and memory accounting
+        self.rooms_reclaimed: int = 0
+        self.rooms_evicted: int = 0
+        self.memory_stats: dict = {}
+        # (data version, sorted expiries not yet passed when it was scanned)
+        self._expiries: Tuple[str, List[str]] = ("", [])
+    
+    def _cache_put(self, room: Room):
+        """Cache a decoded room as most recently used, evicting the LRU entry."""
+        self._cache[room.room_code] = (room, time.monotonic())
+        self._cache.move_to_end(room.room_code)
+        while len(self._cache) > settings.ROOM_CACHE_SIZE:
+            self._cache.popitem(last=False)
+            self.cache_evictions += 1
+    
+    def _cache_invalidate(self, room_code: str):
+        """Forget a cached room."""
+        self._cache.pop(room_code, None)
     
     def generate_room_code(self) -> str:
         """Generate a unique 6-character room code using base62."""
@@ -26,7 +67,7 @@ class RoomManager:
             )
             
             # Check if code already exists
-            if not self.storage.get_room(code):
+            if self.storage.get_room_version(code) is None:
                 return code
         
         # Fallback with timestamp suffix if all attempts fail (extremely unlikely)
@@ -38,9 +79,22 @@ class RoomManager:
         self, 
         owner_id: Optional[str] = None,
         ttl_hours: Optional[int] = None,
-        max_participants: Optional[int] = None
+        max_participants: Optional[int] = None,
+        topology: Optional[str] = None,
+        presenter_ids: Optional[List[str]] = None,
+        grid_size: Optional[int] = None,
+        presence_mode: Optional[str] = None
     ) -> Room:
-        """Create a new room with a unique code."""
+        """Create a new room with a unique code.
+        
+        Raises RoomLimitReached when MAX_LIVE_ROOMS is reached and every
+        room has participants.
+        """
+        if settings.MAX_LIVE_ROOMS:
+            excess = self.storage.count_rooms() - settings.MAX_LIVE_ROOMS + 1
+            if excess > 0 and not self._evict_idle_rooms(excess):
+                raise RoomLimitReached()
+        
         room_code = self.generate_room_code()
         
         if ttl_hours is None:
@@ -49,6 +103,15 @@ class RoomManager:
         if max_participants is None:
             max_participants = settings.MAX_PARTICIPANTS_PER_ROOM
         
+        if topology is None:
+            topology = settings.DEFAULT_ROOM_TOPOLOGY
+        
+        if grid_size is None:
+            grid_size = settings.GRID_TOPOLOGY_SIZE
+        
+        if presence_mode is None:
+            presence_mode = settings.DEFAULT_PRESENCE_MODE
+        
         expires_at = datetime.utcnow() + timedelta(hours=ttl_hours)
         
         room = Room(
@@ -56,90 +119,270 @@ class RoomManager:
             expires_at=expires_at,
             owner_socket_id=owner_id,
             max_participants=max_participants,
-            state="open"
+            state="open",
+            topology=topology,
+            presenter_ids=presenter_ids or [],
+            grid_size=grid_size,
+            presence_mode=presence_mode
         )
         
         self.storage.save_room(room)
+        self._cache_put(room)
+        event_bus.emit(ROOM_CREATED, {
+            "room_code": room.room_code,
+            "owner_id": owner_id,
+            "topology": room.topology,
+            "max_participants": room.max_participants,
+            "expires_at": room.expires_at.isoformat()
+        })
         return room
     
     def get_room(self, room_code: str) -> Optional[Room]:
-        """Get a room by code."""
+        """Get a room by code, from the cache when its version is current.
+        
+        Rooms past their expiry are reported as expired without writing to
+        storage; the cleanup job removes them.
+        """
+        current = self.storage.get_room_version(room_code)
+        if current is None:
+            self._cache_invalidate(room_code)
+            return None
+        
+        entry = self._cache.get(room_code)
+        if entry is not None:
+            room, cached_at = entry
+            if room.version == current[0] and time.monotonic() - cached_at < settings.ROOM_CACHE_TTL_SECONDS:
+                self._cache.move_to_end(room_code)
+                self.cache_hits += 1
+                return self.mark_expired(room)
+        
+        self.cache_misses += 1
         room = self.storage.get_room(room_code)
+        if room is None:
+            self._cache_invalidate(room_code)
+            return None
         
-        if room and room.is_expired():
+        self._cache_put(room)
+        return self.mark_expired(room)
+    
+    @staticmethod
+    def mark_expired(room: Room) -> Room:
+        """Reflect a passed expiry in the room's state (in memory only)."""
+        if room.state != "expired" and room.is_expired():
             room.state = "expired"
-            self.storage.save_room(room)
-        
         return room
     
+    def listing_version(self) -> str:
+        """Version of room listings: changes on every write and whenever a room expires.
+        
+        Expiry is not written to storage, so the data version alone would
+        keep serving a room as open after it expired.
+        """
+        data_version = self.storage.data_version()
+        now = datetime.utcnow().isoformat()
+        if self._expiries[0] != data_version:
+            self._expiries = (data_version, sorted(
+                room_data["expires_at"]
+                for room_data in self.storage.iter_room_records()
+                if room_data["expires_at"] > now
+            ))
+        passed = bisect.bisect_right(self._expiries[1], now)
+        return f"{data_version}-{passed:x}"
+    
     def update_room(self, room: Room) -> bool:
         """Update room state."""
-        return self.storage.save_room(room)
+        saved = self.storage.save_room(room)
+        self._cache_put(room)
+        return saved
     
     def delete_room(self, room_code: str) -> bool:
         """Delete a room."""
-        return self.storage.delete_room(room_code)
+        self._cache_invalidate(room_code)
+        deleted = self.storage.delete_room(room_code)
+        if deleted:
+            event_bus.emit(ROOM_DELETED, {"room_code": room_code, "reason": "deleted"})
+        return deleted
+    
+    def _delete_idle(self, room_codes: List[str], reason: str) -> List[str]:
+        """Delete rooms in one write, skipping any that have been rejoined."""
+        deleted = self.storage.delete_rooms(room_codes, only_empty=True)
+        for room_code in deleted:
+            self._cache_invalidate(room_code)
+            event_bus.emit(ROOM_DELETED, {"room_code": room_code, "reason": reason})
+        return deleted
+    
+    def _evict_idle_rooms(self, count: int) -> bool:
+        """Evict at least `count` of the least recently active empty rooms.
+        
+        A little extra is evicted so that creates at the cap don't each
+        trigger a scan.
+        """
+        target = max(count, settings.MAX_LIVE_ROOMS // 100)
+        candidates = heapq.nsmallest(
+            target,
+            (
+                (room_data.get("last_active_at") or room_data["created_at"], room_data["room_code"])
+                for room_data in self.storage.iter_room_records()
+                if not room_data.get("participants")
+            )
+        )
+        evicted = self._delete_idle([code for _, code in candidates], "evicted")
+        self.rooms_evicted += len(evicted)
+        if evicted:
+            print(f"Evicted {len(evicted)} idle rooms (MAX_LIVE_ROOMS={settings.MAX_LIVE_ROOMS})")
+        return len(evicted) >= count
+    
+    def reclaim_empty_rooms(self) -> List[str]:
+        """Delete rooms that have been empty for longer than the grace period.
+        
+        Rooms nobody has joined yet (e.g. scheduled classes) are left alone
+        until they expire.
+        """
+        if not settings.RECLAIM_EMPTY_ROOMS:
+            return []
+        
+        cutoff = (datetime.utcnow() - timedelta(minutes=settings.EMPTY_ROOM_GRACE_MINUTES)).isoformat()
+        stale = [
+            room_data["room_code"]
+            for room_data in self.storage.iter_room_records()
+            if not room_data.get("participants")
+            and room_data.get("emptied_at")
+            and room_data["emptied_at"] <= cutoff
+        ]
+        if not stale:
+            return []
+        
+        reclaimed = self._delete_idle(stale, "reclaimed")
+        self.rooms_reclaimed += len(reclaimed)
+        return reclaimed
+    
+    def update_memory_stats(self, chat_bytes_by_room: Optional[dict] = None, top: int = 10) -> dict:
+        """Account stored bytes per room (plus chat history) in one pass.
+        
+        O(rooms), so the reclaim task runs it in a thread; it only reads
+        storage (record headers with the binary backend).
+        """
+        chat_bytes_by_room = chat_bytes_by_room or {}
+        total_bytes = 0
+        empty_rooms = 0
+        participants = 0
+        sizes = []
+        
+        for room_code, stored_bytes, room_participants in self.storage.iter_room_sizes():
+            room_bytes = stored_bytes + chat_bytes_by_room.get(room_code, 0)
+            total_bytes += room_bytes
+            participants += room_participants
+            if not room_participants:
+                empty_rooms += 1
+            sizes.append((room_bytes, room_code))
+        
+        self.memory_stats = {
+            "rooms": len(sizes),
+            "empty_rooms": empty_rooms,
+            "participants": participants,
+            "approx_bytes": total_bytes,
+            "avg_room_bytes": total_bytes // len(sizes) if sizes else 0,
+            "largest_rooms": [
+                {"room_code": code, "approx_bytes": size}
+                for size, code in heapq.nlargest(top, sizes)
+            ],
+            "computed_at": datetime.utcnow().isoformat()
+        }
+        return self.memory_stats
+    
+    def get_lifecycle_stats(self) -> dict:
+        """Reclamation counters plus the last memory accounting."""
+        return {
+            "max_live_rooms": settings.MAX_LIVE_ROOMS or None,
+            "empty_room_grace_minutes": settings.EMPTY_ROOM_GRACE_MINUTES if settings.RECLAIM_EMPTY_ROOMS else None,
+            "reclaimed": self.rooms_reclaimed,
+            "evicted": self.rooms_evicted,
+            "memory": self.memory_stats
+        }
     
     def add_participant(
         self, 
         room_code: str, 
         socket_id: str, 
         display_name: Optional[str] = None,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        user_verified: bool = False,
+        role: Optional[str] = None
     ) -> Optional[Room]:
-        """Add a participant to a room."""
-        room = self.get_room(room_code)
-        
-        if not room:
-            return None
-        
-        if room.is_expired():
-            return None
+        """Add a participant to a room.
         
-        if room.state != "open":
-            return None
+        The capacity check and the add are one atomic storage update, so
+        concurrent joins can neither overfill the room nor overwrite each
+        other.
+        """
+        def join(room: Room) -> bool:
+            if room.is_expired() or room.state != "open":
+                return False
+            return room.add_participant(socket_id, display_name, user_id, user_verified, role)
         
-        success = room.add_participant(socket_id, display_name, user_id)
+        room, success = self.storage.mutate_room(room_code, join)
         
         if success:
-            self.storage.save_room(room)
+            self._cache_put(room)
+            event_bus.emit(PARTICIPANT_JOINED, {
+                "room_code": room_code,
+                "socket_id": socket_id,
+                "user_id": user_id,
+                "display_name": display_name,
+                "participant_count": len(room.participants)
+            })
             return room
         
         return None
     
     def remove_participant(self, room_code: str, socket_id: str) -> Optional[Room]:
-        """Remove a participant from a room."""
-        room = self.get_room(room_code)
-        
-        if not room:
-            return None
-        
-        success = room.remove_participant(socket_id)
+        """Remove a participant from a room (atomic storage update)."""
+        room, success = self.storage.mutate_room(room_code, lambda room: room.remove_participant(socket_id))
         
         if success:
-            # If no participants left, can optionally delete or mark for cleanup
-            if len(room.participants) == 0:
-                # Keep room for a bit in case of reconnection, cleanup job will handle it
-                pass
-            
-            self.storage.save_room(room)
+            # Empty rooms are kept for EMPTY_ROOM_GRACE_MINUTES in case people
+            # reconnect; the reclaim sweep deletes them afterwards
+            self._cache_put(room)
+            event_bus.emit(PARTICIPANT_LEFT, {
+                "room_code": room_code,
+                "socket_id": socket_id,
+                "participant_count": len(room.participants)
+            })
             return room
         
         return None
     
     def cleanup_expired_rooms(self) -> int:
         """Clean up expired rooms."""
-        return self.storage.cleanup_expired_rooms()
+        expired = self.storage.cleanup_expired_rooms()
+        for room_code in expired:
+            self._cache_invalidate(room_code)
+            event_bus.emit(ROOM_EXPIRED, {"room_code": room_code})
+        return len(expired)
     
     def get_participant_room(self, socket_id: str) -> Optional[tuple[str, Room]]:
         """Find which room a participant is in."""
-        all_rooms = self.storage.get_all_rooms()
+        room_code = self.storage.find_participant_room(socket_id)
+        if not room_code:
+            return None
         
-        for room in all_rooms:
-            if socket_id in room.participants:
-                return (room.room_code, room)
+        room = self.get_room(room_code)
+        if not room or socket_id not in room.participants:
+            return None
         
-        return None
+        return (room_code, room)
+    
+    def get_cache_stats(self) -> dict:
+        """Get room cache statistics."""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self._cache),
+            "max_size": settings.ROOM_CACHE_SIZE,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "evictions": self.cache_evictions,
+            "hit_rate": round(self.cache_hits / lookups, 3) if lookups else None
+        }
 
 
 # Global room manager instance
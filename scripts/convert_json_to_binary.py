@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Convert a rooms.json snapshot to the binary storage format.
+
+Streams the JSON file one room at a time and writes `<name>.rec` (records)
+and `<name>.idx` (hash index) next to it, or next to --output. Stop the
+server first; start it again with STORAGE_BACKEND=binary.
+
+Usage:
+    python scripts/convert_json_to_binary.py data/rooms.json
+    python scripts/convert_json_to_binary.py data/rooms.json --output /srv/data/rooms --skip-expired --verify
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from binary_storage import BinaryStorage, encode_record, write_files  # noqa: E402
+from models import Room  # noqa: E402
+from snapshot_loader import iter_snapshot_rooms  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert rooms.json to the binary storage format")
+    parser.add_argument("input", help="JSON snapshot (DATA_FILE)")
+    parser.add_argument("--output", help="Output path; .rec/.idx suffixes replace its extension (default: input)")
+    parser.add_argument("--skip-expired", action="store_true", help="Drop rooms that have already expired")
+    parser.add_argument("--verify", action="store_true", help="Read every room back from the binary files")
+    args = parser.parse_args()
+    
+    output = Path(args.output or args.input)
+    records_path = output.with_suffix(".rec")
+    index_path = output.with_suffix(".idx")
+    counts = {"skipped_expired": 0, "skipped_invalid": 0}
+    now = datetime.utcnow()
+    
+    def records():
+        for room_code, room_data in iter_snapshot_rooms(args.input):
+            try:
+                expires_at = datetime.fromisoformat(room_data["expires_at"])
+                record = encode_record(room_code, room_data)
+            except (KeyError, TypeError, ValueError):
+                counts["skipped_invalid"] += 1
+                continue
+            if args.skip_expired and expires_at <= now:
+                counts["skipped_expired"] += 1
+                continue
+            yield room_code, record
+    
+    started = time.perf_counter()
+    records_path.parent.mkdir(parents=True, exist_ok=True)
+    written = write_files(records_path, index_path, records())
+    print(f"Converted {written} rooms in {time.perf_counter() - started:.2f}s "
+          f"(skipped {counts['skipped_expired']} expired, {counts['skipped_invalid']} invalid)")
+    print(f"  {args.input}: {os.path.getsize(args.input)} bytes")
+    print(f"  {records_path}: {os.path.getsize(records_path)} bytes")
+    print(f"  {index_path}: {os.path.getsize(index_path)} bytes")
+    
+    if args.verify:
+        storage = BinaryStorage(str(output))
+        mismatched = []
+        checked = 0
+        for room_code, room_data in iter_snapshot_rooms(args.input):
+            try:
+                expected = Room.model_validate(room_data)
+            except Exception:
+                continue
+            stored = storage.get_room(room_code)
+            if stored is None:
+                if not (args.skip_expired and expected.expires_at <= now):
+                    mismatched.append(room_code)
+                continue
+            checked += 1
+            if stored.model_dump() != expected.model_dump():
+                mismatched.append(room_code)
+        
+        if storage.count_rooms() != written:
+            mismatched.append(f"count {storage.count_rooms()} != {written}")
+        print(f"Verified {checked} rooms, {len(mismatched)} mismatches")
+        if mismatched:
+            print(f"  e.g. {mismatched[:10]}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
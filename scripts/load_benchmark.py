@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Signaling load benchmark.
+
+Opens rooms of several WebSocket clients, measures connect and join
+latency, then has every client bounce signal messages off a peer and
+measures the round trip and throughput.
+
+Usage:
+    # Against a running server
+    python scripts/load_benchmark.py --url ws://localhost:8000/ws --rooms 50 --room-size 4
+    
+    # Start the server with the development and the production profile in
+    # turn, run the same load against each and print both side by side
+    python scripts/load_benchmark.py --compare --rooms 100 --room-size 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import websockets
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, or None for an empty sample."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 2)
+
+
+class BenchClient:
+    """One simulated participant."""
+    
+    def __init__(self, url: str, results: Dict[str, list]):
+        self.url = url
+        self.results = results
+        self.ws = None
+        self.socket_id: Optional[str] = None
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.echoes = 0
+        self._reader: Optional[asyncio.Task] = None
+    
+    async def connect(self):
+        started = time.perf_counter()
+        self.ws = await websockets.connect(self.url, max_size=None)
+        self._reader = asyncio.create_task(self._read())
+        connected = await self.expect("connected")
+        self.socket_id = connected["payload"]["socket_id"]
+        self.results["connect_ms"].append((time.perf_counter() - started) * 1000)
+    
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                message = json.loads(raw)
+                if message.get("type") == "signal":
+                    await self._on_signal(message["payload"])
+                else:
+                    await self.inbox.put(message)
+        except websockets.ConnectionClosed:
+            pass
+    
+    async def _on_signal(self, signal: dict):
+        body = signal["payload"]
+        if body.get("echo"):
+            # Bounce it straight back to the sender
+            await self.send("signal", {
+                "to": signal["from"],
+                "signal_type": "ice-candidate",
+                "payload": {"echo": False, "sent": body["sent"]}
+            })
+        else:
+            self.results["signal_rtt_ms"].append((time.perf_counter() - body["sent"]) * 1000)
+            self.echoes += 1
+    
+    async def send(self, msg_type: str, payload: dict):
+        await self.ws.send(json.dumps({"type": msg_type, "payload": payload}))
+    
+    async def expect(self, msg_type: str, timeout: float = 30) -> dict:
+        """Wait for a message of a type, skipping others (presence, chat, ...)."""
+        deadline = time.perf_counter() + timeout
+        while True:
+            message = await asyncio.wait_for(self.inbox.get(), timeout=max(0.01, deadline - time.perf_counter()))
+            if message.get("type") == msg_type:
+                return message
+            if message.get("type") == "error":
+                raise RuntimeError(message["payload"].get("code"))
+    
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+
+
+async def run_room(url: str, room_size: int, signals: int, results: Dict[str, list]):
+    """Create a room, fill it, and exchange signals around a ring."""
+    members = [BenchClient(url, results) for _ in range(room_size)]
+    try:
+        owner = members[0]
+        await owner.connect()
+        await owner.send("create_room", {"display_name": "bench-0"})
+        room_code = (await owner.expect("room_created"))["payload"]["room_code"]
+        
+        for i, member in enumerate(members[1:], start=1):
+            await member.connect()
+            started = time.perf_counter()
+            await member.send("join_room", {"room_code": room_code, "display_name": f"bench-{i}"})
+            await member.expect("joined")
+            results["join_ms"].append((time.perf_counter() - started) * 1000)
+        
+        if room_size < 2:
+            return
+        
+        for _ in range(signals):
+            for i, member in enumerate(members):
+                target = members[(i + 1) % room_size]
+                await member.send("signal", {
+                    "to": target.socket_id,
+                    "signal_type": "ice-candidate",
+                    "payload": {"echo": True, "sent": time.perf_counter()}
+                })
+        
+        # Wait for the echoes to come back
+        expected = signals * room_size
+        deadline = time.perf_counter() + 30
+        while sum(m.echoes for m in members) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+    except Exception as e:
+        results["errors"].append(f"{type(e).__name__}: {e}")
+    finally:
+        for member in members:
+            await member.close()
+
+
+async def run_benchmark(url: str, rooms: int, room_size: int, signals: int, concurrency: int) -> dict:
+    """Run the load and summarise latencies and throughput."""
+    results: Dict[str, list] = {"connect_ms": [], "join_ms": [], "signal_rtt_ms": [], "errors": []}
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def limited():
+        async with semaphore:
+            await run_room(url, room_size, signals, results)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(rooms)))
+    elapsed = time.perf_counter() - started
+    
+    summary = {
+        "rooms": rooms,
+        "room_size": room_size,
+        "seconds": round(elapsed, 2),
+        "signal_round_trips": len(results["signal_rtt_ms"]),
+        "round_trips_per_second": round(len(results["signal_rtt_ms"]) / elapsed, 1) if elapsed else None,
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5]
+    }
+    for key in ("connect_ms", "join_ms", "signal_rtt_ms"):
+        for pct in (50, 95, 99):
+            summary[f"{key}_p{pct}"] = percentile(results[key], pct)
+    return summary
+
+
+def wait_for_health(port: int, timeout: float = 30):
+    """Block until the server answers /readiness."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readiness", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} did not become ready")
+
+
+def server_command(profile: str, port: int) -> List[str]:
+    """Command line for each profile, matching how start.py runs it."""
+    if profile == "production":
+        return [sys.executable, "start.py", "--production"]
+    # Development profile: default event loop and HTTP parser, with the reloader
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+            "--port", str(port), "--reload", "--loop", "asyncio", "--http", "h11"]
+
+
+def run_profile(profile: str, port: int, args) -> dict:
+    """Start a fresh server with a profile, benchmark it and stop it."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {
+            **os.environ,
+            "PORT": str(port),
+            "HOST": "127.0.0.1",
+            "API_KEY": "benchmark",
+            "DATA_FILE": f"{data_dir}/rooms.json",
+            "CHAT_LOG_DIR": f"{data_dir}/chat",
+            "WEBHOOK_URLS": "",
+            # Measure the server, not the admission limits
+            "MAX_CONNECTIONS": "1000000",
+            "MAX_CONCURRENT_JOINS": "100000",
+            "MAX_JOINS_PER_SECOND": "100000",
+            "LOOP_LAG_THRESHOLD_MS": "100000"
+        }
+        process = subprocess.Popen(server_command(profile, port), cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_health(port)
+            print(f"Running {profile} profile...")
+            return asyncio.run(run_benchmark(
+                f"ws://127.0.0.1:{port}/ws", args.rooms, args.room_size, args.signals, args.concurrency
+            ))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def print_comparison(results: Dict[str, dict]):
+    """Print profiles side by side."""
+    profiles = list(results)
+    keys = [k for k in results[profiles[0]] if k not in ("error_samples",)]
+    print(f"\n{'metric':<26}" + "".join(f"{p:>14}" for p in profiles))
+    print("-" * (26 + 14 * len(profiles)))
+    for key in keys:
+        print(f"{key:<26}" + "".join(f"{str(results[p][key]):>14}" for p in profiles))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the signaling server")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--room-size", type=int, default=4)
+    parser.add_argument("--signals", type=int, default=20, help="Round trips per participant")
+    parser.add_argument("--concurrency", type=int, default=20, help="Rooms set up at once")
+    parser.add_argument("--compare", action="store_true",
+                        help="Start the server with each profile and compare them")
+    parser.add_argument("--port", type=int, default=8765, help="Port used by --compare")
+    parser.add_argument("--json-out", help="Also write the results to this file")
+    args = parser.parse_args()
+    
+    if args.compare:
+        results = {profile: run_profile(profile, args.port, args) for profile in ("development", "production")}
+        print_comparison(results)
+    else:
+        results = asyncio.run(run_benchmark(args.url, args.rooms, args.room_size, args.signals, args.concurrency))
+        print(json.dumps(results, indent=2))
+    
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Replay a signaling recording against a server and verify its responses.
+
+Record traffic by starting the server with RECORD_FILE set, then drive a
+fresh server with the same inbound frames, at the recorded pace, faster,
+or as fast as possible. Socket ids and room codes in the recording are
+mapped to the ones the new server hands out, and every socket's outbound
+message sequence is compared with the recorded one.
+
+Usage:
+    # Start a fresh production server on a temporary data directory and replay at 1x
+    python scripts/replay_signaling.py recording.ndjson --spawn
+    
+    # Against a running server, 10x faster
+    python scripts/replay_signaling.py recording.ndjson --url ws://localhost:8000/ws --api-key KEY --speed 10
+    
+    # As fast as possible (each frame still waits for the replies it depended on)
+    python scripts/replay_signaling.py recording.ndjson --spawn --speed 0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import websockets
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Fields whose values are ids the server assigns; learned by lining up
+# recorded and replayed responses
+ID_KEYS = ("socket_id", "your_socket_id", "room_code", "from")
+# Server-initiated messages that don't depend on the replayed traffic
+DEFAULT_IGNORE = "announcement,reconnect"
+# Presence updates at the end of a socket's life depend on how concurrent
+# closes interleave, so trailing ones are only compared with --strict
+PRESENCE_TYPES = ("peer_left", "peer_joined", "roster_delta")
+# A replay is finished once no response arrived for this long
+SETTLE_SECONDS = 1.0
+
+
+def load_recording(path: str) -> dict:
+    """Parse a recording into events plus per-socket expectations."""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != "signaling-recording":
+            raise SystemExit(f"{path} is not a signaling recording")
+        events = [json.loads(line) for line in f if line.strip()]
+    
+    socket_ids: Dict[int, str] = {}
+    outbound: Dict[int, List[dict]] = {}
+    joined_rooms: Set[str] = set()
+    created_rooms: Set[str] = set()
+    # Per inbound event: outbound frames its socket had received before it
+    received_before: List[int] = []
+    
+    for t, kind, number, data in events:
+        if kind == "o":
+            socket_ids[number] = data
+            outbound[number] = []
+        elif kind == "x":
+            message = json.loads(data)
+            outbound[number].append(message)
+            if message.get("type") == "room_created":
+                created_rooms.add(message["payload"]["room_code"])
+            elif message.get("type") == "joined":
+                joined_rooms.add(message["payload"]["room_code"])
+        received_before.append(len(outbound.get(number, ())))
+    
+    return {
+        "events": events,
+        "socket_ids": socket_ids,
+        "outbound": outbound,
+        "received_before": received_before,
+        # Rooms joined but not created over WebSocket were created via REST
+        "rest_rooms": joined_rooms - created_rooms,
+        "duration_ms": events[-1][0] if events else 0
+    }
+
+
+def remap(value, mapping: Dict[str, str]):
+    """Replace recorded ids with the replay's ids anywhere in a message."""
+    if isinstance(value, str):
+        return mapping.get(value, value)
+    if isinstance(value, list):
+        return [remap(v, mapping) for v in value]
+    if isinstance(value, dict):
+        return {k: remap(v, mapping) for k, v in value.items()}
+    return value
+
+
+def unmapped_ids(value, known: Set[str], mapping: Dict[str, str]) -> Set[str]:
+    """Recorded ids in a message that the replay hasn't learned yet."""
+    if isinstance(value, str):
+        return {value} if value in known and value not in mapping else set()
+    if isinstance(value, list):
+        return set().union(*(unmapped_ids(v, known, mapping) for v in value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*(unmapped_ids(v, known, mapping) for v in value.values())) if value else set()
+    return set()
+
+
+def strip_trailing_presence(signatures: List[str]) -> List[str]:
+    end = len(signatures)
+    while end and signatures[end - 1] in PRESENCE_TYPES:
+        end -= 1
+    return signatures[:end]
+
+
+def signature(message: dict) -> str:
+    """What is compared between recorded and replayed responses."""
+    msg_type = message.get("type")
+    if msg_type == "error":
+        return f"error:{message.get('payload', {}).get('code')}"
+    return str(msg_type)
+
+
+class Replayer:
+    """Drives one replay and collects what every socket received."""
+    
+    def __init__(self, recording: dict, url: str, speed: float, lockstep: bool, timeout: float):
+        self.recording = recording
+        self.url = url
+        self.speed = speed
+        self.lockstep = lockstep
+        self.timeout = timeout
+        self.mapping: Dict[str, str] = {}
+        self.known_ids: Set[str] = set(recording["socket_ids"].values())
+        for messages in recording["outbound"].values():
+            for message in messages:
+                payload = message.get("payload")
+                if isinstance(payload, dict) and isinstance(payload.get("room_code"), str):
+                    self.known_ids.add(payload["room_code"])
+        self.known_ids |= recording["rest_rooms"]
+        
+        self.sockets: Dict[int, object] = {}
+        self.received: Dict[int, List[dict]] = {n: [] for n in recording["socket_ids"]}
+        self.readers: List[asyncio.Task] = []
+        self.changed = asyncio.Event()
+        self.sent = 0
+        self.stalls = 0
+    
+    def _learn(self, number: int, message: dict):
+        """Line a response up with the recorded one and learn new ids."""
+        index = len(self.received[number]) - 1
+        expected = self.recording["outbound"][number]
+        if index >= len(expected) or signature(expected[index]) != signature(message):
+            return
+        recorded = expected[index].get("payload")
+        replayed = message.get("payload")
+        if not isinstance(recorded, dict) or not isinstance(replayed, dict):
+            return
+        for key in ID_KEYS:
+            old, new = recorded.get(key), replayed.get(key)
+            if isinstance(old, str) and isinstance(new, str) and old not in self.mapping:
+                self.mapping[old] = new
+    
+    async def _read(self, number: int, ws):
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                self.received[number].append(message)
+                self._learn(number, message)
+                self.changed.set()
+        except websockets.ConnectionClosed:
+            pass
+    
+    async def _wait_until(self, condition) -> bool:
+        """Wait for replies to arrive until `condition()` holds or time runs out."""
+        deadline = time.perf_counter() + self.timeout
+        while not condition():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stalls += 1
+                return False
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+    
+    def create_rest_rooms(self, api_key: Optional[str]):
+        """Create the rooms the recording joined but never created over WebSocket."""
+        if not self.recording["rest_rooms"]:
+            return
+        if not api_key:
+            print(f"Warning: {len(self.recording['rest_rooms'])} rooms were created via REST; "
+                  "pass --api-key to recreate them")
+            return
+        base = self.url.replace("ws://", "http://").replace("wss://", "https://").rsplit("/ws", 1)[0]
+        for room_code in sorted(self.recording["rest_rooms"]):
+            request = urllib.request.Request(
+                f"{base}/api/rooms", data=b"{}", method="POST",
+                headers={"X-API-Key": api_key, "Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(request, timeout=10) as response:
+                self.mapping[room_code] = json.loads(response.read())["room_code"]
+    
+    async def run(self) -> float:
+        """Replay every event in order. Returns the elapsed seconds."""
+        events = self.recording["events"]
+        started = time.perf_counter()
+        
+        for index, (t, kind, number, data) in enumerate(events):
+            if self.speed > 0:
+                delay = started + t / 1000 / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            
+            if kind == "o":
+                ws = await websockets.connect(self.url, max_size=None)
+                self.sockets[number] = ws
+                self.readers.append(asyncio.create_task(self._read(number, ws)))
+                # The recorded id is learned from the `connected` message
+                await self._wait_until(lambda: data in self.mapping)
+            
+            elif kind == "i" and number in self.sockets:
+                if self.lockstep:
+                    needed = self.recording["received_before"][index]
+                    await self._wait_until(lambda: len(self.received[number]) >= needed)
+                try:
+                    message = json.loads(data)
+                except ValueError:
+                    # Malformed frames are replayed as they were
+                    await self.sockets[number].send(data)
+                    self.sent += 1
+                    continue
+                await self._wait_until(lambda: not unmapped_ids(message, self.known_ids, self.mapping))
+                await self.sockets[number].send(json.dumps(remap(message, self.mapping)))
+                self.sent += 1
+            
+            elif kind == "c" and number in self.sockets:
+                await self.sockets.pop(number).close()
+        
+        # Let the last responses arrive: stop once every socket has its
+        # recorded count or nothing has arrived for SETTLE_SECONDS
+        expected = {n: len(m) for n, m in self.recording["outbound"].items()}
+        deadline = time.perf_counter() + self.timeout
+        while time.perf_counter() < deadline and any(len(self.received[n]) < c for n, c in expected.items()):
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                break
+        elapsed = time.perf_counter() - started
+        
+        for ws in self.sockets.values():
+            await ws.close()
+        for reader in self.readers:
+            reader.cancel()
+        return elapsed
+    
+    def verify(self, ignore: Set[str], strict: bool) -> List[dict]:
+        """Compare every socket's responses with the recording."""
+        mismatches = []
+        for number, recorded in self.recording["outbound"].items():
+            expected = [signature(m) for m in recorded if m.get("type") not in ignore]
+            actual = [signature(m) for m in self.received[number] if m.get("type") not in ignore]
+            if not strict:
+                expected = strip_trailing_presence(expected)
+                actual = strip_trailing_presence(actual)
+            if expected == actual:
+                continue
+            first = next(
+                (i for i, (e, a) in enumerate(zip(expected, actual)) if e != a),
+                min(len(expected), len(actual))
+            )
+            mismatches.append({
+                "socket": number,
+                "recorded_socket_id": self.recording["socket_ids"][number],
+                "index": first,
+                "expected": expected[first:first + 5],
+                "actual": actual[first:first + 5],
+                "expected_count": len(expected),
+                "actual_count": len(actual)
+            })
+        return mismatches
+
+
+def wait_for_ready(port: int, timeout: float = 30):
+    """Block until the spawned server answers /readiness."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readiness", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} did not become ready")
+
+
+def spawn_server(port: int, data_dir: str) -> subprocess.Popen:
+    """Start a fresh production server with an empty data directory."""
+    env = {
+        **os.environ,
+        "PORT": str(port),
+        "HOST": "127.0.0.1",
+        "API_KEY": "replay",
+        "DATA_FILE": f"{data_dir}/rooms.json",
+        "CHAT_LOG_DIR": f"{data_dir}/chat",
+        "WEBHOOK_URLS": "",
+        "RECORD_FILE": "",
+        # Replay the traffic, not the admission limits of this machine
+        "MAX_CONNECTIONS": "1000000",
+        "MAX_CONCURRENT_JOINS": "100000",
+        "MAX_JOINS_PER_SECOND": "100000",
+        "LOOP_LAG_THRESHOLD_MS": "100000"
+    }
+    process = subprocess.Popen([sys.executable, "start.py", "--production"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_ready(port)
+    return process
+
+
+def replay(args, url: str, api_key: Optional[str]) -> int:
+    recording = load_recording(args.recording)
+    replayer = Replayer(recording, url, args.speed, not args.no_lockstep, args.timeout)
+    replayer.create_rest_rooms(api_key)
+    
+    elapsed = asyncio.run(replayer.run())
+    mismatches = replayer.verify({t for t in args.ignore.split(",") if t}, args.strict)
+    
+    recorded_seconds = recording["duration_ms"] / 1000
+    summary = {
+        "sockets": len(recording["socket_ids"]),
+        "frames_sent": replayer.sent,
+        "recorded_seconds": round(recorded_seconds, 2),
+        "replay_seconds": round(elapsed, 2),
+        "frames_per_second": round(replayer.sent / elapsed, 1) if elapsed else None,
+        "stalls": replayer.stalls,
+        "sockets_matching": len(recording["socket_ids"]) - len(mismatches),
+        "sockets_diverged": len(mismatches),
+        "mismatches": mismatches[:args.show]
+    }
+    print(json.dumps(summary, indent=2))
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded signaling traffic")
+    parser.add_argument("recording", help="File written by the server with RECORD_FILE set")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--api-key", help="Needed to recreate rooms that were created via REST")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed multiplier; 0 = as fast as possible")
+    parser.add_argument("--no-lockstep", action="store_true",
+                        help="Don't wait for a socket's earlier responses before sending its next frame")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="Seconds to wait for a response before moving on")
+    parser.add_argument("--ignore", default=DEFAULT_IGNORE,
+                        help="Comma-separated message types left out of verification")
+    parser.add_argument("--strict", action="store_true",
+                        help="Also compare presence updates at the end of each socket's life")
+    parser.add_argument("--show", type=int, default=10, help="Mismatching sockets to print")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a fresh server (production profile) for the replay")
+    parser.add_argument("--port", type=int, default=8765, help="Port used by --spawn")
+    args = parser.parse_args()
+    
+    if not args.spawn:
+        sys.exit(replay(args, args.url, args.api_key))
+    
+    with tempfile.TemporaryDirectory() as data_dir:
+        process = spawn_server(args.port, data_dir)
+        try:
+            code = replay(args, f"ws://127.0.0.1:{args.port}/ws", "replay")
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
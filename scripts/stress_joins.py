@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Concurrent join/leave stress test.
+
+Fills rooms with many clients joining at the same moment, optionally has
+them leave and rejoin several times, pushes extra clients at full rooms,
+then checks through the REST API that no participant was lost, that no room
+was overfilled, and that every leave was applied.
+
+Usage:
+    # Start a fresh server (two workers sharing the data file) and stress it
+    python scripts/stress_joins.py --spawn --workers 2 --rooms 20 --joiners 25 --churn 3
+    
+    # Against a running server
+    python scripts/stress_joins.py --url ws://localhost:8000/ws --api-key KEY
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import websockets
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def rest(base: str, api_key: str, method: str, path: str, body: Optional[dict] = None) -> dict:
+    request = urllib.request.Request(
+        f"{base}{path}", method=method,
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={"X-API-Key": api_key, "Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def expect(ws, *types: str, timeout: float = 30) -> dict:
+    """Next message of one of `types`; errors are returned too."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        raw = await asyncio.wait_for(ws.recv(), timeout=max(0.01, deadline - time.perf_counter()))
+        message = json.loads(raw)
+        if message.get("type") in types or message.get("type") == "error":
+            return message
+
+
+async def join(ws, room_code: str, name: str) -> dict:
+    """Join, retrying while the server sheds load."""
+    while True:
+        await ws.send(json.dumps({"type": "join_room", "payload": {"room_code": room_code, "display_name": name}}))
+        reply = await expect(ws, "joined")
+        payload = reply.get("payload", {})
+        if reply["type"] == "error" and payload.get("code") == "SERVER_BUSY":
+            await asyncio.sleep(payload.get("retry_after", 1))
+            continue
+        return reply
+
+
+async def run_client(url: str, room_code: str, name: str, churn: int, start: asyncio.Event,
+                     results: Dict[str, list], sockets: list):
+    ws = await websockets.connect(url, max_size=None)
+    sockets.append(ws)
+    await expect(ws, "connected")
+    await start.wait()
+    
+    try:
+        for cycle in range(churn + 1):
+            reply = await join(ws, room_code, name)
+            if reply["type"] != "joined":
+                results["refused"].append(reply["payload"].get("code"))
+                return
+            if cycle < churn:
+                await ws.send(json.dumps({"type": "leave_room", "payload": {}}))
+        results["joined"].append(name)
+    except Exception as e:
+        results["errors"].append(f"{type(e).__name__}: {e}")
+
+
+async def stress(url: str, base: str, api_key: str, rooms: int, joiners: int, extra: int, churn: int) -> dict:
+    room_codes = [
+        rest(base, api_key, "POST", "/api/rooms", {"max_participants": joiners})["room_code"]
+        for _ in range(rooms)
+    ]
+    results: Dict[str, list] = {"joined": [], "refused": [], "errors": []}
+    sockets: List = []
+    start = asyncio.Event()
+    
+    clients = [
+        run_client(url, code, f"{code}-{i}", churn, start, results, sockets)
+        for code in room_codes
+        for i in range(joiners + extra)
+    ]
+    tasks = [asyncio.create_task(c) for c in clients]
+    # Connect everyone first, then release all joins at once
+    while len(sockets) < len(tasks) and not any(t.done() and t.exception() for t in tasks):
+        await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    join_seconds = time.perf_counter() - started
+    
+    lost, overfilled = [], []
+    for code in room_codes:
+        info = rest(base, api_key, "GET", f"/api/rooms/{code}")
+        expected_names = {f"{code}-{i}" for i in range(joiners + extra)} & set(results["joined"])
+        present = {p["display_name"] for p in info["participants"]}
+        if expected_names - present:
+            lost.append({"room_code": code, "missing": sorted(expected_names - present)[:5],
+                         "count": len(expected_names - present)})
+        if info["participant_count"] > joiners:
+            overfilled.append({"room_code": code, "participant_count": info["participant_count"]})
+    
+    for ws in sockets:
+        await ws.close()
+    # Leaves are processed asynchronously after the close
+    deadline = time.time() + 10
+    ghosts = []
+    while time.time() < deadline:
+        ghosts = [
+            {"room_code": code, "participant_count": info["participant_count"]}
+            for code in room_codes
+            for info in [rest(base, api_key, "GET", f"/api/rooms/{code}")]
+            if info["participant_count"]
+        ]
+        if not ghosts:
+            break
+        await asyncio.sleep(0.5)
+    
+    return {
+        "rooms": rooms,
+        "clients": len(tasks),
+        "join_seconds": round(join_seconds, 2),
+        "joined": len(results["joined"]),
+        "refused": len(results["refused"]),
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:5],
+        "rooms_with_lost_participants": lost[:10],
+        "lost_participants": sum(item["count"] for item in lost),
+        "overfilled_rooms": overfilled[:10],
+        "rooms_with_ghosts_after_close": ghosts[:10]
+    }
+
+
+def wait_for_ready(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readiness", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent joins and leaves")
+    parser.add_argument("--url", default="ws://localhost:8000/ws")
+    parser.add_argument("--api-key", help="API key of the server under test")
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--joiners", type=int, default=25, help="Clients per room (= room capacity)")
+    parser.add_argument("--extra", type=int, default=5, help="Clients per room beyond capacity, must be refused")
+    parser.add_argument("--churn", type=int, default=2, help="Leave/rejoin cycles before the final join")
+    parser.add_argument("--spawn", action="store_true", help="Start a fresh server for the test")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --spawn")
+    parser.add_argument("--port", type=int, default=8765, help="Port used by --spawn")
+    args = parser.parse_args()
+    
+    if not args.spawn:
+        if not args.api_key:
+            parser.error("--api-key is required without --spawn")
+        base = args.url.replace("ws://", "http://").replace("wss://", "https://").rsplit("/ws", 1)[0]
+        summary = asyncio.run(stress(args.url, base, args.api_key, args.rooms, args.joiners, args.extra, args.churn))
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = {
+                **os.environ,
+                "PORT": str(args.port),
+                "HOST": "127.0.0.1",
+                "API_KEY": "stress",
+                "DATA_FILE": f"{data_dir}/rooms.json",
+                "CHAT_LOG_DIR": f"{data_dir}/chat",
+                "WEBHOOK_URLS": "",
+                "RECORD_FILE": "",
+                "MAX_CONNECTIONS": "1000000",
+                "MAX_CONCURRENT_JOINS": "100000",
+                "MAX_JOINS_PER_SECOND": "100000",
+                "LOOP_LAG_THRESHOLD_MS": "100000"
+            }
+            process = subprocess.Popen(
+                [sys.executable, "start.py", "--production", "--workers", str(args.workers)],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_for_ready(args.port)
+                summary = asyncio.run(stress(
+                    f"ws://127.0.0.1:{args.port}/ws", f"http://127.0.0.1:{args.port}", "stress",
+                    args.rooms, args.joiners, args.extra, args.churn
+                ))
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+    
+    print(json.dumps(summary, indent=2))
+    failed = summary["lost_participants"] or summary["overfilled_rooms"] or summary["rooms_with_ghosts_after_close"]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
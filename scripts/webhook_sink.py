@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Local webhook sink for testing lifecycle event delivery.
+
+Usage:
+    python scripts/webhook_sink.py --port 9000 --secret my-secret
+    WEBHOOK_URLS=http://localhost:9000/ WEBHOOK_SECRET=my-secret python main.py
+
+Use --fail-rate to answer a share of requests with 503 and watch retries.
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import random
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+def make_handler(secret: str, fail_rate: float):
+    """Build a request handler bound to the given options."""
+    
+    class SinkHandler(BaseHTTPRequestHandler):
+        received = 0
+        
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            
+            if secret:
+                timestamp = self.headers.get("X-Webhook-Timestamp", "")
+                expected = "sha256=" + hmac.new(
+                    secret.encode("utf-8"),
+                    timestamp.encode("utf-8") + b"." + body,
+                    hashlib.sha256
+                ).hexdigest()
+                if not hmac.compare_digest(expected, self.headers.get("X-Webhook-Signature", "")):
+                    print("✗ Rejected batch with bad signature")
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+            
+            if random.random() < fail_rate:
+                print("… Simulated failure (503)")
+                self.send_response(503)
+                self.end_headers()
+                return
+            
+            events = json.loads(body)["events"]
+            SinkHandler.received += len(events)
+            print(f"✓ Batch of {len(events)} events (total {SinkHandler.received})")
+            for event in events:
+                print(f"   {event['occurred_at']}  {event['type']:<20} {json.dumps(event['data'])}")
+            
+            self.send_response(204)
+            self.end_headers()
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return SinkHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print webhook batches sent by the signaling server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--secret", default="", help="Verify signatures with this WEBHOOK_SECRET")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    args = parser.parse_args()
+    
+    server = HTTPServer((args.host, args.port), make_handler(args.secret, args.fail_rate))
+    print(f"Webhook sink listening on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Optional recording of WebSocket signaling traffic for replay."""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional, TextIO
+from config import settings
+
+
+RECORDING_FORMAT = "signaling-recording"
+RECORDING_VERSION = 1
+
+# Line kinds: socket opened, inbound frame, outbound frame, socket closed
+OPEN = "o"
+INBOUND = "i"
+OUTBOUND = "x"
+CLOSE = "c"
+
+
+class SignalingRecorder:
+    """Appends every WebSocket frame to an NDJSON recording.
+    
+    After a header line, each line is `[ms_since_start, kind, socket, data]`.
+    Sockets are numbered in order of connection; the `open` line carries the
+    socket id the server assigned so a replay can remap it. Frames are kept
+    verbatim, except inbound frames over WS_MAX_MESSAGE_BYTES, which the
+    server rejects and which are kept as a short placeholder. Writes go
+    through a large userspace buffer, and recording stops once
+    RECORD_MAX_BYTES have been written.
+    """
+    
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.enabled = bool(path)
+        self.started = time.monotonic()
+        self.bytes_written: int = 0
+        self.frames: int = 0
+        self.truncated = False
+        self._file: Optional[TextIO] = None
+        # socket_id -> number in this recording, for open sockets
+        self._sockets: Dict[str, int] = {}
+        self._next_socket: int = 0
+    
+    def _open(self):
+        path = self.path
+        if settings.WORKERS > 1:
+            # One recording per worker process
+            path = f"{path}.{os.getpid()}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._file = open(path, "w", encoding="utf-8", buffering=1024 * 1024)
+        self.started = time.monotonic()
+        self._write_line(json.dumps({
+            "format": RECORDING_FORMAT,
+            "version": RECORDING_VERSION,
+            "started_at": datetime.utcnow().isoformat()
+        }))
+        print(f"Recording signaling traffic to {path}")
+    
+    def _write_line(self, line: str):
+        self._file.write(line)
+        self._file.write("\n")
+        self.bytes_written += len(line) + 1
+    
+    def _record(self, kind: str, socket_id: str, data: Optional[str]):
+        if self.truncated:
+            return
+        if self._file is None:
+            self._open()
+        
+        number = self._sockets.get(socket_id)
+        if number is None:
+            if kind != OPEN:
+                return
+            number = self._sockets[socket_id] = self._next_socket
+            self._next_socket += 1
+        elif kind == CLOSE:
+            # Recorded when the server notices the close; anything sent to
+            # the socket afterwards is dropped from the recording
+            del self._sockets[socket_id]
+        
+        elapsed_ms = round((time.monotonic() - self.started) * 1000, 1)
+        self._write_line(json.dumps([elapsed_ms, kind, number, data], separators=(",", ":"), ensure_ascii=False))
+        self.frames += 1
+        
+        if self.bytes_written >= settings.RECORD_MAX_BYTES:
+            self.truncated = True
+            self.flush()
+            print(f"Recording stopped at RECORD_MAX_BYTES ({settings.RECORD_MAX_BYTES} bytes)")
+    
+    def socket_opened(self, socket_id: str):
+        if self.enabled:
+            self._record(OPEN, socket_id, socket_id)
+    
+    def inbound(self, socket_id: str, text: str):
+        if self.enabled:
+            if len(text) > settings.WS_MAX_MESSAGE_BYTES:
+                # Replayed, the placeholder still draws exactly one error frame
+                text = f"<rejected frame of {len(text)} bytes>"
+            self._record(INBOUND, socket_id, text)
+    
+    def outbound(self, socket_id: str, text: str):
+        if self.enabled:
+            self._record(OUTBOUND, socket_id, text)
+    
+    def socket_closed(self, socket_id: str):
+        if self.enabled:
+            self._record(CLOSE, socket_id, None)
+    
+    def flush(self):
+        """Write buffered lines to disk."""
+        if self._file is not None:
+            self._file.flush()
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def get_stats(self) -> dict:
+        """Get recording progress."""
+        return {
+            "enabled": self.enabled,
+            "frames": self.frames,
+            "bytes": self.bytes_written,
+            "max_bytes": settings.RECORD_MAX_BYTES,
+            "truncated": self.truncated
+        }
+
+
+# Global recorder (enabled when RECORD_FILE is set)
+signaling_recorder = SignalingRecorder(settings.RECORD_FILE)
@@ -0,0 +1,193 @@
+"""Streaming cold-start loader for the rooms snapshot."""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Characters that can continue a JSON number
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+class _JSONStream:
+    """Reads JSON values one at a time from a file, a chunk at a time."""
+    
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    
+    def _fill(self) -> bool:
+        """Read the next chunk, dropping what has already been consumed."""
+        if self.eof:
+            return False
+        
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Next non-whitespace character, or '' at end of file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+    
+    def expect(self, char: str):
+        """Consume a structural character."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self.pos += 1
+    
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value is cut off at the end of the buffer
+                if not self._fill():
+                    raise
+                continue
+            
+            # A number followed only by number characters may be cut off
+            # mid-token ("1e" + "10"), so read on before trusting it
+            if isinstance(value, (int, float)):
+                tail = end
+                while tail < len(self.buf) and self.buf[tail] in NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buf) and self._fill():
+                    continue
+            
+            self.pos = end
+            return value
+
+
+def iter_snapshot_rooms(path: str, chunk_size: int = 65536) -> Iterator[Tuple[str, dict]]:
+    """Yield (room_code, room_data) pairs from a `{"rooms": {...}}` snapshot.
+    
+    Only one room is decoded at a time, so memory stays flat no matter how
+    large the snapshot is.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JSONStream(f, chunk_size)
+        stream.expect("{")
+        
+        while stream.peek() != "}":
+            key = stream.value()
+            stream.expect(":")
+            
+            if key != "rooms":
+                stream.value()
+            else:
+                stream.expect("{")
+                while stream.peek() != "}":
+                    room_code = stream.value()
+                    stream.expect(":")
+                    yield room_code, stream.value()
+                    if stream.peek() == ",":
+                        stream.expect(",")
+                stream.expect("}")
+            
+            if stream.peek() == ",":
+                stream.expect(",")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, if the platform reports it."""
+    if resource is None:
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    divisor = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class SnapshotLoader:
+    """Loads the snapshot into storage once at startup and gates readiness."""
+    
+    def __init__(self):
+        self.ready = False
+        self.stats: Dict[str, object] = {}
+    
+    def load(self, storage) -> dict:
+        """Stream the snapshot into `storage`, skipping expired rooms.
+        
+        Runs in a worker thread; the in-memory rooms and participant index
+        are built in the same single pass and installed at the end.
+        """
+        started = time.perf_counter()
+        if hasattr(storage, "map_snapshot"):
+            # Indexed storage: rooms are decoded on lookup, nothing to load
+            self.stats = {
+                "load_seconds": round(time.perf_counter() - started, 3),
+                **storage.map_snapshot(),
+                "peak_rss_mb": peak_rss_mb()
+            }
+            self.ready = True
+            return self.stats
+        
+        stamp = storage.file_stamp()
+        now = datetime.utcnow()
+        
+        rooms: Dict[str, dict] = {}
+        participant_index: Dict[str, str] = {}
+        skipped_expired = 0
+        skipped_invalid = 0
+        
+        try:
+            for room_code, room_data in iter_snapshot_rooms(str(storage.file_path)):
+                try:
+                    expires_at = datetime.fromisoformat(room_data["expires_at"])
+                except (KeyError, TypeError, ValueError):
+                    skipped_invalid += 1
+                    continue
+                
+                if expires_at <= now or room_data.get("state") == "expired":
+                    skipped_expired += 1
+                    continue
+                
+                rooms[room_code] = room_data
+                for socket_id in room_data.get("participants", {}):
+                    participant_index[socket_id] = room_code
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, ValueError) as e:
+            # Keep whatever was read before the damaged part
+            print(f"Error loading room snapshot after {len(rooms)} rooms: {e}")
+        
+        storage.install_snapshot({"rooms": rooms}, participant_index, stamp)
+        
+        self.stats = {
+            "load_seconds": round(time.perf_counter() - started, 3),
+            "rooms_loaded": len(rooms),
+            "rooms_skipped_expired": skipped_expired,
+            "rooms_skipped_invalid": skipped_invalid,
+            "peak_rss_mb": peak_rss_mb()
+        }
+        self.ready = True
+        return self.stats
+
+
+# Global snapshot loader
+snapshot_loader = SnapshotLoader()
@@ -2,8 +2,11 @@
 """
 WebRTC Video Conference Server - One-Click Starter
 Run this file to start everything: python start.py
+Production (no reload, tuned event loop and limits): python start.py --production
 """
 
+import argparse
+import importlib.util
 import sys
 import os
 import subprocess
@@ -21,8 +24,8 @@ def print_header():
 def check_python_version():
     """Check if Python version is compatible."""
     print("✓ Checking Python version...")
-    if sys.version_info < (3, 8):
-        print("❌ Error: Python 3.8 or higher is required")
+    if sys.version_info < (3, 9):
+        print("❌ Error: Python 3.9 or higher is required")
         print(f"   Current version: {sys.version}")
         sys.exit(1)
     print(f"  Python {sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}")
@@ -36,13 +39,15 @@ def check_dependencies():
         'uvicorn',
         'pydantic',
         'python-dotenv',
-        'websockets'
+        'websockets',
+        'httpx'
     ]
     
     missing = []
     for package in required_packages:
         try:
-            __import__(package.replace('-', '_'))
+            # python-dotenv is imported as dotenv
+            __import__('dotenv' if package == 'python-dotenv' else package.replace('-', '_'))
         except ImportError:
             missing.append(package)
     
@@ -159,14 +164,82 @@ def start_server():
         sys.exit(1)
 
 
+def module_available(name: str) -> bool:
+    """Check whether an optional module can be imported."""
+    return importlib.util.find_spec(name) is not None
+
+
+def production_options(workers=None, backlog=None) -> dict:
+    """Build uvicorn options for the production profile."""
+    from config import settings
+    
+    return {
+        "host": settings.HOST,
+        "port": settings.PORT,
+        "reload": False,
+        "loop": "uvloop" if module_available("uvloop") else "asyncio",
+        "http": "httptools" if module_available("httptools") else "h11",
+        "ws": "websockets",
+        "ws_ping_interval": settings.WS_PING_INTERVAL_SECONDS,
+        "ws_ping_timeout": settings.WS_PING_TIMEOUT_SECONDS,
+        "ws_max_size": settings.WS_MAX_MESSAGE_BYTES,
+        "workers": workers or settings.WORKERS,
+        "backlog": backlog or settings.BACKLOG,
+        "access_log": False,
+        "log_level": "info"
+    }
+
+
+def print_tuning(options: dict):
+    """Print the effective production tuning."""
+    print("\n✓ Production tuning:")
+    for key in ("loop", "http", "ws", "workers", "backlog",
+                "ws_ping_interval", "ws_ping_timeout", "ws_max_size", "reload", "access_log"):
+        print(f"  {key:<17} {options[key]}")
+    
+    if options["loop"] != "uvloop" or options["http"] != "httptools":
+        print("  ⚠️  uvloop/httptools not installed; using the pure-Python fallbacks")
+    if options["workers"] > 1:
+        # Sockets and room membership live in each worker's memory
+        print("  ⚠️  More than one worker: peers connected to different workers cannot signal each other")
+
+
+def start_production_server(args):
+    """Start uvicorn with the production profile (no reloader or file watcher)."""
+    import uvicorn
+    
+    options = production_options(args.workers, args.backlog)
+    print_tuning(options)
+    print(f"\n🚀 Listening on {options['host']}:{options['port']}\n")
+    uvicorn.run("main:app", **options)
+
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Start the WebRTC signaling server")
+    parser.add_argument("--production", action="store_true",
+                        help="Disable reload and use the tuned production profile")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: WORKERS setting)")
+    parser.add_argument("--backlog", type=int, help="Listen backlog (default: BACKLOG setting)")
+    return parser.parse_args()
+
+
 def main():
     """Main startup routine."""
+    args = parse_args()
+    
     # Change to script directory
     os.chdir(Path(__file__).parent)
     
     print_header()
     check_python_version()
     check_dependencies()
+    
+    if args.production:
+        create_directories()
+        start_production_server(args)
+        return
+    
     setup_environment()
     create_directories()
     check_static_files()
@@ -4,10 +4,21 @@ let localStream = null;
 let mySocketId = null;
 let currentRoomCode = null;
 let peerConnections = {}; // socket_id -> RTCPeerConnection
+let participantNames = {}; // socket_id -> display name
+let myDisplayName = 'Anonymous';
 let isVideoEnabled = true;
 let isAudioEnabled = true;
 let isAppVisible = true;
 let mediaTrackErrorRecovery = false;
+let roomTopology = { mode: 'mesh' }; // Which peers the server lets us negotiate with
+let speakingDetector = null;
+let rosterVersion = 0; // Last roster version applied, to detect missed presence updates
+let chatCursor = null; // Sequence number to page older chat history from
+let chatHistoryPending = false;
+let qualityReporter = null; // Interval sending connection quality to the server
+let bandwidthProfiles = null; // Server-advertised video encoding limits for publishers and viewers
+const joinToken = new URLSearchParams(window.location.search).get('token'); // Signed join token from the invite link
+const QUALITY_REPORT_INTERVAL_MS = 10000;
 
 // STUN/TURN configuration - optimized for cross-network connectivity
 const iceServers = {
@@ -86,6 +97,9 @@ const iceServers = {
 // Initialize WebSocket connection with reconnection logic
 let wsReconnectAttempts = 0;
 const maxReconnectAttempts = 5;
+let serverRetryAfterMs = 0; // Retry hint from the server when it is shedding load
+let drainReconnectAt = 0; // When to reconnect after the server announced a drain
+let rejoinOnOpen = false; // Rejoin the current room once a reconnect succeeds
 
 function initWebSocket() {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
@@ -98,6 +112,16 @@ function initWebSocket() {
             console.log('✅ WebSocket connected');
             wsReconnectAttempts = 0;
             updateStatus('connected', 'Connected to server');
+            
+            // If we were in a room, rejoin it on the new connection
+            if (rejoinOnOpen && currentRoomCode && localStream) {
+                console.log('🔄 Reconnecting to room:', currentRoomCode);
+                sendMessage({
+                    type: 'join_room',
+                    payload: joinRoomPayload(currentRoomCode, myDisplayName)
+                });
+            }
+            rejoinOnOpen = false;
         };
         
         ws.onmessage = async (event) => {
@@ -126,20 +150,16 @@ function initWebSocket() {
             if (wsReconnectAttempts < maxReconnectAttempts && event.code !== 1000) {
                 wsReconnectAttempts++;
                 console.log(`🔄 Attempting to reconnect... (${wsReconnectAttempts}/${maxReconnectAttempts})`);
+                // A draining server spreads clients out; keep our assigned slot
+                const reconnectDelay = Math.max(
+                    2000 * wsReconnectAttempts, serverRetryAfterMs, drainReconnectAt - Date.now()
+                );
+                serverRetryAfterMs = 0;
+                drainReconnectAt = 0;
                 setTimeout(() => {
+                    rejoinOnOpen = true;
                     initWebSocket();
-                    // If we were in a room, try to rejoin
-                    if (currentRoomCode && localStream) {
-                        console.log('🔄 Reconnecting to room:', currentRoomCode);
-                        sendMessage({
-                            type: 'join_room',
-                            payload: {
-                                room_code: currentRoomCode,
-                                display_name: myDisplayName
-                            }
-                        });
-                    }
-                }, 2000 * wsReconnectAttempts);
+                }, reconnectDelay);
             }
         };
     } catch (error) {
@@ -167,19 +187,50 @@ async function handleMessage(message) {
             break;
         
         case 'peer_joined':
+            noteRosterVersion(message.payload.roster_version);
+            applyBandwidthProfiles(message.payload.bandwidth);
             await handlePeerJoined(message.payload);
             break;
         
         case 'peer_left':
+            noteRosterVersion(message.payload.roster_version);
+            applyBandwidthProfiles(message.payload.bandwidth);
             handlePeerLeft(message.payload);
             break;
         
+        case 'roster_delta':
+            handleRosterDelta(message.payload);
+            break;
+        
+        case 'roster_snapshot':
+            handleRosterSnapshot(message.payload);
+            break;
+        
+        case 'topology_update':
+            handleTopologyUpdate(message.payload);
+            break;
+        
         case 'signal':
             await handleSignal(message.payload);
             break;
         
         case 'chat_message':
-            addChatMessage(message.payload, false);
+            // Our own messages were already rendered when sent
+            if (message.payload.senderId !== mySocketId) {
+                addChatMessage(message.payload, false);
+            }
+            break;
+        
+        case 'chat_history':
+            handleChatHistory(message.payload);
+            break;
+        
+        case 'announcement':
+            showAnnouncement(message.payload);
+            break;
+        
+        case 'reconnect':
+            handleReconnectHint(message.payload);
             break;
         
         case 'error':
@@ -229,13 +280,29 @@ async function joinRoom() {
     await startLocalStream();
     sendMessage({
         type: 'join_room',
-        payload: {
-            room_code: roomCode,
-            display_name: displayName
-        }
+        payload: joinRoomPayload(roomCode, displayName)
     });
 }
 
+// join_room payload, carrying the invite link's token when it is for this room
+function joinRoomPayload(roomCode, displayName) {
+    const payload = {
+        room_code: roomCode,
+        display_name: displayName
+    };
+    if (joinToken) {
+        try {
+            const body = joinToken.split('.')[1].replace(/-/g, '+').replace(/_/g, '/');
+            if (JSON.parse(atob(body)).r === roomCode) {
+                payload.join_token = joinToken;
+            }
+        } catch (e) {
+            console.warn('Ignoring malformed join token');
+        }
+    }
+    return payload;
+}
+
 // Start local media stream
 async function startLocalStream() {
     try {
@@ -339,6 +406,12 @@ function handleRoomCreated(payload) {
         roomCodeBadge.textContent = payload.room_code;
     }
     
+    roomTopology = payload.topology || { mode: 'mesh' };
+    rosterVersion = payload.roster_version || 0;
+    applyBandwidthProfiles(payload.bandwidth);
+    startSpeakingDetector();
+    startQualityReporter();
+    
     // Update participants list
     updateParticipantsList();
     
@@ -356,13 +429,31 @@ async function handleJoined(payload) {
         roomCodeBadge.textContent = payload.room_code;
     }
     
-    // Store participant names and create peer connections for existing peers
+    roomTopology = payload.topology || { mode: 'mesh' };
+    rosterVersion = payload.roster_version || 0;
+    applyBandwidthProfiles(payload.bandwidth);
+    console.log('🕸️ Room topology:', roomTopology.mode);
+    
+    // Store names for everyone in the room
+    for (const participant of (payload.participants || payload.peers)) {
+        participantNames[participant.socket_id] = participant.display_name || 'Anonymous';
+        console.log(`📝 Stored name: ${participant.display_name} for ${participant.socket_id.substring(0,8)}`);
+    }
+    
+    // Only negotiate with the peers the topology offers us
     for (const peer of payload.peers) {
-        participantNames[peer.socket_id] = peer.display_name || 'Anonymous';
-        console.log(`📝 Stored name: ${peer.display_name} for ${peer.socket_id.substring(0,8)}`);
         await createPeerConnection(peer.socket_id, true);
     }
     
+    startSpeakingDetector();
+    startQualityReporter();
+    
+    // Catch up on chat sent before we joined
+    chatCursor = payload.chat_cursor || null;
+    for (const chat of (payload.chat_history || [])) {
+        addChatMessage(chat, chat.senderId === mySocketId);
+    }
+    
     // Update participants list
     updateParticipantsList();
 }
@@ -398,6 +489,254 @@ function handlePeerLeft(payload) {
     updateParticipantsList();
 }
 
+// Track roster versions from immediate presence updates; a jump means we missed one
+function noteRosterVersion(version) {
+    if (version === undefined) return;
+    
+    if (version > rosterVersion + 1) {
+        requestRosterSnapshot();
+    }
+    rosterVersion = Math.max(rosterVersion, version);
+}
+
+function requestRosterSnapshot() {
+    console.log(`🔁 Roster version gap at ${rosterVersion}, requesting snapshot`);
+    sendMessage({ type: 'roster_snapshot', payload: {} });
+}
+
+// Handle a batch of membership changes (coalesced presence mode)
+function handleRosterDelta(payload) {
+    // Already reflected (e.g. covered by our own joined snapshot)
+    if (payload.version <= rosterVersion) return;
+    
+    // Missed an earlier delta - resync from a full snapshot
+    if (payload.from_version > rosterVersion) {
+        requestRosterSnapshot();
+        return;
+    }
+    
+    for (const socketId of payload.removed) {
+        if (socketId !== mySocketId) {
+            handlePeerLeft({ socket_id: socketId });
+        }
+    }
+    for (const participant of payload.added) {
+        if (participant.socket_id !== mySocketId) {
+            participantNames[participant.socket_id] = participant.display_name || 'Anonymous';
+        }
+    }
+    
+    rosterVersion = payload.version;
+    applyBandwidthProfiles(payload.bandwidth);
+    updateParticipantsList();
+}
+
+// Replace the roster with a full snapshot from the server
+function handleRosterSnapshot(payload) {
+    const present = new Set(payload.participants.map(p => p.socket_id));
+    
+    for (const socketId of Object.keys(participantNames)) {
+        if (!present.has(socketId)) {
+            handlePeerLeft({ socket_id: socketId });
+        }
+    }
+    for (const participant of payload.participants) {
+        if (participant.socket_id !== mySocketId) {
+            participantNames[participant.socket_id] = participant.display_name || 'Anonymous';
+        }
+    }
+    
+    rosterVersion = payload.version;
+    updateParticipantsList();
+}
+
+// Handle topology changes (e.g. new active speakers in a grid-limited room)
+function handleTopologyUpdate(payload) {
+    roomTopology = payload;
+    // Promotion or demotion switches between the publisher and viewer profiles
+    applyBandwidthProfiles(bandwidthProfiles);
+    if (!payload.publishers) return;
+    
+    const publishers = new Set(payload.publishers);
+    const iAmPublisher = publishers.has(mySocketId);
+    
+    // Close connections the topology no longer allows
+    for (const peerId of Object.keys(peerConnections)) {
+        if (!iAmPublisher && !publishers.has(peerId)) {
+            console.log(`✂️ Topology drop: closing connection to ${peerId.substring(0,8)}`);
+            peerConnections[peerId].close();
+            delete peerConnections[peerId];
+            removeVideoElement(peerId);
+        }
+    }
+    
+    // Connect to newly promoted publishers
+    for (const peerId of Object.keys(participantNames)) {
+        if (peerConnections[peerId]) continue;
+        
+        const peerIsPublisher = publishers.has(peerId);
+        if (!iAmPublisher && !peerIsPublisher) continue;
+        
+        // The non-publisher side offers; between two publishers the lower socket id does
+        const initiate = (iAmPublisher && peerIsPublisher) ? mySocketId < peerId : !iAmPublisher;
+        if (initiate) {
+            createPeerConnection(peerId, true);
+        }
+    }
+    
+    updateParticipantsList();
+}
+
+// Report speaking activity so grid-limited rooms can follow the conversation
+function startSpeakingDetector() {
+    if (speakingDetector || roomTopology.mode !== 'grid-limited' || !localStream) return;
+    
+    const AudioCtx = window.AudioContext || window.webkitAudioContext;
+    if (!AudioCtx || localStream.getAudioTracks().length === 0) return;
+    
+    const audioContext = new AudioCtx();
+    const analyser = audioContext.createAnalyser();
+    analyser.fftSize = 512;
+    audioContext.createMediaStreamSource(localStream).connect(analyser);
+    
+    const samples = new Uint8Array(analyser.fftSize);
+    let lastReportedAt = 0;
+    
+    const interval = setInterval(() => {
+        if (!isAudioEnabled) return;
+        
+        analyser.getByteTimeDomainData(samples);
+        let sumSquares = 0;
+        for (const sample of samples) {
+            const centered = (sample - 128) / 128;
+            sumSquares += centered * centered;
+        }
+        const rms = Math.sqrt(sumSquares / samples.length);
+        
+        const now = Date.now();
+        if (rms > 0.05 && now - lastReportedAt > 2000) {
+            lastReportedAt = now;
+            sendMessage({ type: 'speaking', payload: {} });
+        }
+    }, 250);
+    
+    speakingDetector = { audioContext, interval };
+}
+
+function stopSpeakingDetector() {
+    if (!speakingDetector) return;
+    clearInterval(speakingDetector.interval);
+    speakingDetector.audioContext.close();
+    speakingDetector = null;
+}
+
+// Periodically send a compact quality sample per peer connection
+function startQualityReporter() {
+    if (qualityReporter) return;
+    qualityReporter = setInterval(() => {
+        for (const [peerId, pc] of Object.entries(peerConnections)) {
+            if (pc.connectionState === 'connected') {
+                reportConnectionQuality(peerId, pc);
+            }
+        }
+    }, QUALITY_REPORT_INTERVAL_MS);
+}
+
+function stopQualityReporter() {
+    clearInterval(qualityReporter);
+    qualityReporter = null;
+}
+
+// Remember the server's latest profiles and apply ours to every connection
+function applyBandwidthProfiles(profiles) {
+    if (!profiles) return;
+    bandwidthProfiles = profiles;
+    for (const pc of Object.values(peerConnections)) {
+        applyBandwidthProfile(pc);
+    }
+}
+
+function currentBandwidthProfile() {
+    if (!bandwidthProfiles) return null;
+    const publishers = roomTopology.publishers;
+    const iAmPublisher = !publishers || publishers.includes(mySocketId);
+    return iAmPublisher ? bandwidthProfiles.publisher : bandwidthProfiles.viewer;
+}
+
+// Cap one connection's video encoder; retried once the connection is up if not negotiated yet
+async function applyBandwidthProfile(pc) {
+    const profile = currentBandwidthProfile();
+    const sender = pc.getSenders().find(s => s.track && s.track.kind === 'video');
+    if (!profile || !sender) return;
+    
+    const params = sender.getParameters();
+    if (!params.encodings || params.encodings.length === 0) return;
+    
+    const trackHeight = sender.track.getSettings().height || profile.max_height;
+    const maxBitrate = profile.max_bitrate_kbps * 1000;
+    const scale = Math.max(1, trackHeight / profile.max_height);
+    const encoding = params.encodings[0];
+    if (encoding.maxBitrate === maxBitrate && encoding.maxFramerate === profile.max_framerate
+        && encoding.scaleResolutionDownBy === scale) return;
+    
+    encoding.maxBitrate = maxBitrate;
+    encoding.maxFramerate = profile.max_framerate;
+    encoding.scaleResolutionDownBy = scale;
+    try {
+        await sender.setParameters(params);
+        console.log(`📶 Video capped at ${profile.max_bitrate_kbps} kbps, ${profile.max_height}p${profile.max_framerate} (${profile.streams} streams)`);
+    } catch (error) {
+        console.warn('Could not apply bandwidth profile:', error);
+    }
+}
+
+async function reportConnectionQuality(peerId, pc) {
+    const stats = await pc.getStats();
+    let pair = null;
+    let bytesReceived = 0;
+    let packetsReceived = 0;
+    let packetsLost = 0;
+    
+    stats.forEach(report => {
+        if (report.type === 'transport' && report.selectedCandidatePairId) {
+            pair = stats.get(report.selectedCandidatePairId);
+        } else if (!pair && report.type === 'candidate-pair' && report.nominated && report.state === 'succeeded') {
+            pair = report;
+        } else if (report.type === 'inbound-rtp') {
+            bytesReceived += report.bytesReceived || 0;
+            packetsReceived += report.packetsReceived || 0;
+            packetsLost += Math.max(0, report.packetsLost || 0);
+        }
+    });
+    
+    // Loss and bitrate over the interval since the previous sample
+    const now = performance.now();
+    const prev = pc.qualityPrev;
+    pc.qualityPrev = { at: now, bytesReceived, packetsReceived, packetsLost };
+    
+    const payload = { peer: peerId };
+    if (pair && pair.currentRoundTripTime !== undefined) {
+        payload.rtt_ms = Math.round(pair.currentRoundTripTime * 1000);
+    }
+    if (pair) {
+        const local = stats.get(pair.localCandidateId);
+        payload.relay = !!local && local.candidateType === 'relay';
+    }
+    if (prev) {
+        const lost = Math.max(0, packetsLost - prev.packetsLost);
+        const total = lost + Math.max(0, packetsReceived - prev.packetsReceived);
+        if (total > 0) {
+            payload.packet_loss_pct = Math.round(lost / total * 10000) / 100;
+        }
+        const seconds = (now - prev.at) / 1000;
+        if (seconds > 0) {
+            payload.bitrate_kbps = Math.max(0, Math.round((bytesReceived - prev.bytesReceived) * 8 / 1000 / seconds));
+        }
+    }
+    
+    sendMessage({ type: 'stats_report', payload });
+}
+
 // Create peer connection
 async function createPeerConnection(peerId, createOffer) {
     console.log(`\n🔧 Creating peer connection with ${peerId.substring(0,8)}, initiating offer: ${createOffer}`);
@@ -521,6 +860,12 @@ async function createPeerConnection(peerId, createOffer) {
         
         if (pc.connectionState === 'connected') {
             console.log('✅ Successfully connected to peer!');
+            // Lets the server measure time-to-connect (reported once per connection)
+            if (!pc.setupReported) {
+                pc.setupReported = true;
+                sendMessage({ type: 'peer_connected', payload: { peer: peerId } });
+            }
+            applyBandwidthProfile(pc);
             statusMsg.textContent = `✅ Connected to ${peerId.substring(0,8)}`;
             statusMsg.style.background = 'rgba(16, 185, 129, 0.9)';
         } else if (pc.connectionState === 'connecting') {
@@ -864,6 +1209,12 @@ function leaveRoom() {
     Object.values(peerConnections).forEach(pc => pc.close());
     peerConnections = {};
     
+    stopSpeakingDetector();
+    stopQualityReporter();
+    roomTopology = { mode: 'mesh' };
+    rosterVersion = 0;
+    bandwidthProfiles = null;
+    
     // Stop local stream
     if (localStream) {
         localStream.getTracks().forEach(track => track.stop());
@@ -908,12 +1259,66 @@ function updateStatus(type, message) {
     statusEl.textContent = message;
 }
 
+// Show a server-wide announcement (e.g. maintenance notice)
+function showAnnouncement(payload) {
+    console.log(`📢 Announcement (${payload.level}):`, payload.message);
+    
+    const colors = {
+        info: 'rgba(59,130,246,0.95)',
+        warning: 'rgba(234,179,8,0.95)',
+        critical: 'rgba(239,68,68,0.95)'
+    };
+    
+    const banner = document.createElement('div');
+    banner.style.cssText = 'position:fixed;top:10px;left:50%;transform:translateX(-50%);color:white;padding:12px 24px;border-radius:12px;font-weight:600;z-index:10000;box-shadow:0 4px 12px rgba(0,0,0,0.3);max-width:90%;text-align:center;';
+    banner.style.background = colors[payload.level] || colors.info;
+    banner.textContent = `📢 ${payload.message}`;
+    document.body.appendChild(banner);
+    setTimeout(() => banner.remove(), payload.level === 'critical' ? 30000 : 10000);
+}
+
+// Handle server load shedding: back off and retry the join
+// Server is draining for a deploy: move to a new instance at our assigned time
+function handleReconnectHint(payload) {
+    const delayMs = payload.delay_ms || 0;
+    drainReconnectAt = Date.now() + delayMs;
+    console.log(`🔁 Server draining, reconnecting in ${Math.round(delayMs / 1000)}s`);
+    
+    setTimeout(() => {
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            // 4000: application-initiated close, handled as a reconnect by onclose
+            ws.close(4000, 'Server draining');
+        }
+    }, delayMs);
+}
+
+function handleServerBusy(payload) {
+    serverRetryAfterMs = (payload.retry_after || 5) * 1000;
+    console.warn(`⏳ Server busy, retrying in ${serverRetryAfterMs / 1000}s`);
+    updateStatus('error', `Server busy, retrying in ${serverRetryAfterMs / 1000}s`);
+    
+    setTimeout(() => {
+        if (currentRoomCode && ws && ws.readyState === WebSocket.OPEN) {
+            sendMessage({
+                type: 'join_room',
+                payload: joinRoomPayload(currentRoomCode, myDisplayName)
+            });
+        }
+    }, serverRetryAfterMs);
+}
+
 // Handle errors
 function handleError(payload) {
+    if (payload.code === 'SERVER_BUSY') {
+        handleServerBusy(payload);
+        return;
+    }
+    
     console.error('Server error:', payload);
     alert(`Error: ${payload.message}`);
     
-    if (payload.code === 'ROOM_NOT_FOUND' || payload.code === 'ROOM_EXPIRED' || payload.code === 'ROOM_CLOSED') {
+    const fatal = ['ROOM_NOT_FOUND', 'ROOM_EXPIRED', 'ROOM_CLOSED', 'INVALID_JOIN_TOKEN', 'JOIN_TOKEN_EXPIRED', 'JOIN_TOKEN_REQUIRED'];
+    if (fatal.includes(payload.code)) {
         leaveRoom();
     }
 }
@@ -932,6 +1337,16 @@ window.addEventListener('load', () => {
         }
     }, 100);
     
+    // Page in older chat history when scrolled to the top
+    const chatMessages = document.getElementById('chatMessages');
+    if (chatMessages) {
+        chatMessages.addEventListener('scroll', () => {
+            if (chatMessages.scrollTop === 0) {
+                requestOlderChat();
+            }
+        });
+    }
+    
     // Add diagnostic button (only visible in console)
     window.diagnoseConnection = () => {
         console.log('\n=== WEBRTC DIAGNOSTICS ===\n');
@@ -1027,6 +1442,8 @@ async function shareScreen() {
             const sender = pc.getSenders().find(s => s.track && s.track.kind === 'video');
             if (sender) {
                 await sender.replaceTrack(screenTrack);
+                // Screen resolution differs from the camera's: recompute the downscale
+                await applyBandwidthProfile(pc);
                 console.log(`✅ Replaced video track for ${peerId.substring(0,8)}`);
             }
         }
@@ -1079,7 +1496,7 @@ function stopScreenShare() {
             const pc = peerConnections[peerId];
             const sender = pc.getSenders().find(s => s.track && s.track.kind === 'video');
             if (sender) {
-                sender.replaceTrack(originalVideoTrack);
+                sender.replaceTrack(originalVideoTrack).then(() => applyBandwidthProfile(pc));
             }
         }
         
@@ -1136,7 +1553,27 @@ function sendChatMessage() {
     input.value = '';
 }
 
-function addChatMessage(data, isOwn = false) {
+// Request older chat history when scrolled to the top
+function requestOlderChat() {
+    if (!chatCursor || chatHistoryPending) return;
+    chatHistoryPending = true;
+    sendMessage({
+        type: 'chat_history',
+        payload: { before: chatCursor, limit: 50 }
+    });
+}
+
+function handleChatHistory(payload) {
+    chatHistoryPending = false;
+    chatCursor = payload.cursor || null;
+    
+    // Prepend newest-first so the page ends up in chronological order
+    for (const chat of payload.messages.slice().reverse()) {
+        addChatMessage(chat, chat.senderId === mySocketId, true);
+    }
+}
+
+function addChatMessage(data, isOwn = false, prepend = false) {
     const messagesContainer = document.getElementById('chatMessages');
     
     // Remove empty state if exists
@@ -1151,11 +1588,16 @@ function addChatMessage(data, isOwn = false) {
     const time = new Date(data.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
     
     messageDiv.innerHTML = `
-        ${!isOwn ? `<div class="chat-sender">${data.sender}</div>` : ''}
+        ${!isOwn ? `<div class="chat-sender">${escapeHtml(data.sender)}</div>` : ''}
         <div class="chat-bubble">${escapeHtml(data.message)}</div>
         <div class="chat-time">${time}</div>
     `;
     
+    if (prepend) {
+        messagesContainer.insertBefore(messageDiv, messagesContainer.firstChild);
+        return;
+    }
+    
     messagesContainer.appendChild(messageDiv);
     messagesContainer.scrollTop = messagesContainer.scrollHeight;
     
@@ -0,0 +1,184 @@
+"""Static client assets, precompressed and served under content-hashed URLs."""
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Tuple
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import PlainTextResponse
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+# Hashed URLs never change content; everything else is revalidated by ETag
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 1024
+
+# Preferred first
+ENCODINGS = ("br", "gzip", "identity")
+
+STATIC_URL = re.compile(r"/static/([\w./-]+)")
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class StaticAsset:
+    """One file's bytes in every encoding worth serving."""
+    
+    def __init__(self, body: bytes, content_type: str):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants: Dict[str, bytes] = {"identity": body}
+        
+        if len(body) < MIN_COMPRESS_BYTES or not content_type.startswith(COMPRESSIBLE):
+            return
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            self.variants["gzip"] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            if len(compressed) < len(body):
+                self.variants["br"] = compressed
+    
+    def etag(self, encoding: str) -> str:
+        # Each encoding is a different representation, so it gets its own tag
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+    
+    def matches(self, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names any encoding of this asset."""
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.digest:
+                return True
+        return False
+
+
+class StaticAssets:
+    """Serves the static client from memory.
+    
+    At startup every file is read once and compressed with gzip (and
+    brotli when installed). Non-HTML files are also published under a
+    content-hashed name (`webrtc-client.<hash>.js`) with an immutable cache
+    header; HTML pages are rewritten to reference those names and are
+    revalidated by ETag, so a deploy reaches clients on their next page load
+    while unchanged assets are never downloaded twice.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        # URL path under /static/ -> (asset, Cache-Control)
+        self.routes: Dict[str, Tuple[StaticAsset, str]] = {}
+        # original name -> content-hashed name
+        self.hashed_names: Dict[str, str] = {}
+        self.responses: Dict[str, int] = {encoding: 0 for encoding in ENCODINGS}
+        self.bytes_sent: Dict[str, int] = {encoding: 0 for encoding in ENCODINGS}
+        self.not_modified: int = 0
+    
+    def build(self) -> int:
+        """Load, fingerprint and compress every file. Returns the number of files."""
+        files = sorted(path for path in self.directory.rglob("*") if path.is_file())
+        pages = []
+        
+        for path in files:
+            name = path.relative_to(self.directory).as_posix()
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type == "text/html":
+                pages.append((name, path))
+                continue
+            
+            asset = StaticAsset(path.read_bytes(), content_type)
+            hashed = path.with_name(f"{path.stem}.{asset.digest[:12]}{path.suffix}")
+            hashed_name = hashed.relative_to(self.directory).as_posix()
+            self.hashed_names[name] = hashed_name
+            self.routes[name] = (asset, REVALIDATE)
+            self.routes[hashed_name] = (asset, IMMUTABLE)
+        
+        for name, path in pages:
+            html = STATIC_URL.sub(self._hashed_url, path.read_text(encoding="utf-8"))
+            asset = StaticAsset(html.encode("utf-8"), "text/html; charset=utf-8")
+            self.routes[name] = (asset, REVALIDATE)
+            if path.name == "index.html":
+                directory = path.parent.relative_to(self.directory).as_posix()
+                self.routes["" if directory == "." else f"{directory}/"] = (asset, REVALIDATE)
+        
+        return len(files)
+    
+    def _hashed_url(self, match: re.Match) -> str:
+        return f"/static/{self.hashed_names.get(match.group(1), match.group(1))}"
+    
+    def response(self, path: str, request: Request) -> Response:
+        """Serve a file, negotiating the encoding and honouring If-None-Match."""
+        entry = self.routes.get(path)
+        if entry is None:
+            return PlainTextResponse("Not Found", status_code=404)
+        asset, cache_control = entry
+        
+        accepted = parse_accept_encoding(request.headers.get("accept-encoding", ""))
+        encoding = next(
+            e for e in ENCODINGS
+            if e in asset.variants and (e == "identity" or accepted.get(e, accepted.get("*", 0)) > 0)
+        )
+        headers = {"ETag": asset.etag(encoding), "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and asset.matches(if_none_match):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        
+        body = asset.variants[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        self.responses[encoding] += 1
+        self.bytes_sent[encoding] += len(body)
+        return Response(body, media_type=asset.content_type, headers=headers)
+    
+    def get_stats(self) -> dict:
+        """Get asset and transfer statistics."""
+        return {
+            "files": len({id(asset) for asset, _ in self.routes.values()}),
+            "hashed_urls": self.hashed_names,
+            "brotli": brotli is not None,
+            "responses": self.responses,
+            "bytes_sent": self.bytes_sent,
+            "not_modified": self.not_modified
+        }
+
+
+# Global static assets (built at startup by main.py)
+static_assets = StaticAssets("static")
+
+router = APIRouter(include_in_schema=False)
+
+
+@router.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_file(path: str, request: Request):
+    """Serve the static test client."""
+    return static_assets.response(path, request)
@@ -1,19 +1,45 @@
 """JSON file-based storage with thread-safe operations."""
 import json
+import os
 import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, Iterator, List, Set, Tuple
 from datetime import datetime
 from models import Room, Participant
 from config import settings
 
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single worker only
+    fcntl = None
+
+
+# Conflict policies for bulk imports
+IMPORT_POLICIES = ("skip", "overwrite", "merge")
+
 
 class JSONStorage:
-    """Thread-safe JSON file storage for rooms."""
+    """Thread-safe JSON file storage for rooms.
+    
+    The decoded file is kept in memory and only re-read when the file's
+    stamp (mtime, size, inode) changes, e.g. when another worker wrote it.
+    
+    Every change is a read-modify-write done under `_exclusive()`: the
+    in-process lock plus, where fcntl is available, an flock on a sidecar
+    lock file, so neither threads nor other workers can interleave with it
+    and lose an update.
+    """
     
     def __init__(self, file_path: str):
         self.file_path = Path(file_path)
-        self.lock = threading.Lock()
+        # Re-entrant: a read-modify-write holds it across _read_data/_write_data
+        self.lock = threading.RLock()
+        self._lock_file = None
+        self._data: Optional[dict] = None
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        # socket_id -> room_code
+        self._participant_index: Dict[str, str] = {}
         self._ensure_file_exists()
     
     def _ensure_file_exists(self):
@@ -22,43 +48,111 @@ class JSONStorage:
             self.file_path.parent.mkdir(parents=True, exist_ok=True)
             self._write_data({"rooms": {}})
     
+    @contextmanager
+    def _exclusive(self):
+        """Hold the storage lock, across processes when possible."""
+        with self.lock:
+            if fcntl is None or not settings.STORAGE_FILE_LOCK:
+                yield
+                return
+            
+            if self._lock_file is None:
+                self._lock_file = open(self.file_path.with_suffix(self.file_path.suffix + ".lock"), "a")
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """Identify the current file version without reading it."""
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    
+    def _rebuild_participant_index(self):
+        """Rebuild the socket_id -> room_code index from the cached data."""
+        self._participant_index = {
+            socket_id: room_code
+            for room_code, room_data in self._data["rooms"].items()
+            for socket_id in room_data.get("participants", {})
+        }
+    
+    def install_snapshot(self, data: dict, participant_index: Dict[str, str], stamp):
+        """Install data loaded by the snapshot loader as the in-memory copy."""
+        with self.lock:
+            # Only if nothing was written since loading started
+            if self._data is None or self._stamp == stamp:
+                self._data = data
+                self._participant_index = participant_index
+                self._stamp = stamp
+    
     def _read_data(self) -> dict:
-        """Read data from JSON file."""
+        """Read data, from memory unless the file changed underneath us."""
         with self.lock:
+            stamp = self.file_stamp()
+            if self._data is not None and stamp == self._stamp:
+                return self._data
+            
             try:
                 with open(self.file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    self._data = json.load(f)
             except (json.JSONDecodeError, FileNotFoundError):
-                return {"rooms": {}}
+                self._data = {"rooms": {}}
+            
+            self._stamp = stamp
+            self._rebuild_participant_index()
+            return self._data
+    
+    def _read_for_update(self) -> dict:
+        """A copy of the data to change and pass to _write_data.
+        
+        The cached dict is never changed in place, so readers iterating it
+        without the lock (e.g. while an import runs in a thread) are safe.
+        """
+        data = self._read_data()
+        return {**data, "rooms": dict(data["rooms"])}
     
     def _write_data(self, data: dict):
-        """Write data to JSON file."""
+        """Write data to JSON file atomically and swap it in as the in-memory copy."""
         with self.lock:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
+            tmp_path = self.file_path.with_suffix(self.file_path.suffix + ".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, default=str)
+            # Readers (including other workers) never see a half-written file
+            os.replace(tmp_path, self.file_path)
+            
+            self._data = data
+            self._stamp = self.file_stamp()
+            self._rebuild_participant_index()
     
-    def save_room(self, room: Room) -> bool:
-        """Save or update a room."""
-        data = self._read_data()
-        data["rooms"][room.room_code] = room.model_dump(mode='json')
-        self._write_data(data)
-        return True
+    def flush(self):
+        """Force the data file to disk (every change is already written to it)."""
+        with self.lock:
+            try:
+                with open(self.file_path, 'rb') as f:
+                    os.fsync(f.fileno())
+            except FileNotFoundError:
+                pass
     
-    def get_room(self, room_code: str) -> Optional[Room]:
-        """Get a room by code."""
-        data = self._read_data()
-        room_data = data["rooms"].get(room_code)
-        
-        if not room_data:
-            return None
+    @staticmethod
+    def _decode_room(room_data: dict) -> Room:
+        """Build a Room from its stored form without mutating the stored dict."""
+        room_data = dict(room_data)
         
         # Convert datetime strings back to datetime objects
         room_data["created_at"] = datetime.fromisoformat(room_data["created_at"])
         room_data["expires_at"] = datetime.fromisoformat(room_data["expires_at"])
+        for key in ("last_active_at", "emptied_at"):
+            if room_data.get(key):
+                room_data[key] = datetime.fromisoformat(room_data[key])
         
         # Convert participants
         participants = {}
         for socket_id, p_data in room_data.get("participants", {}).items():
+            p_data = dict(p_data)
             p_data["joined_at"] = datetime.fromisoformat(p_data["joined_at"])
             p_data["last_seen"] = datetime.fromisoformat(p_data["last_seen"])
             participants[socket_id] = Participant(**p_data)
@@ -66,15 +160,98 @@ class JSONStorage:
         room_data["participants"] = participants
         return Room(**room_data)
     
+    def save_room(self, room: Room) -> bool:
+        """Save or update a room, bumping its version."""
+        with self._exclusive():
+            data = self._read_for_update()
+            stored = data["rooms"].get(room.room_code)
+            # Never reuse a version, even when saving a stale copy
+            room.version = max(room.version, stored.get("version", 0) if stored else 0) + 1
+            data["rooms"][room.room_code] = room.model_dump(mode='json')
+            self._write_data(data)
+        return True
+    
+    def mutate_room(self, room_code: str, mutate: Callable[[Room], bool]) -> Tuple[Optional[Room], bool]:
+        """Atomically apply `mutate` to the stored room and save it if it returns True.
+        
+        The room is read, changed and written under the exclusive lock, so
+        concurrent changes (other threads or workers) are never lost.
+        Returns (room, changed); room is None if it doesn't exist.
+        """
+        with self._exclusive():
+            room_data = self._read_data()["rooms"].get(room_code)
+            if not room_data:
+                return None, False
+            
+            room = self._decode_room(room_data)
+            if not mutate(room):
+                return room, False
+            
+            # Copy only once there is something to write (refused joins are common)
+            data = self._read_for_update()
+            room.version = room_data.get("version", 0) + 1
+            data["rooms"][room_code] = room.model_dump(mode='json')
+            self._write_data(data)
+            return room, True
+    
+    def get_room(self, room_code: str) -> Optional[Room]:
+        """Get a room by code."""
+        data = self._read_data()
+        room_data = data["rooms"].get(room_code)
+        
+        if not room_data:
+            return None
+        
+        return self._decode_room(room_data)
+    
+    def get_room_version(self, room_code: str) -> Optional[Tuple[int, datetime]]:
+        """Get (version, expires_at) of a room without decoding it."""
+        room_data = self._read_data()["rooms"].get(room_code)
+        if not room_data:
+            return None
+        return room_data.get("version", 0), datetime.fromisoformat(room_data["expires_at"])
+    
+    def data_version(self) -> str:
+        """Opaque version of the whole data set; changes on every write."""
+        stamp = self.file_stamp()
+        return "-".join(f"{part:x}" for part in stamp) if stamp else "0"
+    
     def delete_room(self, room_code: str) -> bool:
         """Delete a room."""
-        data = self._read_data()
-        if room_code in data["rooms"]:
-            del data["rooms"][room_code]
-            self._write_data(data)
-            return True
+        with self._exclusive():
+            data = self._read_for_update()
+            if room_code in data["rooms"]:
+                del data["rooms"][room_code]
+                self._write_data(data)
+                return True
         return False
     
+    def delete_rooms(self, room_codes: List[str], only_empty: bool = False) -> List[str]:
+        """Delete several rooms with a single write. Returns the codes deleted.
+        
+        With only_empty, rooms that have participants again are kept.
+        """
+        with self._exclusive():
+            data = self._read_for_update()
+            deleted = []
+            for code in room_codes:
+                room_data = data["rooms"].get(code)
+                if room_data is None or (only_empty and room_data.get("participants")):
+                    continue
+                del data["rooms"][code]
+                deleted.append(code)
+            if deleted:
+                self._write_data(data)
+        return deleted
+    
+    def count_rooms(self) -> int:
+        """Number of stored rooms."""
+        return len(self._read_data()["rooms"])
+    
+    def room_codes(self) -> Set[str]:
+        """Codes of all stored rooms, without decoding them."""
+        return set(self._read_data()["rooms"])
+    
     def get_all_rooms(self) -> List[Room]:
         """Get all rooms."""
         data = self._read_data()
@@ -82,44 +259,106 @@ class JSONStorage:
         
         for room_data in data["rooms"].values():
             try:
-                room_data["created_at"] = datetime.fromisoformat(room_data["created_at"])
-                room_data["expires_at"] = datetime.fromisoformat(room_data["expires_at"])
-                
-                participants = {}
-                for socket_id, p_data in room_data.get("participants", {}).items():
-                    p_data["joined_at"] = datetime.fromisoformat(p_data["joined_at"])
-                    p_data["last_seen"] = datetime.fromisoformat(p_data["last_seen"])
-                    participants[socket_id] = Participant(**p_data)
-                
-                room_data["participants"] = participants
-                rooms.append(Room(**room_data))
+                rooms.append(self._decode_room(room_data))
             except Exception as e:
                 print(f"Error loading room: {e}")
                 continue
         
         return rooms
     
-    def cleanup_expired_rooms(self) -> int:
-        """Remove expired rooms. Returns count of removed rooms."""
-        data = self._read_data()
-        rooms_to_delete = []
-        
-        for room_code, room_data in data["rooms"].items():
-            try:
-                expires_at = datetime.fromisoformat(room_data["expires_at"])
-                if datetime.utcnow() >= expires_at:
+    def cleanup_expired_rooms(self) -> List[str]:
+        """Remove expired rooms. Returns codes of removed rooms."""
+        with self._exclusive():
+            data = self._read_for_update()
+            rooms_to_delete = []
+            
+            for room_code, room_data in data["rooms"].items():
+                try:
+                    expires_at = datetime.fromisoformat(room_data["expires_at"])
+                    if datetime.utcnow() >= expires_at:
+                        rooms_to_delete.append(room_code)
+                except Exception:
                     rooms_to_delete.append(room_code)
-            except Exception:
-                rooms_to_delete.append(room_code)
+            
+            for room_code in rooms_to_delete:
+                del data["rooms"][room_code]
+            
+            if rooms_to_delete:
+                self._write_data(data)
         
-        for room_code in rooms_to_delete:
-            del data["rooms"][room_code]
+        return rooms_to_delete
+    
+    def iter_room_records(self) -> Iterator[dict]:
+        """Yield rooms in their stored (JSON-ready) form, one at a time."""
+        data = self._read_data()
+        # Snapshot the values so concurrent writes don't break iteration
+        for room_data in list(data["rooms"].values()):
+            yield room_data
+    
+    def iter_room_sizes(self) -> Iterator[Tuple[str, int, int]]:
+        """Yield (room_code, stored bytes, participants) for every room."""
+        # Stored room dicts are replaced, never changed, so this is safe off the lock
+        for room_code, room_data in list(self._read_data()["rooms"].items()):
+            yield room_code, len(json.dumps(room_data, separators=(",", ":"))), len(room_data.get("participants", {}))
+    
+    def save_rooms_bulk(self, rooms: List[Room], policy: str = "overwrite") -> Dict[str, int]:
+        """Apply a batch of rooms with a single write.
         
-        if rooms_to_delete:
-            self._write_data(data)
+        Conflict policies for rooms that already exist:
+        - skip: keep the existing room
+        - overwrite: replace it with the imported room
+        - merge: keep the existing room, adding imported participants
+        """
+        counts = {"created": 0, "overwritten": 0, "merged": 0, "skipped": 0}
+        with self._exclusive():
+            data = self._read_for_update()
+            
+            for room in rooms:
+                incoming = room.model_dump(mode='json')
+                existing = data["rooms"].get(room.room_code)
+                
+                if existing is None:
+                    data["rooms"][room.room_code] = incoming
+                    counts["created"] += 1
+                elif policy == "skip":
+                    counts["skipped"] += 1
+                elif policy == "overwrite":
+                    incoming["version"] = existing.get("version", 0) + 1
+                    data["rooms"][room.room_code] = incoming
+                    counts["overwritten"] += 1
+                else:
+                    merged = dict(existing)
+                    participants = dict(existing.get("participants", {}))
+                    added = [sid for sid in incoming["participants"] if sid not in participants]
+                    participants.update(incoming["participants"])
+                    merged["participants"] = participants
+                    merged["roster_version"] = existing.get("roster_version", 0) + len(added)
+                    merged["version"] = existing.get("version", 0) + 1
+                    data["rooms"][room.room_code] = merged
+                    counts["merged"] += 1
+            
+            if counts["created"] or counts["overwritten"] or counts["merged"]:
+                self._write_data(data)
         
-        return len(rooms_to_delete)
+        return counts
+    
+    def find_participant_room(self, socket_id: str) -> Optional[str]:
+        """Find the code of the room a socket is in, without a full scan."""
+        self._read_data()
+        return self._participant_index.get(socket_id)
+    
+    def get_stats(self) -> dict:
+        """Get file statistics."""
+        return {
+            "backend": "json",
+            "rooms": self.count_rooms(),
+            "file_bytes": self._stamp[1] if self._stamp else 0
+        }
 
 
 # Global storage instance
-storage = JSONStorage(settings.DATA_FILE)
+if settings.STORAGE_BACKEND == "binary":
+    from binary_storage import BinaryStorage
+    storage = BinaryStorage(settings.DATA_FILE)
+else:
+    storage = JSONStorage(settings.DATA_FILE)
@@ -0,0 +1,121 @@
+"""Signaling topologies that decide which peer pairs may connect in a room."""
+from typing import Dict, List, Set
+from models import Room
+
+
+MESH = "mesh"
+PRESENTER = "presenter"
+GRID_LIMITED = "grid-limited"
+
+TOPOLOGIES = (MESH, PRESENTER, GRID_LIMITED)
+
+
+class TopologyManager:
+    """Computes the peers each participant should connect to.
+    
+    - mesh: everyone connects to everyone (fine for small rooms)
+    - presenter: only designated publishers are offered to everyone
+    - grid-limited: everyone connects to the K most recent speakers
+    
+    In the non-mesh modes a pair may only signal if at least one side is a
+    publisher, which keeps signaling and per-client encode load at O(K*n)
+    instead of O(n^2).
+    """
+    
+    def __init__(self):
+        # room_code -> socket_ids ordered by most recent speaking activity
+        self.recent_speakers: Dict[str, List[str]] = {}
+    
+    def is_designated_publisher(self, room: Room, socket_id: str) -> bool:
+        """Check if a participant is the owner or a designated presenter.
+        
+        Only server-controlled facts count: the socket that created the room,
+        a host join token, or a user id vouched for by a join token. The
+        `user_id` a client sends in join_room is never trusted on its own.
+        """
+        if socket_id == room.owner_socket_id:
+            return True
+        
+        participant = room.participants.get(socket_id)
+        if not participant:
+            return False
+        if participant.role == "host":
+            return True
+        if not participant.user_verified or not participant.user_id:
+            return False
+        
+        # REST-created rooms store the owner's user id as owner_socket_id
+        return participant.user_id == room.owner_socket_id or participant.user_id in room.presenter_ids
+    
+    def get_publishers(self, room: Room) -> Set[str]:
+        """Get the socket_ids whose media is offered to the whole room."""
+        if room.topology == PRESENTER:
+            return {sid for sid in room.participants if self.is_designated_publisher(room, sid)}
+        
+        if room.topology == GRID_LIMITED:
+            active = [
+                sid for sid in self.recent_speakers.get(room.room_code, [])
+                if sid in room.participants
+            ][:room.grid_size]
+            
+            # Fill remaining slots with the earliest joiners so small rooms stay a mesh
+            if len(active) < room.grid_size:
+                by_join_time = sorted(room.participants.values(), key=lambda p: p.joined_at)
+                for participant in by_join_time:
+                    if len(active) >= room.grid_size:
+                        break
+                    if participant.socket_id not in active:
+                        active.append(participant.socket_id)
+            
+            return set(active)
+        
+        return set(room.participants.keys())
+    
+    def get_peers_to_connect(self, room: Room, socket_id: str) -> List[str]:
+        """Get the peers a participant should negotiate with."""
+        others = [sid for sid in room.participants if sid != socket_id]
+        
+        if room.topology == MESH:
+            return others
+        
+        publishers = self.get_publishers(room)
+        if socket_id in publishers:
+            return others
+        
+        return [sid for sid in others if sid in publishers]
+    
+    def may_signal(self, room: Room, from_socket_id: str, to_socket_id: str) -> bool:
+        """Check if two participants are allowed to exchange signaling messages."""
+        if room.topology == MESH:
+            return True
+        
+        publishers = self.get_publishers(room)
+        return from_socket_id in publishers or to_socket_id in publishers
+    
+    def record_speaker(self, room: Room, socket_id: str) -> bool:
+        """Move a speaker to the front of the room's speaker list.
+        
+        Returns True if the set of publishers changed.
+        """
+        before = self.get_publishers(room)
+        
+        speakers = self.recent_speakers.setdefault(room.room_code, [])
+        if socket_id in speakers:
+            speakers.remove(socket_id)
+        speakers.insert(0, socket_id)
+        # Only the first grid_size entries matter; keep a little slack
+        del speakers[room.grid_size * 2:]
+        
+        return self.get_publishers(room) != before
+    
+    def remove_participant(self, room_code: str, socket_id: str):
+        """Forget a participant's speaking history."""
+        speakers = self.recent_speakers.get(room_code)
+        if speakers and socket_id in speakers:
+            speakers.remove(socket_id)
+        if speakers is not None and not speakers:
+            del self.recent_speakers[room_code]
+
+
+# Global topology manager
+topology_manager = TopologyManager()
@@ -0,0 +1,187 @@
+"""Per-socket and per-room signaling traffic counters over a sliding window."""
+import heapq
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional
+from config import settings
+from events import event_bus, ROOM_DELETED, ROOM_EXPIRED
+
+
+# Counter layout, shared by every scope
+FIELDS = ("frames_in", "bytes_in", "frames_out", "bytes_out", "broadcasts", "errors")
+FRAMES_IN, BYTES_IN, FRAMES_OUT, BYTES_OUT, BROADCASTS, ERRORS = range(len(FIELDS))
+
+# Socket whose frame is being handled, so fan-out can be charged to it
+current_socket: ContextVar[Optional[str]] = ContextVar("current_socket", default=None)
+
+
+class TrafficCounter:
+    """Counters for one socket or room over the current and previous window.
+    
+    Rates cover between one and two TRAFFIC_WINDOW_SECONDS windows, rotated
+    lazily on the next update or read, so recording is a couple of list
+    increments.
+    """
+    
+    __slots__ = ("current", "previous", "totals", "created", "window_started")
+    
+    def __init__(self, now: float):
+        self.current = [0] * len(FIELDS)
+        self.previous = [0] * len(FIELDS)
+        self.totals = [0] * len(FIELDS)
+        self.created = now
+        self.window_started = now
+    
+    def _maybe_rotate(self, now: float):
+        elapsed = now - self.window_started
+        if elapsed < settings.TRAFFIC_WINDOW_SECONDS:
+            return
+        # Idle for more than a window: both windows are stale
+        self.previous = self.current if elapsed < 2 * settings.TRAFFIC_WINDOW_SECONDS else [0] * len(FIELDS)
+        self.current = [0] * len(FIELDS)
+        self.window_started = now
+    
+    def add(self, now: float, field: int, amount: int = 1):
+        if now - self.window_started >= settings.TRAFFIC_WINDOW_SECONDS:
+            self._maybe_rotate(now)
+        self.current[field] += amount
+        self.totals[field] += amount
+    
+    def add_frame(self, now: float, frame_field: int, byte_field: int, size: int):
+        if now - self.window_started >= settings.TRAFFIC_WINDOW_SECONDS:
+            self._maybe_rotate(now)
+        self.current[frame_field] += 1
+        self.current[byte_field] += size
+        self.totals[frame_field] += 1
+        self.totals[byte_field] += size
+    
+    def rates(self, now: float) -> list:
+        """Per-second rate of every field over the window."""
+        self._maybe_rotate(now)
+        span = now - self.window_started + settings.TRAFFIC_WINDOW_SECONDS
+        span = max(1.0, min(span, now - self.created))
+        return [(c + p) / span for c, p in zip(self.current, self.previous)]
+    
+    def to_dict(self, now: float) -> dict:
+        rates = self.rates(now)
+        return {
+            "per_second": {field: round(rate, 2) for field, rate in zip(FIELDS, rates)},
+            "totals": dict(zip(FIELDS, self.totals)),
+            "age_seconds": round(now - self.created, 1)
+        }
+
+
+class TrafficAccounting:
+    """Signaling load per socket and per room, to find runaway clients.
+    
+    ConnectionManager records every inbound and outbound frame, every room
+    broadcast (charged to the socket whose frame triggered it) and every
+    error sent. Sockets are forgotten on disconnect; rooms are kept in an
+    LRU capped at TRAFFIC_MAX_ROOMS so reconnect loops stay visible per
+    room. Counters are per worker process.
+    """
+    
+    def __init__(self):
+        self.sockets: Dict[str, TrafficCounter] = {}
+        self.rooms: "OrderedDict[str, TrafficCounter]" = OrderedDict()
+        self.socket_rooms: Dict[str, str] = {}
+        self.totals = [0] * len(FIELDS)
+        self.rooms_dropped: int = 0
+    
+    def _socket(self, socket_id: str, now: float) -> TrafficCounter:
+        counter = self.sockets.get(socket_id)
+        if counter is None:
+            counter = self.sockets[socket_id] = TrafficCounter(now)
+        return counter
+    
+    def _room(self, room_code: str, now: float) -> TrafficCounter:
+        counter = self.rooms.get(room_code)
+        if counter is None:
+            counter = self.rooms[room_code] = TrafficCounter(now)
+            while len(self.rooms) > settings.TRAFFIC_MAX_ROOMS:
+                self.rooms.popitem(last=False)
+                self.rooms_dropped += 1
+        else:
+            self.rooms.move_to_end(room_code)
+        return counter
+    
+    def _frame(self, socket_id: str, room_code: Optional[str], frame_field: int, byte_field: int, size: int):
+        now = time.monotonic()
+        self._socket(socket_id, now).add_frame(now, frame_field, byte_field, size)
+        if room_code:
+            self.socket_rooms[socket_id] = room_code
+            self._room(room_code, now).add_frame(now, frame_field, byte_field, size)
+        self.totals[frame_field] += 1
+        self.totals[byte_field] += size
+    
+    def inbound(self, socket_id: str, room_code: Optional[str], size: int):
+        """A frame received from a socket."""
+        self._frame(socket_id, room_code, FRAMES_IN, BYTES_IN, size)
+    
+    def outbound(self, socket_id: str, room_code: Optional[str], size: int):
+        """A frame sent to a socket."""
+        self._frame(socket_id, room_code, FRAMES_OUT, BYTES_OUT, size)
+    
+    def broadcast(self, room_code: str):
+        """A room-wide fan-out, charged to the room and the triggering socket."""
+        now = time.monotonic()
+        self._room(room_code, now).add(now, BROADCASTS)
+        socket_id = current_socket.get()
+        if socket_id is not None and socket_id in self.sockets:
+            self.sockets[socket_id].add(now, BROADCASTS)
+        self.totals[BROADCASTS] += 1
+    
+    def error(self, socket_id: str, room_code: Optional[str]):
+        """An error frame sent to a socket."""
+        now = time.monotonic()
+        self._socket(socket_id, now).add(now, ERRORS)
+        if room_code:
+            self._room(room_code, now).add(now, ERRORS)
+        self.totals[ERRORS] += 1
+    
+    def forget_socket(self, socket_id: str):
+        self.sockets.pop(socket_id, None)
+        self.socket_rooms.pop(socket_id, None)
+    
+    def record_event(self, event_type: str, data: dict):
+        """Event bus handler: forget rooms that are gone."""
+        if event_type in (ROOM_DELETED, ROOM_EXPIRED):
+            self.rooms.pop(data["room_code"], None)
+    
+    def top(self, limit: int = 10, sort: str = "frames_in") -> dict:
+        """The `limit` busiest sockets and rooms by per-second rate of `sort`."""
+        field = FIELDS.index(sort)
+        now = time.monotonic()
+        
+        def ranked(counters: dict) -> list:
+            rated = ((counter.rates(now)[field], key, counter) for key, counter in counters.items())
+            return heapq.nlargest(limit, rated, key=lambda item: item[0])
+        
+        return {
+            "window_seconds": settings.TRAFFIC_WINDOW_SECONDS,
+            "sort": sort,
+            "sockets": [
+                {"socket_id": socket_id, "room_code": self.socket_rooms.get(socket_id), **counter.to_dict(now)}
+                for _, socket_id, counter in ranked(self.sockets)
+            ],
+            "rooms": [
+                {"room_code": room_code, **counter.to_dict(now)}
+                for _, room_code, counter in ranked(self.rooms)
+            ]
+        }
+    
+    def get_stats(self) -> dict:
+        """Totals since startup and how many scopes are tracked."""
+        return {
+            "window_seconds": settings.TRAFFIC_WINDOW_SECONDS,
+            "sockets_tracked": len(self.sockets),
+            "rooms_tracked": len(self.rooms),
+            "rooms_dropped": self.rooms_dropped,
+            "totals": dict(zip(FIELDS, self.totals))
+        }
+
+
+# Global traffic accounting
+traffic = TrafficAccounting()
+event_bus.subscribe(traffic.record_event)
@@ -0,0 +1,294 @@
+"""Batched, non-blocking delivery of room lifecycle events to webhooks."""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+from urllib.parse import urlsplit
+import httpx
+from config import settings
+from events import event_bus
+
+
+# Queue is written to disk at most this often while events are pending
+CHECKPOINT_SECONDS = 5
+# Retry delays grow exponentially up to this cap
+MAX_BACKOFF_SECONDS = 300
+
+
+class WebhookDestination:
+    """Pending events and retry state for one webhook URL."""
+    
+    def __init__(self, url: str):
+        self.url = url
+        self.queue: Deque[dict] = deque()
+        self.attempts: int = 0
+        self.next_attempt_at: float = 0.0
+        self.delivered: int = 0
+        self.dropped: int = 0
+        self.failed_attempts: int = 0
+        self.last_error: Optional[str] = None
+
+
+class WebhookDispatcher:
+    """Queues lifecycle events per destination and delivers them in batches.
+    
+    `enqueue` only appends to in-memory queues, so it is safe to call from
+    the signaling path. A background task POSTs batches as
+    `{"events": [...]}` through one pooled HTTP client, retries failures
+    with jittered exponential backoff, and checkpoints pending events to an
+    NDJSON file so they survive restarts.
+    """
+    
+    def __init__(self, urls: List[str], secret: str, queue_file: str):
+        self.destinations: Dict[str, WebhookDestination] = {
+            url: WebhookDestination(url) for url in urls
+        }
+        self.secret = secret
+        self.queue_path = Path(queue_file)
+        self.client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._dirty = False
+        self._last_checkpoint = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.destinations)
+    
+    def enqueue(self, event_type: str, data: dict):
+        """Queue an event for every destination (event bus handler)."""
+        event = {
+            "id": uuid.uuid4().hex,
+            "type": event_type,
+            "occurred_at": datetime.utcnow().isoformat(),
+            "data": data
+        }
+        
+        for destination in self.destinations.values():
+            self._push(destination, event)
+            if self._wake and len(destination.queue) >= settings.WEBHOOK_BATCH_SIZE:
+                self._wake.set()
+        
+        self._dirty = True
+    
+    def _push(self, destination: WebhookDestination, event: dict):
+        """Append an event, dropping the oldest one if the queue is full."""
+        if len(destination.queue) >= settings.WEBHOOK_MAX_QUEUE:
+            destination.queue.popleft()
+            destination.dropped += 1
+        destination.queue.append(event)
+    
+    def sign(self, timestamp: str, body: bytes) -> str:
+        """HMAC-SHA256 over `<timestamp>.<body>`, hex encoded."""
+        return hmac.new(
+            self.secret.encode("utf-8"),
+            timestamp.encode("utf-8") + b"." + body,
+            hashlib.sha256
+        ).hexdigest()
+    
+    async def start(self):
+        """Restore the persisted queue and start the delivery task."""
+        if not self.enabled:
+            return
+        
+        restored = await asyncio.to_thread(self._load_queue)
+        if restored:
+            print(f"Restored {restored} pending webhook deliveries")
+        
+        self._wake = asyncio.Event()
+        self.client = httpx.AsyncClient(
+            timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=max(4, len(self.destinations) * 2),
+                max_keepalive_connections=max(2, len(self.destinations))
+            )
+        )
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Make one last delivery attempt, then persist what is left."""
+        if not self.enabled or self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        
+        try:
+            await asyncio.wait_for(self._deliver_due(), timeout=settings.WEBHOOK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        
+        await asyncio.to_thread(self._save_queue, self._snapshot_queue())
+        await self.client.aclose()
+    
+    async def _run(self):
+        """Deliver due batches every flush interval, or sooner when a batch fills."""
+        interval = settings.WEBHOOK_FLUSH_INTERVAL_MS / 1000
+        
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            
+            try:
+                await self._deliver_due()
+                
+                if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_SECONDS:
+                    await self.checkpoint()
+            except Exception as e:
+                print(f"Error in webhook dispatcher: {e}")
+    
+    async def checkpoint(self):
+        """Persist pending events now."""
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        await asyncio.to_thread(self._save_queue, self._snapshot_queue())
+    
+    async def _deliver_due(self):
+        """Drain every destination that is not backing off, concurrently."""
+        now = time.monotonic()
+        due = [
+            d for d in self.destinations.values()
+            if d.queue and d.next_attempt_at <= now
+        ]
+        if due:
+            await asyncio.gather(*(self._drain(d) for d in due))
+    
+    async def _drain(self, destination: WebhookDestination):
+        """Send batches to one destination until it is empty or a send fails."""
+        while destination.queue:
+            if not await self._send_batch(destination):
+                break
+    
+    async def _send_batch(self, destination: WebhookDestination) -> bool:
+        """POST the oldest batch. Returns True if the batch left the queue."""
+        batch = list(islice(destination.queue, settings.WEBHOOK_BATCH_SIZE))
+        body = json.dumps({"events": batch}, separators=(",", ":"), default=str).encode("utf-8")
+        timestamp = str(int(time.time()))
+        headers = {"Content-Type": "application/json", "X-Webhook-Timestamp": timestamp}
+        if self.secret:
+            headers["X-Webhook-Signature"] = f"sha256={self.sign(timestamp, body)}"
+        
+        try:
+            response = await self.client.post(destination.url, content=body, headers=headers)
+            status_code = response.status_code
+            error = None if status_code < 300 else f"HTTP {status_code}"
+        except httpx.HTTPError as e:
+            status_code = None
+            error = f"{type(e).__name__}: {e}"
+        
+        if error is None:
+            self._remove_batch(destination, batch)
+            destination.delivered += len(batch)
+            destination.attempts = 0
+            destination.next_attempt_at = 0.0
+            return True
+        
+        destination.failed_attempts += 1
+        destination.attempts += 1
+        destination.last_error = error
+        
+        # 4xx (other than 408/429) will not succeed on retry
+        permanent = status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+        if permanent or destination.attempts > settings.WEBHOOK_MAX_RETRIES:
+            print(f"Dropping {len(batch)} webhook events for {destination.url}: {error}")
+            self._remove_batch(destination, batch)
+            destination.dropped += len(batch)
+            destination.attempts = 0
+            return True
+        
+        backoff = min(MAX_BACKOFF_SECONDS, 2 ** destination.attempts)
+        destination.next_attempt_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+        return False
+    
+    def _remove_batch(self, destination: WebhookDestination, batch: List[dict]):
+        """Pop a sent batch (the queue may have shed old events meanwhile)."""
+        sent_ids = {event["id"] for event in batch}
+        while destination.queue and destination.queue[0]["id"] in sent_ids:
+            destination.queue.popleft()
+        self._dirty = True
+    
+    def _snapshot_queue(self) -> List[tuple]:
+        """Copy pending (url, event) pairs on the event loop thread."""
+        return [
+            (url, event)
+            for url, destination in self.destinations.items()
+            for event in destination.queue
+        ]
+    
+    def _save_queue(self, pending: List[tuple]):
+        """Write pending events to the queue file atomically."""
+        self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.queue_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for url, event in pending:
+                f.write(json.dumps({"url": url, "event": event}, separators=(",", ":"), default=str) + "\n")
+        os.replace(tmp_path, self.queue_path)
+    
+    def _load_queue(self) -> int:
+        """Restore pending events for destinations that are still configured."""
+        if not self.queue_path.exists():
+            return 0
+        
+        restored = 0
+        with open(self.queue_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                destination = self.destinations.get(record.get("url"))
+                if destination is not None:
+                    self._push(destination, record["event"])
+                    restored += 1
+        
+        return restored
+    
+    def get_stats(self, detailed: bool = False) -> dict:
+        """Get per-destination delivery statistics.
+        
+        Webhook URLs often embed secrets (hook tokens) and errors can quote
+        them, so only the host and a failing flag are included unless
+        `detailed` (for the API-key protected admin endpoint).
+        """
+        now = time.monotonic()
+        destinations = []
+        for d in self.destinations.values():
+            stats = {
+                "host": urlsplit(d.url).hostname,
+                "queued": len(d.queue),
+                "delivered": d.delivered,
+                "dropped": d.dropped,
+                "failed_attempts": d.failed_attempts,
+                "retry_in_seconds": round(max(0.0, d.next_attempt_at - now), 1),
+                "failing": d.attempts > 0
+            }
+            if detailed:
+                stats["url"] = d.url
+                stats["last_error"] = d.last_error
+            destinations.append(stats)
+        return {"enabled": self.enabled, "destinations": destinations}
+
+
+# Global webhook dispatcher
+webhook_dispatcher = WebhookDispatcher(
+    urls=settings.WEBHOOK_URLS,
+    secret=settings.WEBHOOK_SECRET,
+    queue_file=settings.WEBHOOK_QUEUE_FILE
+)
+if webhook_dispatcher.enabled:
+    event_bus.subscribe(webhook_dispatcher.enqueue)
@@ -1,10 +1,29 @@
 """WebSocket connection manager and signaling logic."""
 from fastapi import WebSocket
-from typing import Dict, Set
+from typing import Dict, Optional, Set
 import json
+import time
 import asyncio
 from datetime import datetime
-from room_manager import room_manager
+from room_manager import room_manager, RoomLimitReached
+from admission import admission
+from topology import topology_manager, TOPOLOGIES, MESH
+from presence import presence_coalescer, PRESENCE_MODES, COALESCED
+from chat_history import chat_history
+from chat_log import chat_log
+from config import settings
+from dispatch import ws_messages, DispatchError
+from call_tracing import call_tracer
+from quality_stats import quality_stats
+from signaling_recorder import signaling_recorder
+from room_locks import room_locks
+from bandwidth import bandwidth_advisor
+from join_tokens import join_tokens, JoinTokenError
+from traffic import traffic, current_socket
+from models import (
+    CreateRoomMessage, JoinRoomMessage, SignalMessage, PeerConnectedMessage,
+    StatsReportMessage, ChatMessage, ChatHistoryRequest
+)
 
 
 class ConnectionManager:
@@ -16,10 +35,30 @@ class ConnectionManager:
         # socket_id -> room_code
         self.socket_to_room: Dict[str, str] = {}
     
-    async def connect(self, websocket: WebSocket, socket_id: str):
-        """Accept a new WebSocket connection."""
+    async def connect(self, websocket: WebSocket, socket_id: str) -> bool:
+        """Accept a new WebSocket connection, or refuse it when overloaded."""
+        retry_after = admission.check_connection(len(self.active_connections))
+        
         await websocket.accept()
+        
+        if retry_after is not None:
+            # Refuse with a retry hint; 1013 = "Try Again Later"
+            try:
+                await websocket.send_json({
+                    "type": "error",
+                    "payload": {
+                        "code": "SERVER_BUSY",
+                        "message": "Server is busy, please retry later",
+                        "retry_after": retry_after
+                    }
+                })
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+            return False
+        
         self.active_connections[socket_id] = websocket
+        return True
     
     def disconnect(self, socket_id: str):
         """Remove a WebSocket connection."""
@@ -30,16 +69,47 @@ class ConnectionManager:
         if socket_id in self.socket_to_room:
             room_code = self.socket_to_room[socket_id]
             room_manager.remove_participant(room_code, socket_id)
+            topology_manager.remove_participant(room_code, socket_id)
             del self.socket_to_room[socket_id]
+        call_tracer.forget(socket_id)
+        traffic.forget_socket(socket_id)
+    
+    async def handle_disconnect(self, socket_id: str):
+        """Handle a dropped socket: tell its room, then forget it."""
+        signaling_recorder.socket_closed(socket_id)
+        await self.handle_leave_room(socket_id)
+        self.disconnect(socket_id)
     
     async def send_message(self, socket_id: str, message: dict):
         """Send a message to a specific socket."""
         if socket_id in self.active_connections:
-            try:
-                await self.active_connections[socket_id].send_json(message)
-            except Exception as e:
-                print(f"Error sending to {socket_id}: {e}")
-                self.disconnect(socket_id)
+            if message.get("type") == "error":
+                traffic.error(socket_id, self.socket_to_room.get(socket_id))
+            await self.send_text(socket_id, self.encode_message(message))
+    
+    @staticmethod
+    def encode_message(message: dict) -> str:
+        """Encode a message once for sending to many sockets (same format as send_json)."""
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+    
+    async def send_text(self, socket_id: str, text: str) -> bool:
+        """Send a pre-encoded message to a socket. Returns True if it was sent."""
+        websocket = self.active_connections.get(socket_id)
+        if websocket is None:
+            return False
+        
+        signaling_recorder.outbound(socket_id, text)
+        traffic.outbound(socket_id, self.socket_to_room.get(socket_id), len(text))
+        try:
+            await websocket.send_text(text)
+            return True
+        except Exception as e:
+            print(f"Error sending to {socket_id}: {e}")
+            # Stop sending to it now; its room is told (same as a normal
+            # disconnect) once whoever holds the room lock is done
+            self.active_connections.pop(socket_id, None)
+            asyncio.create_task(self.handle_disconnect(socket_id))
+            return False
     
     async def broadcast_to_room(self, room_code: str, message: dict, exclude: Set[str] = None):
         """Broadcast a message to all participants in a room."""
@@ -50,118 +120,318 @@ class ConnectionManager:
         if not room:
             return
         
+        traffic.broadcast(room_code)
+        text = self.encode_message(message)
         tasks = []
         for socket_id in room.participants.keys():
             if socket_id not in exclude:
-                tasks.append(self.send_message(socket_id, message))
+                tasks.append(self.send_text(socket_id, text))
         
         if tasks:
             await asyncio.gather(*tasks, return_exceptions=True)
     
-    async def handle_join_room(self, socket_id: str, data: dict):
-        """Handle a user joining a room."""
-        room_code = data.get("room_code")
-        display_name = data.get("display_name", "Anonymous")
+    async def announce(self, message: dict, room_codes: Optional[Set[str]] = None) -> dict:
+        """Push a message to every socket, or to the sockets in `room_codes`.
         
-        if not room_code:
-            await self.send_message(socket_id, {
-                "type": "error",
-                "payload": {"code": "MISSING_ROOM_CODE", "message": "Room code is required"}
-            })
-            return
+        Works from the in-memory socket maps (no storage access), encodes the
+        message once and sends in paced batches so a large fan-out doesn't
+        starve signaling traffic.
+        """
+        started = time.perf_counter()
         
-        # Check if room exists
-        room = room_manager.get_room(room_code)
-        if not room:
-            await self.send_message(socket_id, {
-                "type": "error",
-                "payload": {"code": "ROOM_NOT_FOUND", "message": f"Room {room_code} not found"}
-            })
-            return
+        if room_codes is None:
+            targets = list(self.active_connections.keys())
+        else:
+            targets = [sid for sid, code in self.socket_to_room.items() if code in room_codes]
         
-        # Check if room is open
-        if room.state != "open":
-            await self.send_message(socket_id, {
-                "type": "error",
-                "payload": {"code": "ROOM_CLOSED", "message": "Room is closed"}
-            })
+        text = self.encode_message(message)
+        batch_size = settings.ANNOUNCE_BATCH_SIZE
+        pause = settings.ANNOUNCE_BATCH_PAUSE_MS / 1000
+        delivered = 0
+        batches = 0
+        
+        for i in range(0, len(targets), batch_size):
+            if batches:
+                await asyncio.sleep(pause)
+            
+            results = await asyncio.gather(
+                *(self.send_text(sid, text) for sid in targets[i:i + batch_size])
+            )
+            delivered += sum(results)
+            batches += 1
+        
+        return {
+            "targeted": len(targets),
+            "delivered": delivered,
+            "failed": len(targets) - delivered,
+            "batches": batches,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    async def _admit_join(self, socket_id: str) -> bool:
+        """Reserve a join slot, telling the client when to retry if refused."""
+        retry_after = admission.begin_join()
+        if retry_after is None:
+            return True
+        
+        await self.send_message(socket_id, {
+            "type": "error",
+            "payload": {
+                "code": "SERVER_BUSY",
+                "message": "Server is busy, please retry joining later",
+                "retry_after": retry_after
+            }
+        })
+        return False
+    
+    @ws_messages.handler("join_room", JoinRoomMessage, invalid_code="MISSING_ROOM_CODE")
+    async def handle_join_room(self, socket_id: str, request: JoinRoomMessage):
+        """Handle a user joining a room, subject to admission control."""
+        claims = None
+        if request.join_token or settings.JOIN_TOKENS_REQUIRED:
+            # Checked before admission and storage, so forged or stale tokens cost no I/O
+            try:
+                claims = join_tokens.verify(request.join_token, request.room_code)
+            except JoinTokenError as e:
+                await self.send_message(socket_id, {
+                    "type": "error",
+                    "payload": {"code": e.code, "message": str(e)}
+                })
+                return
+        
+        if not await self._admit_join(socket_id):
             return
         
-        # Check if expired
+        try:
+            # Joins and leaves of one room (and their notifications) run one at a time
+            async with room_locks.hold(request.room_code):
+                await self._join_room(socket_id, request, claims)
+        finally:
+            admission.end_join()
+    
+    @staticmethod
+    def _join_refusal(room_code: str, room) -> Optional[dict]:
+        """Why a room can't be joined right now, or None if it can."""
+        if not room:
+            return {"code": "ROOM_NOT_FOUND", "message": f"Room {room_code} not found"}
+        if room.state != "open":
+            return {"code": "ROOM_CLOSED", "message": "Room is closed"}
         if room.is_expired():
-            await self.send_message(socket_id, {
-                "type": "error",
-                "payload": {"code": "ROOM_EXPIRED", "message": "Room has expired"}
-            })
-            return
+            return {"code": "ROOM_EXPIRED", "message": "Room has expired"}
+        return None
+    
+    async def _join_room(self, socket_id: str, request: JoinRoomMessage, claims: Optional[dict] = None):
+        """Add a socket to a room and notify existing participants.
+        
+        With verified token `claims` the room was vouched for when the token
+        was issued, so the pre-check read is skipped and the atomic add (which
+        re-checks state and expiry) is the only storage access on success.
+        """
+        room_code = request.room_code
+        display_name = request.display_name
+        user_id = request.user_id
+        role = claims["role"] if claims else None
+        # Only a user id vouched for by a signed token can confer presenter rights
+        user_verified = bool(claims and claims["user_id"])
+        if user_verified:
+            user_id = claims["user_id"]
+        
+        if claims is None:
+            refusal = self._join_refusal(room_code, room_manager.get_room(room_code))
+            if refusal:
+                await self.send_message(socket_id, {"type": "error", "payload": refusal})
+                return
         
         # Add participant
-        room = room_manager.add_participant(room_code, socket_id, display_name)
+        room = room_manager.add_participant(room_code, socket_id, display_name, user_id, user_verified, role)
         if not room:
+            # Only now look at the room, to tell the client why
+            refusal = self._join_refusal(room_code, room_manager.get_room(room_code)) if claims else None
             await self.send_message(socket_id, {
                 "type": "error",
-                "payload": {"code": "ROOM_FULL", "message": "Room is full"}
+                "payload": refusal or {"code": "ROOM_FULL", "message": "Room is full"}
             })
             return
         
         # Track socket to room mapping
         self.socket_to_room[socket_id] = room_code
+        call_tracer.record_join(socket_id)
         
-        # Get list of existing peers (excluding the new joiner)
-        existing_peers = [
+        # Existing participants (excluding the new joiner), for the roster
+        existing_participants = [
             {"socket_id": p.socket_id, "display_name": p.display_name}
             for sid, p in room.participants.items() if sid != socket_id
         ]
         
+        # Only the peers the topology allows are offered for negotiation
+        peers_to_connect = set(topology_manager.get_peers_to_connect(room, socket_id))
+        existing_peers = [p for p in existing_participants if p["socket_id"] in peers_to_connect]
+        
+        # Catch the late joiner up on recent chat
+        history, history_cursor = chat_history.get_page(room_code, settings.CHAT_HISTORY_ON_JOIN)
+        
         # Send joined confirmation to the new participant
         await self.send_message(socket_id, {
             "type": "joined",
             "payload": {
                 "room_code": room_code,
                 "your_socket_id": socket_id,
-                "peers": existing_peers
+                "peers": existing_peers,
+                "participants": existing_participants,
+                "topology": self._topology_payload(room),
+                "bandwidth": bandwidth_advisor.room_profiles(room),
+                "roster_version": room.roster_version,
+                "role": role,
+                "chat_history": history,
+                "chat_cursor": history_cursor
             }
         })
         
         # Notify existing participants about the new peer
-        await self.broadcast_to_room(room_code, {
+        await self.announce_join(room, socket_id, display_name)
+    
+    async def announce_join(self, room, socket_id: str, display_name: str):
+        """Tell a room about a new participant, immediately or coalesced."""
+        participant = {"socket_id": socket_id, "display_name": display_name}
+        
+        if room.presence_mode == COALESCED:
+            if presence_coalescer.record_join(room.room_code, participant, room.roster_version):
+                asyncio.create_task(self._flush_presence(room.room_code))
+            return
+        
+        await self.broadcast_to_room(room.room_code, {
             "type": "peer_joined",
             "payload": {
-                "socket_id": socket_id,
-                "display_name": display_name
+                **participant,
+                "roster_version": room.roster_version,
+                "bandwidth": bandwidth_advisor.room_profiles(room)
             }
         }, exclude={socket_id})
     
+    async def announce_leave(self, room, socket_id: str):
+        """Tell a room a participant left, immediately or coalesced."""
+        if room.presence_mode == COALESCED:
+            if presence_coalescer.record_leave(room.room_code, socket_id, room.roster_version):
+                asyncio.create_task(self._flush_presence(room.room_code))
+            return
+        
+        await self.broadcast_to_room(room.room_code, {
+            "type": "peer_left",
+            "payload": {
+                "socket_id": socket_id,
+                "roster_version": room.roster_version,
+                "bandwidth": bandwidth_advisor.room_profiles(room)
+            }
+        })
+    
+    async def _flush_presence(self, room_code: str):
+        """Send a room's batched membership changes after the coalescing window."""
+        await asyncio.sleep(settings.PRESENCE_COALESCE_MS / 1000)
+        
+        delta = presence_coalescer.take(room_code)
+        if delta:
+            room = room_manager.get_room(room_code)
+            if room:
+                delta["bandwidth"] = bandwidth_advisor.room_profiles(room)
+            # Sent even if joins and leaves cancelled out, so versions stay contiguous
+            await self.broadcast_to_room(room_code, {
+                "type": "roster_delta",
+                "payload": delta
+            })
+    
+    @ws_messages.handler("roster_snapshot")
+    async def handle_roster_snapshot(self, socket_id: str):
+        """Send the full roster to a client that detected a version gap."""
+        room_code = self.socket_to_room.get(socket_id)
+        room = room_manager.get_room(room_code) if room_code else None
+        
+        if not room:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "NOT_IN_ROOM", "message": "You are not in a room"}
+            })
+            return
+        
+        await self.send_message(socket_id, {
+            "type": "roster_snapshot",
+            "payload": {
+                "room_code": room_code,
+                "version": room.roster_version,
+                "participants": [
+                    {"socket_id": p.socket_id, "display_name": p.display_name}
+                    for p in room.participants.values()
+                ]
+            }
+        })
+    
+    @ws_messages.handler("leave_room")
     async def handle_leave_room(self, socket_id: str):
         """Handle a user leaving a room."""
-        if socket_id not in self.socket_to_room:
+        room_code = self.socket_to_room.get(socket_id)
+        if room_code is None:
             return
         
-        room_code = self.socket_to_room[socket_id]
+        async with room_locks.hold(room_code):
+            await self._leave_room(socket_id, room_code)
+    
+    async def _leave_room(self, socket_id: str, room_code: str):
+        """Remove a socket from its room and notify the others (room lock held)."""
+        if self.socket_to_room.get(socket_id) != room_code:
+            # Left while waiting for the lock
+            return
+        
+        room = room_manager.get_room(room_code)
+        publishers_before = topology_manager.get_publishers(room) if room else set()
         
         # Remove participant
-        room_manager.remove_participant(room_code, socket_id)
+        room = room_manager.remove_participant(room_code, socket_id)
+        topology_manager.remove_participant(room_code, socket_id)
         del self.socket_to_room[socket_id]
+        call_tracer.forget(socket_id)
+        
+        if not room:
+            return
         
         # Notify others
-        await self.broadcast_to_room(room_code, {
-            "type": "peer_left",
-            "payload": {"socket_id": socket_id}
+        await self.announce_leave(room, socket_id)
+        
+        # A departing speaker may promote someone else into the grid
+        if topology_manager.get_publishers(room) - publishers_before:
+            await self.broadcast_topology(room)
+    
+    def _topology_payload(self, room) -> dict:
+        """Describe a room's topology for clients."""
+        payload = {"mode": room.topology}
+        if room.topology != MESH:
+            payload["publishers"] = sorted(topology_manager.get_publishers(room))
+        return payload
+    
+    async def broadcast_topology(self, room):
+        """Tell participants which publishers they should now be connected to."""
+        await self.broadcast_to_room(room.room_code, {
+            "type": "topology_update",
+            "payload": self._topology_payload(room)
         })
     
-    async def handle_signal(self, socket_id: str, data: dict):
-        """Handle signaling messages (SDP/ICE)."""
-        to_socket_id = data.get("to")
-        signal_type = data.get("signal_type")
-        payload = data.get("payload")
+    @ws_messages.handler("speaking")
+    async def handle_speaking(self, socket_id: str):
+        """Record speaking activity; reshapes grid-limited rooms."""
+        room_code = self.socket_to_room.get(socket_id)
+        if not room_code:
+            return
         
-        if not to_socket_id or not signal_type or payload is None:
-            await self.send_message(socket_id, {
-                "type": "error",
-                "payload": {"code": "INVALID_SIGNAL", "message": "Invalid signal message"}
-            })
+        room = room_manager.get_room(room_code)
+        if not room or room.topology == MESH or socket_id not in room.participants:
             return
         
+        if topology_manager.record_speaker(room, socket_id):
+            await self.broadcast_topology(room)
+    
+    @ws_messages.handler("signal", SignalMessage, invalid_code="INVALID_SIGNAL")
+    async def handle_signal(self, socket_id: str, signal: SignalMessage):
+        """Handle signaling messages (SDP/ICE)."""
+        to_socket_id = signal.to
+        
         # Check both users are in the same room
         if socket_id not in self.socket_to_room:
             await self.send_message(socket_id, {
@@ -180,24 +450,49 @@ class ConnectionManager:
             })
             return
         
+        if not topology_manager.may_signal(room, socket_id, to_socket_id):
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "SIGNAL_NOT_ALLOWED", "message": "Room topology does not connect these peers"}
+            })
+            return
+        
         # Forward the signal
+        started = time.perf_counter()
         await self.send_message(to_socket_id, {
             "type": "signal",
             "payload": {
                 "from": socket_id,
-                "signal_type": signal_type,
-                "payload": payload
+                "signal_type": signal.signal_type,
+                "payload": signal.payload
             }
         })
+        call_tracer.record_signal(
+            room_code, len(room.participants), socket_id, to_socket_id,
+            signal.signal_type, (time.perf_counter() - started) * 1000
+        )
+    
+    @ws_messages.handler("peer_connected", PeerConnectedMessage)
+    async def handle_peer_connected(self, socket_id: str, report: PeerConnectedMessage):
+        """Complete call setup tracing for a pair once the client is connected."""
+        room_code = self.socket_to_room.get(socket_id)
+        if room_code is None or self.socket_to_room.get(report.peer) != room_code:
+            return
+        call_tracer.record_connected(socket_id, report.peer)
     
-    async def handle_chat_message(self, socket_id: str, payload: dict):
+    @ws_messages.handler("stats_report", StatsReportMessage, invalid_code="INVALID_STATS_REPORT")
+    async def handle_stats_report(self, socket_id: str, report: StatsReportMessage):
+        """Fold a client's connection quality sample into the room's quantiles."""
+        room_code = self.socket_to_room.get(socket_id)
+        room = room_manager.get_room(room_code) if room_code else None
+        if not room:
+            return
+        quality_stats.record(room_code, len(room.participants), report.model_dump())
+    
+    @ws_messages.handler("chat_message", ChatMessage)
+    async def handle_chat_message(self, socket_id: str, chat: ChatMessage):
         """Handle chat message and broadcast to all participants in the room."""
-        # Find which room this socket is in
-        room_code = None
-        for code, participants in self.room_participants.items():
-            if socket_id in participants:
-                room_code = code
-                break
+        room_code = self.socket_to_room.get(socket_id)
         
         if not room_code:
             await self.send_message(socket_id, {
@@ -206,24 +501,106 @@ class ConnectionManager:
             })
             return
         
+        text = chat.message[:settings.CHAT_MAX_MESSAGE_LENGTH]
+        if not text:
+            return
+        
+        # Sender name is the one stored at join (the client's is only a fallback),
+        # capped so one frame can't flood the history ring buffer or the log
+        room = room_manager.get_room(room_code)
+        participant = room.participants.get(socket_id) if room else None
+        sender = (participant.display_name if participant else None) or chat.sender or "Anonymous"
+        
+        # Sender id comes from the socket, not the client, so it can't be spoofed
+        message = {
+            "sender": sender[:settings.CHAT_MAX_SENDER_LENGTH],
+            "message": text,
+            "timestamp": datetime.utcnow().isoformat(),
+            "senderId": socket_id
+        }
+        
+        # The durable transcript numbers messages when enabled
+        seq = chat_log.append(room_code, message) if chat_log else None
+        message = chat_history.append(room_code, message, seq=seq)
+        
         # Broadcast chat message to all participants (including sender for consistency)
         await self.broadcast_to_room(room_code, {
             "type": "chat_message",
-            "payload": payload
+            "payload": message
         })
     
-    async def handle_create_room(self, socket_id: str, data: dict):
+    @ws_messages.handler("chat_history", ChatHistoryRequest)
+    async def handle_chat_history(self, socket_id: str, request: ChatHistoryRequest):
+        """Page backwards through a room's chat history."""
+        room_code = self.socket_to_room.get(socket_id)
+        
+        if not room_code:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "NOT_IN_ROOM", "message": "You are not in a room"}
+            })
+            return
+        
+        limit = min(request.limit or settings.CHAT_HISTORY_ON_JOIN, settings.CHAT_HISTORY_MAX_MESSAGES)
+        messages, cursor = chat_history.get_page(room_code, limit, before=request.before)
+        
+        await self.send_message(socket_id, {
+            "type": "chat_history",
+            "payload": {
+                "room_code": room_code,
+                "messages": messages,
+                "cursor": cursor
+            }
+        })
+    
+    @ws_messages.handler("create_room", CreateRoomMessage)
+    async def handle_create_room(self, socket_id: str, request: CreateRoomMessage):
         """Handle creating a new room via WebSocket (no API key needed)."""
-        display_name = data.get("display_name", "Anonymous")
-        max_participants = data.get("max_participants", 50)
-        ttl_hours = data.get("ttl_hours", 24)
+        if not await self._admit_join(socket_id):
+            return
+        
+        try:
+            await self._create_room(socket_id, request)
+        finally:
+            admission.end_join()
+    
+    async def _create_room(self, socket_id: str, request: CreateRoomMessage):
+        """Create a room and join its creator to it."""
+        display_name = request.display_name
+        max_participants = request.max_participants
+        ttl_hours = request.ttl_hours
+        topology = request.topology
+        presence_mode = request.presence_mode
+        
+        if topology is not None and topology not in TOPOLOGIES:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "INVALID_TOPOLOGY", "message": f"Unknown topology: {topology}"}
+            })
+            return
+        
+        if presence_mode is not None and presence_mode not in PRESENCE_MODES:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "INVALID_PRESENCE_MODE", "message": f"Unknown presence mode: {presence_mode}"}
+            })
+            return
         
         # Create the room
-        room = room_manager.create_room(
-            owner_id=socket_id,
-            ttl_hours=ttl_hours,
-            max_participants=max_participants
-        )
+        try:
+            room = room_manager.create_room(
+                owner_id=socket_id,
+                ttl_hours=ttl_hours,
+                max_participants=max_participants,
+                topology=topology,
+                presence_mode=presence_mode
+            )
+        except RoomLimitReached:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "ROOM_LIMIT_REACHED", "message": "Room limit reached, try again later"}
+            })
+            return
         
         # Automatically join the room
         room = room_manager.add_participant(room.room_code, socket_id, display_name)
@@ -231,6 +608,7 @@ class ConnectionManager:
         if room:
             # Track socket to room mapping
             self.socket_to_room[socket_id] = room.room_code
+            call_tracer.record_join(socket_id)
             
             # Send room created confirmation
             await self.send_message(socket_id, {
@@ -239,7 +617,10 @@ class ConnectionManager:
                     "room_code": room.room_code,
                     "created_at": room.created_at.isoformat(),
                     "expires_at": room.expires_at.isoformat(),
-                    "your_socket_id": socket_id
+                    "your_socket_id": socket_id,
+                    "topology": self._topology_payload(room),
+                    "bandwidth": bandwidth_advisor.room_profiles(room),
+                    "roster_version": room.roster_version
                 }
             })
         else:
@@ -248,36 +629,32 @@ class ConnectionManager:
                 "payload": {"code": "ROOM_CREATION_FAILED", "message": "Failed to create room"}
             })
     
+    @ws_messages.handler("heartbeat")
+    async def handle_heartbeat(self, socket_id: str):
+        """Respond to heartbeat."""
+        await self.send_message(socket_id, {"type": "pong"})
+    
     async def handle_message(self, socket_id: str, message: str):
-        """Route incoming WebSocket messages."""
+        """Decode, validate and route an incoming WebSocket frame."""
+        signaling_recorder.inbound(socket_id, message)
+        traffic.inbound(socket_id, self.socket_to_room.get(socket_id), len(message))
+        # Broadcasts this frame causes, including from tasks it spawns, are charged to it
+        current_socket.set(socket_id)
+        if len(message) > settings.WS_MAX_MESSAGE_BYTES:
+            await self.send_message(socket_id, {
+                "type": "error",
+                "payload": {"code": "MESSAGE_TOO_LARGE", "message": f"Messages are limited to {settings.WS_MAX_MESSAGE_BYTES} bytes"}
+            })
+            return
+        
         try:
-            data = json.loads(message)
-            msg_type = data.get("type")
-            payload = data.get("payload", {})
-            
-            if msg_type == "create_room":
-                await self.handle_create_room(socket_id, payload)
-            elif msg_type == "join_room":
-                await self.handle_join_room(socket_id, payload)
-            elif msg_type == "leave_room":
-                await self.handle_leave_room(socket_id)
-            elif msg_type == "signal":
-                await self.handle_signal(socket_id, payload)
-            elif msg_type == "chat_message":
-                await self.handle_chat_message(socket_id, payload)
-            elif msg_type == "heartbeat":
-                # Respond to heartbeat
-                await self.send_message(socket_id, {"type": "pong"})
-            else:
-                await self.send_message(socket_id, {
-                    "type": "error",
-                    "payload": {"code": "UNKNOWN_MESSAGE_TYPE", "message": f"Unknown message type: {msg_type}"}
-                })
+            msg_type, payload = ws_messages.decode(message)
+            await ws_messages.dispatch(self, socket_id, msg_type, payload)
         
-        except json.JSONDecodeError:
+        except DispatchError as e:
             await self.send_message(socket_id, {
                 "type": "error",
-                "payload": {"code": "INVALID_JSON", "message": "Invalid JSON message"}
+                "payload": {"code": e.code, "message": e.message}
             })
         except Exception as e:
             print(f"Error handling message from {socket_id}: {e}")